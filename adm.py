@@ -0,0 +1,259 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import re
+
+CONNECT = 'connect'
+DISCONNECT = 'disconnect'
+HIT = 'hit'
+KILL = 'kill'
+DEATH = 'death'
+SUICIDE = 'suicide'
+
+EVENT_TYPES = (CONNECT, DISCONNECT, HIT, KILL, DEATH, SUICIDE)
+
+# 14:03:00 | Player "Survivor" (id=abc= pos=<1.0, 2.0, 3.0>)[HP: 88.5] hit by ...
+_HEADER = re.compile(r'(\d\d:\d\d:\d\d) \| Player "(.*?)"(?= |\(|$)(?: \(DEAD\))?')
+_ID = re.compile(r'\s?\(id=([^ )]*)(?: pos=<([-\d.]+), ([-\d.]+), ([-\d.]+)>)?\)')
+_HP = re.compile(r'\[HP: ([-\d.]+)\]')
+_ATTACKER = re.compile(r' by (?:Player "(.*?)"(?: \(DEAD\))?' + _ID.pattern + r'|(\S+))')
+_ZONE = re.compile(r' into (\w+)\((-?\d+)\) for ([-\d.]+) damage(?: \(([^)]*)\))?')
+_WEAPON = re.compile(r' with (.+?)(?: from ([-\d.]+) meters)?\s*$')
+_STATS = re.compile(r'Water: ([-\d.]+) Energy: ([-\d.]+) Bleed sources: (\d+)')
+_STARTED = re.compile(r'AdminLog started on (\d{4})-(\d\d)-(\d\d)')
+
+
+class AdmEvent(object):
+    __slots__ = ('time', 'player', 'buid', 'pos', 'line', 'date')
+    kind = None
+
+    def __init__(self, time, player, buid=None, pos=None, line=None):
+        self.time = time
+        self.player = player
+        self.buid = buid
+        self.pos = pos
+        self.line = line
+        self.date = None
+
+    def timestamp(self):
+        hours, minutes, seconds = self.time.split(':')
+        date = self.date or datetime.date.today()
+        return datetime.datetime(date.year, date.month, date.day, int(hours), int(minutes), int(seconds)).timestamp()
+
+    def __repr__(self):
+        return '<{} {} {!r} {}>'.format(type(self).__name__, self.time, self.player, self.buid)
+
+
+class ConnectEvent(AdmEvent):
+    __slots__ = ()
+    kind = CONNECT
+
+
+class DisconnectEvent(AdmEvent):
+    __slots__ = ()
+    kind = DISCONNECT
+
+
+class SuicideEvent(AdmEvent):
+    __slots__ = ()
+    kind = SUICIDE
+
+
+class DeathEvent(AdmEvent):
+    __slots__ = ('water', 'energy', 'bleed_sources')
+    kind = DEATH
+
+    def __init__(self, time, player, buid=None, pos=None, line=None, water=None, energy=None, bleed_sources=None):
+        AdmEvent.__init__(self, time, player, buid, pos, line)
+        self.water = water
+        self.energy = energy
+        self.bleed_sources = bleed_sources
+
+
+class KillEvent(AdmEvent):
+    __slots__ = ('killer', 'killer_buid', 'killer_pos', 'weapon', 'distance')
+    kind = KILL
+
+    def __init__(self, time, player, buid=None, pos=None, line=None, killer=None, killer_buid=None,
+                 killer_pos=None, weapon=None, distance=None):
+        AdmEvent.__init__(self, time, player, buid, pos, line)
+        self.killer = killer
+        self.killer_buid = killer_buid
+        self.killer_pos = killer_pos
+        self.weapon = weapon
+        self.distance = distance
+
+
+class HitEvent(KillEvent):
+    __slots__ = ('hp', 'zone', 'damage', 'ammo')
+    kind = HIT
+
+    def __init__(self, time, player, buid=None, pos=None, line=None, killer=None, killer_buid=None,
+                 killer_pos=None, weapon=None, distance=None, hp=None, zone=None, damage=None, ammo=None):
+        KillEvent.__init__(self, time, player, buid, pos, line, killer, killer_buid, killer_pos, weapon, distance)
+        self.hp = hp
+        self.zone = zone
+        self.damage = damage
+        self.ammo = ammo
+
+
+def _position(match, first):
+    x = match.group(first)
+    if x is None:
+        return None
+    return float(x), float(match.group(first + 1)), float(match.group(first + 2))
+
+
+def _float(value):
+    if value is None:
+        return None
+    return float(value)
+
+
+class LogClock(object):
+    """Date of one ADM stream, so a single parser can serve several logs"""
+    __slots__ = ('date', 'last_time')
+
+    def __init__(self, date=None):
+        self.date = date or datetime.date.today()
+        self.last_time = ''
+
+
+class AdmParser(object):
+    """Single pass DayZ admin log (ADM) parser
+
+    Each line is matched once against the shared player header, dispatched on its
+    event keyword and decoded with the precompiled pattern for that event type.
+    Lines that are not player events return None. The log date is taken from the
+    AdminLog header and advanced when the clock wraps past midnight; pass a
+    LogClock per stream when one parser reads several logs.
+    """
+    def __init__(self, date=None):
+        self.lines = 0
+        self.events = 0
+        self.counts = dict.fromkeys(EVENT_TYPES, 0)
+        self.clock = LogClock(date)
+
+    @property
+    def date(self):
+        return self.clock.date
+
+    def parse(self, line, clock=None):
+        """Parses one line; clock tracks the date of the stream the line came from"""
+        self.lines += 1
+        if clock is None:
+            clock = self.clock
+        header = _HEADER.match(line)
+        if header is None:
+            started = _STARTED.match(line)
+            if started is not None:
+                clock.date = datetime.date(*map(int, started.groups()))
+                clock.last_time = ''
+            return None
+        time, player = header.group(1, 2)
+        if time < clock.last_time:
+            clock.date += datetime.timedelta(days=1)
+        clock.last_time = time
+        rest = line[header.end():].rstrip()
+        # Ordered by how often each event shows up in a busy log
+        if ' hit by ' in rest:
+            event = self._parse_hit(time, player, rest)
+        elif ' killed by ' in rest:
+            event = self._parse_kill(time, player, rest)
+        elif rest.startswith(' is connected'):
+            identity = _ID.search(rest)
+            event = ConnectEvent(time, player, identity.group(1) if identity else None)
+        elif rest.endswith('has been disconnected'):
+            identity = _ID.match(rest)
+            event = DisconnectEvent(time, player, identity.group(1) if identity else None)
+        elif ' died.' in rest:
+            event = self._parse_death(time, player, rest)
+        elif 'committed suicide' in rest:
+            identity = _ID.match(rest)
+            event = SuicideEvent(time, player, identity.group(1) if identity else None,
+                                 _position(identity, 2) if identity else None)
+        else:
+            return None
+        if event is None:
+            return None
+        event.line = line
+        event.date = clock.date
+        self.events += 1
+        self.counts[event.kind] += 1
+        return event
+
+    def parse_lines(self, lines, clock=None):
+        parse = self.parse
+        for line in lines:
+            event = parse(line, clock)
+            if event is not None:
+                yield event
+
+    def _victim(self, rest):
+        identity = _ID.match(rest)
+        if identity is None:
+            return None, None, 0
+        return identity.group(1), _position(identity, 2), identity.end()
+
+    def _attacker(self, event, rest, start):
+        attacker = _ATTACKER.search(rest, start)
+        if attacker is None:
+            return start
+        if attacker.group(1) is not None:
+            event.killer = attacker.group(1)
+            event.killer_buid = attacker.group(2)
+            event.killer_pos = _position(attacker, 3)
+        else:
+            event.killer = attacker.group(6)
+        weapon = _WEAPON.search(rest, attacker.end())
+        if weapon is not None:
+            event.weapon = weapon.group(1)
+            event.distance = _float(weapon.group(2))
+        return attacker.end()
+
+    def _parse_hit(self, time, player, rest):
+        buid, pos, end = self._victim(rest)
+        event = HitEvent(time, player, buid, pos)
+        hp = _HP.match(rest, end)
+        if hp is not None:
+            event.hp = float(hp.group(1))
+        end = self._attacker(event, rest, end)
+        zone = _ZONE.search(rest, end)
+        if zone is not None:
+            event.zone = zone.group(1)
+            event.damage = float(zone.group(3))
+            event.ammo = zone.group(4)
+        return event
+
+    def _parse_kill(self, time, player, rest):
+        buid, pos, end = self._victim(rest)
+        event = KillEvent(time, player, buid, pos)
+        self._attacker(event, rest, end)
+        return event
+
+    def _parse_death(self, time, player, rest):
+        buid, pos, end = self._victim(rest)
+        event = DeathEvent(time, player, buid, pos)
+        stats = _STATS.search(rest, end)
+        if stats is not None:
+            event.water = float(stats.group(1))
+            event.energy = float(stats.group(2))
+            event.bleed_sources = int(stats.group(3))
+        return event
+
+
+def parse_lines(lines):
+    return AdmParser().parse_lines(lines)
@@ -0,0 +1,315 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import datetime
+import hashlib
+import heapq
+import json
+import logging
+import os
+import time
+
+import supervisor
+
+log = logging.getLogger()
+
+RESTART_WARNINGS = (15, 10, 5)
+
+
+class BroadcastResult(object):
+    __slots__ = ('server', 'ok', 'attempts', 'latency', 'error', 'duplicate')
+
+    def __init__(self, server, ok=False, attempts=0, latency=0.0, error=None, duplicate=False):
+        self.server = server
+        self.ok = ok
+        self.attempts = attempts
+        self.latency = latency
+        self.error = error
+        self.duplicate = duplicate
+
+
+class Broadcaster(object):
+    """Fans a server message out to many servers at once
+
+    post(server, message) is awaited once per attempt and returns None on
+    failure. At most concurrency posts are in flight. Failed posts are retried
+    with doubling backoff. A message already delivered to a server within
+    dedupe_window seconds, or still in flight to it, is not posted again, so a
+    repeated command or an overlapping retry cannot show the message twice.
+    Scheduled sends pass dedupe=False: the queue pops each occurrence once, and
+    a repeat interval may be shorter than the window.
+    """
+    def __init__(self, post, concurrency=8, retries=2, backoff=1.0, dedupe_window=60.0):
+        self.post = post
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.dedupe_window = dedupe_window
+        self.broadcasts = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        self.duplicates = 0
+        self._semaphore = None
+        self._recent = {}
+        self._in_flight = set()
+
+    def stats(self):
+        return {'broadcasts': self.broadcasts, 'delivered': self.delivered, 'failed': self.failed,
+                'retried': self.retried, 'duplicates': self.duplicates}
+
+    def _key(self, server, message):
+        return server.name, hashlib.blake2b(message.encode('utf-8'), digest_size=16).digest()
+
+    def _expire(self, now):
+        for key in [key for key, when in self._recent.items() if now - when > self.dedupe_window]:
+            del self._recent[key]
+
+    async def send(self, servers, message, dedupe=True):
+        """Posts message to every server and returns a BroadcastResult per server, in order"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.broadcasts += 1
+        self._expire(time.monotonic())
+        return await asyncio.gather(*[self._send_one(server, message, dedupe) for server in servers])
+
+    async def _send_one(self, server, message, dedupe):
+        key = self._key(server, message)
+        if dedupe and (key in self._recent or key in self._in_flight):
+            self.duplicates += 1
+            return BroadcastResult(server.name, ok=True, duplicate=True)
+        self._in_flight.add(key)
+        result = BroadcastResult(server.name)
+        start = time.perf_counter()
+        try:
+            while True:
+                result.attempts += 1
+                async with self._semaphore:
+                    try:
+                        response = await self.post(server, message)
+                        result.error = None if response is not None else 'no response'
+                    except Exception as error:
+                        result.error = str(error) or type(error).__name__
+                if result.error is None or result.attempts > self.retries:
+                    break
+                self.retried += 1
+                await asyncio.sleep(self.backoff * 2 ** (result.attempts - 1))
+        finally:
+            self._in_flight.discard(key)
+        result.latency = time.perf_counter() - start
+        result.ok = result.error is None
+        if result.ok:
+            self.delivered += 1
+            self._recent[key] = time.monotonic()
+        else:
+            self.failed += 1
+            log.info('Broadcast to {} failed after {} attempts: {}'.format(server.name, result.attempts,
+                                                                           result.error))
+        return result
+
+
+def schedule_due(value, now=None):
+    """Unix timestamp of a next_scheduled_task time, or None when it cannot be read
+
+    Accepts unix timestamps, ISO dates and 'HH:MM[:SS]' clock times, which are
+    taken as the next occurrence in local time.
+    """
+    if value is None or value == '':
+        return None
+    now = time.time() if now is None else now
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    for pattern in ('%H:%M:%S', '%H:%M'):
+        try:
+            clock = datetime.datetime.strptime(text, pattern).time()
+        except ValueError:
+            continue
+        today = datetime.datetime.fromtimestamp(now).date()
+        due = datetime.datetime.combine(today, clock).timestamp()
+        return due if due > now else due + 86400
+    try:
+        return datetime.datetime.fromisoformat(text.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class Announcement(object):
+    __slots__ = ('id', 'due', 'message', 'servers', 'repeat', 'source')
+
+    def __init__(self, id, due, message, servers=None, repeat=0, source=None):
+        self.id = id
+        self.due = due
+        self.message = message
+        self.servers = tuple(servers) if servers else None
+        self.repeat = repeat
+        self.source = source
+
+    def to_dict(self):
+        return {'id': self.id, 'due': self.due, 'message': self.message,
+                'servers': list(self.servers) if self.servers else None, 'repeat': self.repeat, 'source': self.source}
+
+
+class AnnouncementQueue(object):
+    """Timed and repeating broadcasts, ordered in a heap and kept in a JSON file
+
+    servers None means every server. Announcements generated from a server's
+    next scheduled task carry a 'schedule:<server>' source and are replaced when
+    the schedule changes. Everything due at the same moment is sent together,
+    with identical messages merged into one broadcast across their servers.
+    Occurrences that fell due more than grace seconds ago, e.g. while the bot
+    was down, are skipped rather than sent late.
+    """
+    def __init__(self, path=None, warnings=RESTART_WARNINGS, grace=300):
+        self.path = path
+        self.warnings = tuple(warnings)
+        self.grace = grace
+        self.entries = {}
+        self.heap = []
+        self.next_id = 1
+        self.sent = 0
+        self.dropped = 0
+        self._schedules = {}
+        self._wake = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        return {'pending': len(self.entries), 'sent': self.sent, 'dropped': self.dropped}
+
+    def pending(self):
+        return sorted(self.entries.values(), key=lambda entry: (entry.due, entry.id))
+
+    def _push(self, entry):
+        self.entries[entry.id] = entry
+        heapq.heappush(self.heap, (entry.due, entry.id))
+        if self._wake is not None:
+            self._wake.set()
+
+    def add(self, due, message, servers=None, repeat=0, source=None, save=True):
+        entry = Announcement(self.next_id, due, message, servers, repeat, source)
+        self.next_id += 1
+        self._push(entry)
+        if save:
+            self.save()
+        return entry
+
+    def cancel(self, id, save=True):
+        entry = self.entries.pop(id, None)
+        if entry is not None and save:
+            self.save()
+        return entry
+
+    def sync_schedule(self, server, schedule, now=None):
+        """Regenerates the warnings before a server's next scheduled task when it changes"""
+        now = time.time() if now is None else now
+        due = schedule_due(schedule.time, now) if schedule is not None else None
+        action = schedule.action if schedule is not None else None
+        if self._schedules.get(server) == (due, action):
+            return False
+        self._schedules[server] = (due, action)
+        source = 'schedule:' + server
+        for entry in [entry for entry in self.entries.values() if entry.source == source]:
+            del self.entries[entry.id]
+        if due is not None:
+            for minutes in self.warnings:
+                if due - minutes * 60 > now:
+                    self.add(due - minutes * 60, 'Scheduled {} in {} minutes'.format(action or 'task', minutes),
+                             (server,), source=source, save=False)
+        self.save()
+        return True
+
+    def pop_due(self, now=None):
+        """Removes and returns everything due by now, rescheduling repeating entries"""
+        now = time.time() if now is None else now
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            when, id = heapq.heappop(self.heap)
+            entry = self.entries.get(id)
+            if entry is None or entry.due != when:
+                continue
+            if entry.repeat:
+                while entry.due <= now:
+                    entry.due += entry.repeat
+                heapq.heappush(self.heap, (entry.due, entry.id))
+            else:
+                del self.entries[id]
+            if now - when > self.grace:
+                self.dropped += 1
+                continue
+            due.append(entry)
+        if due:
+            self.save()
+        return due
+
+    def next_due(self):
+        while self.heap and self.heap[0][1] not in self.entries:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    async def run(self, send):
+        """Sends due announcements with send(servers, message) until cancelled"""
+        self._wake = asyncio.Event()
+        while True:
+            due = self.next_due()
+            timeout = None if due is None else max(due - time.time(), 0)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            batches = {}
+            for entry in self.pop_due():
+                servers = batches.setdefault(entry.message, set())
+                if entry.servers is None or servers is None:
+                    batches[entry.message] = None
+                else:
+                    servers.update(entry.servers)
+            if batches:
+                self.sent += len(batches)
+                with supervisor.iteration():
+                    await asyncio.gather(*[send(servers, message) for message, servers in batches.items()])
+
+    def save(self):
+        if not self.path:
+            return
+        temp_name = self.path + '.tmp'
+        with open(temp_name, 'w') as queue_file:
+            json.dump({'next_id': self.next_id, 'entries': [entry.to_dict() for entry in self.pending()]},
+                      queue_file)
+        os.replace(temp_name, self.path)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r') as queue_file:
+                state = json.load(queue_file)
+        except (OSError, ValueError) as error:
+            log.info('Announcements not loaded: {}'.format(error))
+            return False
+        self.entries.clear()
+        self.heap = []
+        for item in state.get('entries', []):
+            self._push(Announcement(item['id'], item['due'], item['message'], item.get('servers'),
+                                    item.get('repeat', 0), item.get('source')))
+        self.next_id = max([state.get('next_id', 1)] + [id + 1 for id in self.entries])
+        return True
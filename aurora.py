@@ -14,137 +14,129 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import tools
+import adm
+import announce
+import config
+import logfollow
+import dispatcher
+import cftools
+import poller
+import leaderboard
+import eventstore
+import hostmetrics
+import logview
+import chart
+import metrics
+import profiler
+import servers
+import sessions
+import supervisor
+import telemetry
 import asyncio
-import json
-import aiohttp
+import functools
+import io
+import os
+import threading
+import time
 import datetime
 import discord
 from discord.ext import commands
 import logging
-import wmi
-import tailer
 
 logging.basicConfig(format='%(asctime)s %(message)s', datefmt='[%H:%M:%S]')
 log = logging.getLogger()
 log.setLevel(logging.INFO)
 latest_adm = ''
+adm_parser = adm.AdmParser()
+
+
+def adm_server_name():
+    """Name of the server the ADM log belongs to: adm_server, else the first configured server"""
+    if adm_server:
+        return adm_server
+    for name in config_data.servers:
+        return name
+    return None
+
+
+def log_sources():
+    """(server name, log path, feed channel) for every server with a log_path
+
+    Falls back to the global adm_path for a single server when no server entry
+    has its own log_path.
+    """
+    sources = []
+    for server in config_data.servers.values():
+        if server.get('log_path'):
+            sources.append((server['name'], server['log_path'], server.get('feed_channel') or live_feed_channel))
+    if not sources and adm_path:
+        sources.append((adm_server_name(), adm_path, live_feed_channel))
+    return sources
+
+
+async def start_log_monitors():
+    """Starts, stops or restarts tailers so they match log_sources(), leaving unchanged ones running"""
+    sources = log_sources()
+    wanted = {name: (path, channel, len(sources) > 1, adm_state) for name, path, channel in sources}
+    for name in [name for name, spec in log_monitors.items() if wanted.get(name) != spec]:
+        del log_monitors[name]
+        await services.stop('adm:{}'.format(name))
+    for name, spec in wanted.items():
+        if name not in log_monitors:
+            log_monitors[name] = spec
+            services.start('adm:{}'.format(name), functools.partial(log_monitor, name, *spec[:3]))
+
+
+async def log_monitor(name, path, channel, label=False):
+    log_follower = logfollow.LogFollower(path, state_file=adm_state)
+    log.info("Watching {} for {}".format(path, name))
+    await adm_scan(log_follower, name, int(channel), name if label else None)
+
+
+async def adm_scan(log_follower, name, channel, label=None):
+    clock = adm.LogClock()
+    table = session_tracker.table(name) if name is not None else None
+    async for lines in log_follower.follow():
+        with supervisor.iteration():
+            event = None
+            for event in adm_parser.parse_lines(lines, clock):
+                line = event.line
+                event_store.add(event, name)
+                if table is not None and table.apply(event):
+                    tools.render_cache.invalidate(name, 'players')
+                if event.kind in (adm.CONNECT, adm.DEATH, adm.KILL):
+                    feed_dispatcher.submit(channel, tools.format_event(event, label))
+                if event.kind == adm.DEATH:
+                    log.info("Death: %s" % line)
+                elif event.kind == adm.DISCONNECT:
+                    log.info("Disconnection: %s" % line)
+                elif event.kind == adm.SUICIDE:
+                    log.info("Suicide: %s" % line)
+                elif event.kind == adm.HIT:
+                    log.info("HIT: %s" % line)
+                elif event.kind == adm.KILL:
+                    log.info("Killed: %s" % line)
+            if event is not None:
+                telemetry.ADM_LAG.labels(name).set(max(time.time() - event.timestamp(), 0.0))
 
-
-async def log_monitor():
-    log_name = 'DayZServer_x64.ADM'
-    log.info("Watching DayZServer_x64.ADM")
-    await adm_scan(log_name)
-
-
-async def adm_scan(log_name):
-    log_file = open(log_name)
-    log_file.seek(0, 2)  # Go to the end of the file
-    while True:
-        line = log_file.readline()
-        if not line:
-            await asyncio.sleep(0.1)  # Sleep briefly
-            continue
-        if 'is connected' in line:
-            parsed = line.split(' ')
-            if '"' in parsed[3] and '"' in parsed[4]:
-                player = parsed[3] + ' ' + parsed[4]
-                index = 4
-            else:
-                player = parsed[3]
-                index = 3
-            player = player.strip('"')
-            id = parsed[index + 3]
-            id = id.strip('(id=')
-            id = id.strip(')')
-            time = parsed[0]
-            channel = bot.get_channel(int(live_feed_channel))
-            live_connect = f'```CONNECT: {time} \nPlayer: {player} \nBUID: {id}```'
-            await channel.send(live_connect)
-        if 'died' in line:
-            parsed = line.split(' ')
-            if '"' in parsed[3] and '"' in parsed[4]:
-                player = parsed[3] + ' ' + parsed[4]
-                index = 4
-            else:
-                player = parsed[3]
-                index = 3
-            player = player.strip('"')
-            id = parsed[index + 1]
-            id = id.strip('(id=')
-            id = id.strip(')')
-            pos_x = parsed[index + 2].strip('pos=<')
-            pos_x = pos_x.strip(',')
-            pos_y = parsed[index + 3].strip(',')
-            pos_z = parsed[index + 4].strip('>)')
-            time = parsed[0]
-            water = parsed[index + 8]
-            energy = parsed[index + 10]
-            bleed_sources = parsed[index + 13]
-            channel = bot.get_channel(int(live_feed_channel))
-            live_feed = f'```DEATH: {time} \nPlayer: {player} \nBUID: {id} \nPos: <{pos_x}, {pos_y}, {pos_z}>\nWater: {water}\nEnergy: {energy}\nBleed Sources: {bleed_sources}```'
-            await channel.send(live_feed)
-            log.info("Death: %s" %line)
-        if 'disconnected' in line:
-            log.info("Disconnection: %s" %line)
-        if 'suicide' in line:
-            log.info("Suicide: %s" %line)
-        if 'hit' in line:
-            log.info("HIT: %s" %line)
-        if 'killed' in line:
-            parsed = line.split(' ')
-            if '"' in parsed[3] and '"' in parsed[4]:
-                player = parsed[3] + ' ' + parsed[4]
-                if '"' in parsed[12] and '"' in parsed[13]:
-                    killer = parsed[12] + ' ' + parsed[13]
-                    buid_player = str(parsed[5])
-                    buid_player = buid_player.strip('(id=')
-                    buid_player = buid_player.strip(')')
-                    buid_killer = str(parsed[14])
-                    buid_killer = buid_killer.replace('(id=', '')
-                    buid_killer = buid_killer.replace(')', '')
-                    player = player.replace('"', '')
-                    killer = killer.replace('"', '')
-                    pos_x_player = parsed[6].replace('pos=<', '')
-                    pos_x_player = pos_x_player.replace(',', '')
-                    pos_y_player = parsed[7].replace(',', '')
-                    pos_z_player = parsed[8].replace('>)', '')
-                    pos_x_killer = parsed[15].replace('pos=<', '')
-                    pos_x_killer = pos_x_killer.replace(',', '')
-                    pos_y_killer = parsed[16].replace(',', '')
-                    pos_z_killer = parsed[17].replace('>)', '')
-                    weapon = parsed[19:]
-                    time = parsed[0]
-                    channel = bot.get_channel(int(live_feed_channel))
-                    await channel.send("```{} | Player {} BUID {} Position {},{},{} KILLED\nby Player {} BUID {} Position <{}, {}, {}>) with {}```".format(time, player, buid_player, pos_x_player, pos_y_player, pos_z_player, killer, buid_killer, pos_x_killer, pos_y_killer, pos_z_killer, weapon))
-            else:
-                player = parsed[3]
-                player = player.replace('"', '')
-                id = parsed[4]
-                id = id.replace('(id=', '')
-                id = id.replace(')', '')
-                pos_x = parsed[5].replace('pos=<', '')
-                pos_x = pos_x.replace(',', '')
-                pos_y = parsed[6].replace(',', '')
-                pos_z = parsed[7].replace('>)', '')
-                time = parsed[0]
-                water = parsed[11]
-                energy = parsed[13]
-                bleed_sources = parsed[16]
-                channel = bot.get_channel(int(live_feed_channel))
-                await channel.send("```DEATH: {} \nPlayer: {} \nBUID: {} \nPos: <{}, {}, {}>\nWater: {}\nEnergy: {}\nBleed Sources: {}```".format(time, player, id, pos_x, pos_y, pos_z, water, energy, bleed_sources))
-            log.info("Killed: %s" %line)
-
-global api_count
 global startup_time
 startup_time = datetime.datetime.now()
-headers = {'contentType': 'application/x-www-form-urlencoded','User-Agent': 'CFTools ServiceAPI-Client'}
 
 logging.basicConfig(format='%(asctime)s %(message)s', datefmt='[%H:%M:%S]')
 log = logging.getLogger()
 log.setLevel(logging.INFO)
 
-with open('config.json', 'r') as config_file:
-    config_data = json.load(config_file)
+config_path = os.environ.get('AURORA_CONFIG', 'config.json')
+config_manager = config.ConfigManager(config_path)
+
+
+def bind_settings(snapshot):
+    global config_data, token, report_channel, api_url, guild_id, status_refresh, delayed_refresh
+    global activity_rotate, activity_refresh, cooldown_channel, cooldown_user, staff_role, moderator_role, admin_role
+    global live_feed_channel, adm_path, adm_state, event_db, rpt_path, adm_server, player_reconcile, metrics_file
+    global announce_file, restart_warnings, telemetry_host, telemetry_port, profiling, slow_callback
+    global slow_command, host_metrics, host_metrics_interval, dayz_process
+    config_data = snapshot
     token = config_data['discord_token']
     report_channel = config_data['report_channel']
     api_url = config_data['api_url']
@@ -159,149 +151,326 @@ with open('config.json', 'r') as config_file:
     moderator_role = tuple(config_data['permissions']['moderators'])
     admin_role = tuple(config_data["permissions"]["admins"])
     live_feed_channel = config_data['live_feed_channel']
+    adm_path = config_data['adm_path']
+    adm_state = config_data['adm_state']
+    event_db = config_data['event_db']
+    rpt_path = config_data['rpt_path']
+    adm_server = config_data['adm_server']
+    player_reconcile = config_data['player_reconcile']
+    metrics_file = config_data['metrics_file']
+    announce_file = config_data['announce_file']
+    restart_warnings = config_data['restart_warnings']
+    telemetry_host = config_data['telemetry_host']
+    telemetry_port = config_data['telemetry_port']
+    profiling = config_data['profiling']
+    slow_callback = config_data['slow_callback']
+    slow_command = config_data['slow_command']
+    host_metrics = config_data['host_metrics']
+    host_metrics_interval = config_data['host_metrics_interval']
+    dayz_process = config_data['dayz_process']
+
+
+bind_settings(config_manager.current)
 
 server_list = []
-api_count = 0
+log_monitors = {}
+api_client = cftools.CFToolsClient()
+event_store = eventstore.EventStore(event_db)
+session_tracker = sessions.SessionTracker()
+services = supervisor.Supervisor()
+metrics_history = metrics.MetricsHistory(metrics_file)
+metrics_history.load()
+chart_renderer = chart.ChartRenderer()
+announcements = announce.AnnouncementQueue(announce_file, restart_warnings)
+announcements.load()
+
+
+async def fetch_api(url, data, validator=None, endpoint='other', server=''):
+    start = time.perf_counter()
+    result = await api_client.post(url, data, validator)
+    telemetry.API_LATENCY.labels(endpoint, server).observe(time.perf_counter() - start)
+    outcome = 'error' if result is None else 'unchanged' if result is cftools.UNCHANGED else 'ok'
+    telemetry.API_REQUESTS.labels(endpoint, server, outcome).inc()
+    return result
 
 
-class Server(object):
-    def __init__(self, name=None, address=None, server_url=None, service_api_key=None, service_id=None, server_icon=None, info=None, players=None, kills=None, playtime=None, last_update=None):
-        self.name = name
-        self.address = address
-        self.server_url = server_url
-        self.service_api_key = service_api_key
-        self.service_id = service_id
-        self.server_icon = server_icon
-        self.info = info
-        self.players = players
-        self.kills = kills
-        self.playtime = playtime
-        self.last_update = last_update
+async def debug_log_api():
+    while True:
+        with supervisor.iteration():
+            log.info("API Count: {}".format(api_client.requests))
+            log.info("Live Feed: {}".format(feed_dispatcher.stats()))
+            log.info("API Connections: {}".format(api_client.stats()))
+            log.info("Poll Scheduler: {}".format(poll_scheduler.stats()))
+            log.info("Render Cache: {}".format(tools.render_cache.stats()))
+            log.info("Command Sends: {}".format(tools.send_scheduler.stats()))
+            log.info("Broadcasts: {}".format(broadcaster.stats()))
+            log.info("Announcements: {}".format(announcements.stats()))
+            log.info("Configuration: {}".format(config_manager.stats()))
+            log.info("Event Store: {}".format(event_store.stats()))
+            log.info("Online Sessions: {}".format(session_tracker.stats()))
+            log.info("Services: {} (restarts)".format(services.stats()))
+            log.info("Metrics History: {}".format(metrics_history.stats()))
+            log.info("Chart Renderer: {}".format(chart_renderer.stats()))
+        await asyncio.sleep(60)
 
 
-async def fetch_api(session, url, data):
-    try:
-        async with session.post(url, data=data, headers=headers) as response:
-            api_data = await response.json()
-            return api_data
-    except Exception as error:
-        log.info('API Fetch Failed: ' + str(error))
+async def poll_server(server, endpoint):
+    with telemetry.Timer(telemetry.POLL_DURATION.labels(endpoint)):
+        return await update_server(server, endpoint)
 
 
-async def leaderboard_fetch_async():
-    while True:
-        tasks = []
-        try:
-            global api_count
-            async with aiohttp.ClientSession() as session:
-                for server in server_list:
-                    tasks.append(fetch_api(session, "{}stats/{}".format(api_url, server.service_id),
-                                           {'service_api_key': str(server.service_api_key), 'order': 'descending',
-                                            'stat_type': 'kills'}))
-                    tasks.append(fetch_api(session, "{}stats/{}".format(api_url, server.service_id),
-                                           {'service_api_key': str(server.service_api_key), 'order': 'descending',
-                                            'stat_type': 'playtime'}))
-                    api_count += 2
-                results = await asyncio.gather(*tasks)
-                sub_list = [results[n:n + 2] for n in range(0, len(results), 2)]
-                index = 0
-                for api_return in sub_list:
-                    server = server_list[index]
-                    server.kills = api_return[0]
-                    server.playtime = api_return[1]
-                    index += 1
-            await session.close()
-            await asyncio.sleep(delayed_refresh)
-        except Exception as error:
-            log.info('API Fetch Failed:' + str(error))
+async def update_server(server, endpoint):
+    service_api_key = str(server.service_api_key)
+    validator = server.validators.setdefault(endpoint, cftools.Validator())
+    if endpoint in poller.LEADERBOARD_ENDPOINTS:
+        data = await fetch_api("{}stats/{}".format(api_url, server.service_id),
+                               {'service_api_key': service_api_key, 'order': 'descending', 'stat_type': endpoint},
+                               validator, endpoint, server.name)
+    else:
+        data = await fetch_api("{}{}/{}".format(api_url, endpoint, server.service_id),
+                               {'service_api_key': service_api_key}, validator, endpoint, server.name)
+    if data is None:
+        return False
+    server.last_update = datetime.datetime.now()
+    if data is not cftools.UNCHANGED:
+        server.update(endpoint, data)
+        if endpoint == poller.SERVERINFO and server.info is not None:
+            announcements.sync_schedule(server.name, server.info.schedule)
+        tools.render_cache.invalidate(server.name)
+    if endpoint == poller.PLAYERLIST and server.sessions is not None:
+        # Also when the roster is unchanged: this is what clears sessions whose disconnect line was missed
+        if server.sessions.reconcile(server.players):
+            tools.render_cache.invalidate(server.name, 'players')
+    if endpoint == poller.SERVERINFO:
+        metrics_history.record_info(server.name, server.info, tools.online_count(server))
+    return True
 
 
-async def debug_log_api():
-    global api_count
-    while True:
-        log.info("API Count: {}".format(api_count))
-        await asyncio.sleep(60)
+async def post_server_message(server, message):
+    return await fetch_api("{}servermessage/{}".format(api_url, server.service_id),
+                           {'service_api_key': str(server.service_api_key), 'message': message},
+                           endpoint='servermessage', server=server.name)
 
 
-async def status_fetch_async():
-    while True:
-        tasks = []
-        try:
-            global api_count
-            async with aiohttp.ClientSession() as session:
-                for server in server_list:
-                    tasks.append(
-                        fetch_api(session, "{}serverinfo/{}".format(api_url, server.service_id),
-                                  {'service_api_key': str(server.service_api_key)}))
-                    tasks.append(
-                        fetch_api(session, "{}playerlist/{}".format(api_url, server.service_id),
-                                  {'service_api_key': str(server.service_api_key)}))
-                    api_count += 2
-                results = await asyncio.gather(*tasks)
-                sub_list = [results[n:n + 2] for n in range(0, len(results), 2)]
-                index = 0
-                for api_return in sub_list:
-                    server = server_list[index]
-                    server.info = api_return[0]
-                    server.players = api_return[1]
-                    index += 1
-            await session.close()
-            await asyncio.sleep(status_refresh)  # task runs every 60 seconds
-        except Exception as error:
-            log.info('API Fetch Failed:' + str(error))
-
-
-async def initialize_servers():
-    server_list.clear()
-    for server in config_data.get('server', []):
-        update = Server()
-        update.name = server['name']
-        update.address = server['address']
-        update.server_url = server['server_url']
-        update.service_api_key = server['service_api_key']
-        update.service_id = server['service_id']
-        update.server_icon = server['server_icon']
-        server_list.append(update)
-    bot.loop.create_task(status_fetch_async())
-    bot.loop.create_task(leaderboard_fetch_async())
+broadcaster = announce.Broadcaster(post_server_message)
+
+
+async def send_announcement(names, message):
+    targets = [server for server in server_list if names is None or server.name in names]
+    results = await broadcaster.send(targets, message, dedupe=False)
+    log.info("Announcement '{}': {}/{} servers".format(message, len([result for result in results if result.ok]),
+                                                      len(results)))
+
+
+poll_scheduler = poller.PollScheduler(poll_server, status_refresh, delayed_refresh,
+                                      reconcile_interval=player_reconcile)
 
 
+def sync_servers(rebuilt=()):
+    """Matches server_list and the poll scheduler to the configured servers
 
-bot = commands.Bot(command_prefix='!', description='Aurora - The DayZ Discord Bot')
+    Servers that are still configured keep their data and poll schedule unless
+    named in rebuilt.
+    """
+    current = {server.name: server for server in server_list}
+    server_list.clear()
+    for name, entry in config_data.servers.items():
+        server = current.pop(name, None)
+        if server is None or name in rebuilt:
+            if server is not None:
+                poll_scheduler.remove_server(server)
+            tools.render_cache.invalidate(name)
+            server = servers.Server.from_config(entry)
+            server.sessions = session_tracker.table(name)
+            poll_scheduler.add_server(server)
+        server_list.append(server)
+    for server in current.values():
+        poll_scheduler.remove_server(server)
+        tools.render_cache.invalidate(server.name)
+    services.start('poller', poll_scheduler.run)
+
+
+async def apply_config(old, new, changes):
+    bind_settings(new)
+    poll_scheduler.status_interval = status_refresh
+    poll_scheduler.leaderboard_interval = delayed_refresh
+    poll_scheduler.reconcile_interval = player_reconcile
+    announcements.warnings = tuple(restart_warnings)
+    sync_servers(changes.rebuilt)
+    await start_log_monitors()
+    if activity_rotate:
+        services.start('activity', rotate_activity)
+    if changes.settings & {'telemetry_host', 'telemetry_port'}:
+        await services.stop('telemetry')
+        start_telemetry()
+    if changes.settings & {'profiling', 'slow_callback'}:
+        await services.stop('stalls')
+        start_profiling()
+    if changes.settings & {'host_metrics', 'host_metrics_interval', 'dayz_process', 'rpt_path'}:
+        await services.stop('host')
+        start_host_metrics()
+    if changes.needs_restart:
+        log.info('Configuration changes need a restart to apply: {}'.format(', '.join(changes.needs_restart)))
+
+
+class Aurora(commands.Bot):
+    async def close(self):
+        await services.shutdown()
+        await api_client.close()
+        await event_store.close()
+        metrics_history.save()
+        chart_renderer.close()
+        await super().close()
+
+
+bot = Aurora(command_prefix='!', description='Aurora - The DayZ Discord Bot')
 bot.add_cog(tools.CommandErrorHandler(bot))
+feed_dispatcher = dispatcher.FeedDispatcher(bot, rate_limiter=tools.send_scheduler.rate_limiter)
+
+telemetry.Callback('aurora_adm_lines_total', 'ADM log lines parsed', lambda: adm_parser.lines, kind='counter')
+telemetry.Callback('aurora_adm_events_total', 'ADM events parsed by kind', lambda: dict(adm_parser.counts), ('kind',),
+                   'counter')
+telemetry.Callback('aurora_render_cache_total', 'Render cache lookups by result',
+                   lambda: {'hit': tools.render_cache.hits, 'miss': tools.render_cache.misses}, ('result',), 'counter')
+telemetry.Callback('aurora_render_cache_hit_ratio', 'Render cache hit ratio',
+                   lambda: tools.render_cache.stats()['hit_ratio'])
+telemetry.Callback('aurora_chart_cache_total', 'Chart requests by result',
+                   lambda: {'hit': chart_renderer.hits, 'render': chart_renderer.renders}, ('result',), 'counter')
+telemetry.Callback('aurora_cftools_connections_total', 'CFTools connections opened and reused',
+                   lambda: {'created': api_client.connections_created, 'reused': api_client.connections_reused},
+                   ('event',), 'counter')
+telemetry.Callback('aurora_cftools_unchanged_total', 'CFTools responses skipped as unchanged',
+                   lambda: {'body': api_client.unchanged, 'not_modified': api_client.not_modified}, ('kind',),
+                   'counter')
+telemetry.Callback('aurora_poll_in_flight', 'Polls in flight', lambda: poll_scheduler.stats()['in_flight'])
+telemetry.Callback('aurora_feed_queue_depth', 'Live feed texts waiting to be sent', lambda: feed_dispatcher.queue_depth)
+telemetry.Callback('aurora_feed_total', 'Live feed texts and messages by event',
+                   lambda: {key: value for key, value in feed_dispatcher.stats().items() if key != 'queue_depth'},
+                   ('event',), 'counter')
+telemetry.Callback('aurora_events_written_total', 'ADM events written to the event store',
+                   lambda: event_store.written, kind='counter')
+telemetry.Callback('aurora_online_players', 'Players online by server',
+                   lambda: {server.name: tools.online_count(server) for server in server_list}, ('server',))
+telemetry.Callback('aurora_broadcasts_total', 'Server messages by outcome',
+                   lambda: {key: value for key, value in broadcaster.stats().items() if key != 'broadcasts'},
+                   ('outcome',), 'counter')
+telemetry.Callback('aurora_announcements_pending', 'Scheduled announcements', lambda: len(announcements))
+telemetry.Callback('aurora_host_cpu_percent', 'Host CPU usage, or the DayZ process share of it',
+                   lambda: host_values('cpu', 'process_cpu'), ('scope',))
+telemetry.Callback('aurora_host_memory_megabytes', 'Host memory in use, or the DayZ process working set',
+                   lambda: host_values('memory_used', 'process_memory'), ('scope',))
+telemetry.Callback('aurora_host_disk_used_gigabytes', 'Disk space used on the server volume',
+                   lambda: host_values('disk_used'))
+telemetry.Callback('aurora_service_restarts_total', 'Background service restarts', services.stats, ('service',),
+                   'counter')
+telemetry.Callback('aurora_service_up', 'Background services currently running',
+                   lambda: {name: int(service.state == supervisor.RUNNING) for name, service in services.services.items()},
+                   ('service',))
+
+
+def host_values(host, process=None):
+    sample = host_monitor.current() if host_monitor is not None else None
+    if sample is None:
+        return {}
+    if process is None:
+        return getattr(sample, host)
+    return {'host': getattr(sample, host), 'dayz': getattr(sample, process)}
+
+
+def start_telemetry():
+    if telemetry_port:
+        services.start('telemetry', telemetry.TelemetryServer(telemetry_host, int(telemetry_port)).run)
+
+
+stall_monitor = profiler.StallMonitor()
+host_monitor = None
+
+
+def start_host_metrics():
+    global host_monitor
+    if services.running('host'):
+        return
+    if host_monitor is not None:
+        host_monitor.close()
+        host_monitor = None
+    if not host_metrics:
+        return
+    backend = hostmetrics.select_backend(host_metrics, dayz_process, rpt_path)
+    if backend is None:
+        log.info('Host Metrics: no {} backend available'.format(host_metrics))
+        return
+    host_monitor = hostmetrics.HostMonitor(backend, host_metrics_interval)
+    services.start('host', host_monitor.run)
+
+
+def local_host(server):
+    """Latest host sample when server runs on this machine, i.e. it is the ADM log's server"""
+    if host_monitor is None or server.name != adm_server_name():
+        return None
+    return host_monitor.current()
+
+
+def start_profiling():
+    stall_monitor.threshold = slow_callback
+    if profiling:
+        services.start('stalls', stall_monitor.run)
+
+
+@bot.check_once
+async def start_command_trace(ctx):
+    # Runs before the command's own role checks, cooldowns and argument conversion
+    ctx.trace = profiler.start_trace(ctx.command.qualified_name) if profiling else None
+    return True
+
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.invoked_at = time.perf_counter()
+    trace = getattr(ctx, 'trace', None)
+    if trace is not None:
+        trace.add('check', ctx.invoked_at - trace.started)
+
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    started = getattr(ctx, 'invoked_at', None)
+    if started is not None:
+        telemetry.COMMAND_LATENCY.labels(ctx.command.qualified_name, 'error' if ctx.command_failed else 'ok').observe(
+            time.perf_counter() - started)
+    trace = getattr(ctx, 'trace', None)
+    if trace is not None:
+        total = trace.finish()
+        if total >= slow_command:
+            log.info('Slow Command: {}'.format(trace))
 
 
 @bot.event
 async def on_ready():
     global startup_time
-    await initialize_servers()
+    sync_servers()
     activity = discord.Game(name="!help for help")
     await bot.change_presence(status=discord.Status.online, activity=activity)
     bot_info = await bot.application_info()
     log.info("Aurora Discord Bot\nName: {}\nID: {}\nDescription: {}\nOwner: {}\nPublic: {}".format(bot_info.name,bot_info.id,bot_info.description,bot_info.owner,bot_info.bot_public))
     startup_time = datetime.datetime.now()
     log.info("Bot Connected")
-    log.info("Initial API Init: {} calls".format(api_count))
+    log.info("Initial API Init: {} calls".format(api_client.requests))
     log.info("SERVERINFO/PLAYERLIST Update: every {} seconds".format(status_refresh))
     log.info("STATS Update: every {} seconds".format(delayed_refresh))
     await asyncio.sleep(10)
-    bot.loop.create_task(rotate_activity())
-    bot.loop.create_task(debug_log_api())
-    bot.loop.create_task(log_monitor())
-    computer = wmi.WMI()
-    computer_info = computer.Win32_ComputerSystem()[0]
-    os_info = computer.Win32_OperatingSystem()[0]
-    proc_info = computer.Win32_Processor()[0]
-    gpu_info = computer.Win32_VideoController()[0]
-
-    os_name = os_info.Name.encode('utf-8').split(b'|')[0]
-    os_version = ' '.join([os_info.Version, os_info.BuildNumber])
-    system_ram = float(os_info.TotalVisibleMemorySize) / 1048576  # KB to GB
-    log.info('OS Name: {0}'.format(os_name))
-    log.info('OS Version: {0}'.format(os_version))
-    log.info('CPU: {0}'.format(proc_info.Name))
-    log.info('RAM: {0} GB'.format(system_ram))
-    log.info('Graphics Card: {0}'.format(gpu_info.Name))
+    if activity_rotate:
+        services.start('activity', rotate_activity)
+    services.start('debug', debug_log_api)
+    services.start('loop_lag', telemetry.monitor_loop_lag)
+    start_telemetry()
+    start_profiling()
+    services.start('feed', feed_dispatcher.run)
+    services.start('events', event_store.run)
+    services.start('announcements', functools.partial(announcements.run, send_announcement))
+    if config_data['config_watch']:
+        services.start('config', functools.partial(config_manager.watch, apply_config))
+    await start_log_monitors()
+    start_host_metrics()
 
 
 @bot.command()
@@ -311,78 +480,161 @@ async def reload(ctx):
     """[ADMIN] Reloads Configuration File"""
     log.info("Configuration Reload Requested")
     await ctx.send("Configuration Reload Requested")
-    with open('config.json', 'r') as config_file:
-        config_data = json.load(config_file)
-        token = config_data['discord_token']
-        report_channel = config_data['report_channel']
-        api_url = config_data['api_url']
-        guild_id = config_data['guild_id']
-        status_refresh = config_data['status_refresh']
-        delayed_refresh = config_data['delayed_refresh']
-        activity_rotate = config_data['activity_rotate']
-        activity_refresh = config_data['activity_refresh']
-        cooldown_channel = config_data['cooldown_channel']
-        cooldown_user = config_data['cooldown_user']
-        staff_role = tuple(config_data['permissions']['staff'])
-        moderator_role = tuple(config_data['permissions']['moderators'])
-        admin_role = tuple(config_data["permissions"]["admins"])
-        live_feed_channel = config_data['live_feed_channel']
     try:
-        await initialize_servers()
-    except Exception as error:
-        log.exception('Initialization Error:' + str(error))
-    await ctx.send('Configuration Reload Complete')
+        changes = await config_manager.reload(apply_config)
+    except config.ConfigError as error:
+        log.info('Configuration Not Reloaded: {}'.format(error))
+        await ctx.send('Configuration Not Reloaded: {}'.format(error))
+        return
+    output = 'Configuration Reload Complete: {}'.format(changes)
+    if changes.needs_restart:
+        output += ' (restart to apply {})'.format(', '.join(changes.needs_restart))
+    await ctx.send(output)
+
+
+async def show_server_activity(server):
+    info = server.info
+    if info is None:
+        return
+    if info.state == 'running':
+        player_activity = '{}: {}/{} Online'.format(server.name, tools.online_count(server), info.max_players)
+        activity = discord.Game(name=player_activity)
+        await bot.change_presence(status=discord.Status.online, activity=activity)
+    elif info.state == 'starting':
+        player_activity = '{}: Server Restarting'.format(server.name)
+        activity = discord.Game(name=player_activity)
+        await bot.change_presence(status=discord.Status.idle, activity=activity)
+    elif info.state == 'idle':
+        player_activity = '{}: Server Offline'.format(server.name)
+        activity = discord.Game(name=player_activity)
+        await bot.change_presence(status=discord.Status.do_not_disturb, activity=activity)
 
 
 async def rotate_activity():
     rotate_position = 0
     while activity_rotate is True:
-        try:
-            server = server_list[rotate_position]
-            info = server.info
-            if info['state'] == 'running':
-                player_activity = '{}: {}/{} Online'.format(server.name, info['current_players'], info['max_players'])
-                activity = discord.Game(name=player_activity)
-                await bot.change_presence(status=discord.Status.online, activity=activity)
-            elif info['state'] == 'starting':
-                player_activity = '{}: Server Restarting'.format(server.name)
-                activity = discord.Game(name=player_activity)
-                await bot.change_presence(status=discord.Status.idle, activity=activity)
-            elif info['state'] == 'idle':
-                player_activity = '{}: Server Offline'.format(server.name)
-                activity = discord.Game(name=player_activity)
-                await bot.change_presence(status=discord.Status.do_not_disturb, activity=activity)
-            if rotate_position == (int(len(server_list)) - 1):
+        if rotate_position >= len(server_list):
+            rotate_position = 0
+        if server_list:
+            with supervisor.iteration():
+                await show_server_activity(server_list[rotate_position])
+            if rotate_position == len(server_list) - 1:
                 rotate_position = 0
                 await asyncio.sleep(activity_refresh)
-                player_activity = '!help for help'
-                activity = discord.Game(name=player_activity)
-                await bot.change_presence(status=discord.Status.online, activity=activity)
+                activity = discord.Game(name='!help for help')
+                with supervisor.iteration():
+                    await bot.change_presence(status=discord.Status.online, activity=activity)
             else:
                 rotate_position += 1
-        except Exception as error:
-            pass
         await asyncio.sleep(activity_refresh)
 
+
+def event_kinds(kind):
+    if kind == 'all':
+        return None
+    if kind not in adm.EVENT_TYPES:
+        raise commands.BadArgument('Unknown event type: ' + kind)
+    return (kind,)
+
+
+async def send_lines(ctx, lines, max_messages=5, empty='No Events Found', newest=False):
+    """Sends lines packed into at most max_messages; newest keeps the end of the lines instead of the start"""
+    if not lines:
+        await ctx.send(empty)
+        return
+    messages = dispatcher.pack_lines(lines)
+    truncated = len(messages) > max_messages
+    if truncated and newest:
+        await tools.send_scheduler.send(ctx, 'Output truncated, showing the newest lines')
+        messages = messages[-max_messages:]
+    for message in messages[:max_messages]:
+        await tools.send_scheduler.send(ctx, message)
+    if truncated and not newest:
+        await tools.send_scheduler.send(ctx, 'Output truncated, narrow the search to see more')
+
+
+async def send_events(ctx, stored_events, max_messages=5):
+    await send_lines(ctx, [str(stored_event) for stored_event in stored_events], max_messages)
+
+
+def log_file_path(log_file):
+    sources = log_sources()
+    if log_file == 'adm':
+        return logfollow.newest_log(sources[0][1]) if sources else None
+    for name, path, channel in sources:
+        if name == log_file:
+            return logfollow.newest_log(path)
+    if log_file == 'rpt':
+        return logfollow.newest_log(rpt_path, '*.RPT')
+    raise commands.BadArgument('Unknown log file: ' + log_file)
+
+
 @bot.command()
 @commands.cooldown(1, cooldown_channel, commands.BucketType.channel)
 @commands.has_any_role(*admin_role)
-async def log_view(ctx, log_file: str, range: int):
-    """[ADMIN] Server Log Viewer"""
-    # if log_file == 'adm':
-    #     latest = tailer.tail(open('DayZServer_x64.ADM'), range + 1)
-    #     for i, a in enumerate(latest):
-    #         log = '```' + a + '```'
-    #         await ctx.send(log)
+async def log_view(ctx, log_file: str, start: str, *filters):
+    """[ADMIN] Server Log Viewer\n\nCommand Syntax: !log_view <adm|rpt|server> <lines|start end> [event type] [player or text]\nTimes are 'YYYY-MM-DD HH:MM[:SS]' or 'HH:MM[:SS]' (today)"""
+    path = log_file_path(log_file)
+    if path is None:
+        await ctx.send('Error: Log File Not Found')
+        return
+    end = None
+    if not start.isdigit():
+        if not filters:
+            raise commands.BadArgument('Missing end time')
+        end, filters = filters[0], filters[1:]
+    kinds = tuple(term for term in filters if term in adm.EVENT_TYPES)
+    terms = [term for term in filters if term not in adm.EVENT_TYPES]
+    match = logview.line_filter(kinds, terms)
+    loop = asyncio.get_event_loop()
+    if end is None:
+        lines = await loop.run_in_executor(None, logview.tail, path, min(int(start), 500), match)
+    else:
+        try:
+            start_time, end_time = eventstore.parse_when(start), eventstore.parse_when(end)
+        except ValueError as error:
+            raise commands.BadArgument(str(error))
+        index = logview.index_for(path)
+        lines = await loop.run_in_executor(None, index.between, start_time, end_time, match, 500)
+    # A tail is oldest-first and the newest lines are the point; a time window reads from its start
+    await send_lines(ctx, lines, empty='No Log Lines Found', newest=end is None)
+
+
+@bot.command()
+@commands.has_any_role(*staff_role)
+@commands.cooldown(1, cooldown_user, commands.BucketType.user)
+async def events(ctx, player: str, kind: str = 'all', limit: int = 20):
+    """[STAFF] Recent Player Events\n\nCommand Syntax: !events <BUID or name> [all|kill|death|hit|connect|disconnect] [limit]"""
+    kinds = event_kinds(kind)
+    await event_store.flush()
+    buid = await event_store.resolve_buid(player)
+    if buid is None:
+        await ctx.send('Error: Player Not Found')
+        return
+    await send_events(ctx, await event_store.player_events(buid, kinds, min(limit, 100)))
+
+
+@bot.command()
+@commands.has_any_role(*staff_role)
+@commands.cooldown(1, cooldown_user, commands.BucketType.user)
+async def window(ctx, start: str, end: str, kind: str = 'all'):
+    """[STAFF] Events In A Time Window\n\nCommand Syntax: !window '<[YYYY-MM-DD] HH:MM>' '<[YYYY-MM-DD] HH:MM>' [kind]"""
+    kinds = event_kinds(kind)
+    try:
+        start_ts = eventstore.parse_when(start)
+        end_ts = eventstore.parse_when(end)
+    except ValueError as error:
+        raise commands.BadArgument(str(error))
+    await event_store.flush()
+    await send_events(ctx, await event_store.window(start_ts, end_ts, kinds))
+
 
 @bot.command()
 @commands.cooldown(1, cooldown_user, commands.BucketType.user)
 async def status(ctx, name: str):
     """Displays Server Status Information"""
     if name == 'all':
-        for server in server_list:
-            await tools.display_status(ctx, server)
-            await asyncio.sleep(1)
+        await tools.display_all(ctx, 'status', server_list, tools.build_status)
     if name != 'all':
             found = False
             for server in server_list:
@@ -399,27 +651,73 @@ async def status(ctx, name: str):
 async def tech(ctx, name: str):
     """[STAFF] Displays Server Technical Details"""
     if name == 'all':
+        embeds = []
         for server in server_list:
-            await tools.display_tech(ctx, server)
-            await asyncio.sleep(1)
+            embeds.extend(tools.tech_embeds(server, local_host(server)))
+        await tools.send_embeds(ctx, embeds)
     if name != 'all':
         found = False
         for server in server_list:
             if server.name == name:
                 found = True
-                await tools.display_tech(ctx, server)
+                await tools.display_tech(ctx, server, local_host(server))
         if found == False:
             await ctx.send('Server: ' + name + ' not found')
 
 
+@bot.command()
+@commands.cooldown(1, cooldown_user, commands.BucketType.user)
+async def history(ctx, name: str, metric: str = 'all', window: str = '24h'):
+    """Server Health History\n\nCommand Syntax: !history <shortname> [fps|cpu|memory|process_cpu|process_memory|players|all] [window, e.g. 90m, 24h, 7d]"""
+    if metric == 'all':
+        names = metrics.METRICS
+    elif metric in metrics.METRICS:
+        names = (metric,)
+    else:
+        raise commands.BadArgument('Unknown metric: ' + metric)
+    try:
+        seconds = metrics.parse_window(window)
+    except ValueError as error:
+        raise commands.BadArgument(str(error))
+    for server in server_list:
+        if server.name == name:
+            summaries = [(metric, metrics_history.summary(server.name, metric, seconds)) for metric in names]
+            await ctx.send(tools.format_history(server, window, summaries))
+            return
+    await ctx.send('Error: Server Not Found')
+
+
+@bot.command()
+@commands.cooldown(1, cooldown_user, commands.BucketType.user)
+async def graph(ctx, name: str, metric: str = metrics.FPS, window: str = '24h'):
+    """Server Health Graph\n\nCommand Syntax: !graph <shortname> [fps|cpu|memory|process_cpu|process_memory|players] [window, e.g. 90m, 24h, 7d]"""
+    if metric not in metrics.METRICS:
+        raise commands.BadArgument('Unknown metric: ' + metric)
+    try:
+        seconds = metrics.parse_window(window)
+    except ValueError as error:
+        raise commands.BadArgument(str(error))
+    for server in server_list:
+        if server.name == name:
+            summary = metrics_history.summary(server.name, metric, seconds)
+            if summary is None:
+                await ctx.send('No {} history for {} yet'.format(metric, server.name))
+                return
+            with profiler.phase('render'):
+                image = await chart_renderer.render(
+                    (server.name, metric, window), lambda: metrics_history.points(server.name, metric, seconds))
+            embed = tools.build_graph(server, metric, window, summary)
+            await ctx.send(file=discord.File(io.BytesIO(image), filename='graph.png'), embed=embed)
+            return
+    await ctx.send('Error: Server Not Found')
+
+
 @bot.command()
 @commands.cooldown(1, cooldown_channel, commands.BucketType.channel)
 async def mods(ctx, name: str):
     """Server Mods List\n\nCommand Syntax: !mods <all> or <name>"""
     if name == 'all':
-        for server in server_list:
-            await tools.display_mods(ctx, server)
-            await asyncio.sleep(1)
+        await tools.display_all(ctx, 'mods', server_list, tools.build_mods)
     if name != 'all':
         found = False
         for server in server_list:
@@ -430,28 +728,29 @@ async def mods(ctx, name: str):
             await ctx.send('Server: ' + name + ' not found')
 
 
+def schedule_message(server):
+    info = server.info
+    if info is None:
+        return '```{}'.format(server.name).center(60, ' ') + '\nNo server data yet```'
+    output = '```{}'.format(info.servername).center(60, ' ') + '\n'
+    if info.schedule is None:
+        return output + 'No scheduled server task```'
+    return output + 'Next server task is {} at {}```'.format(info.schedule.action, info.schedule.time)
+
+
 @bot.command()
 @commands.cooldown(1, cooldown_channel, commands.BucketType.channel)
 async def schedule(ctx, name: str):
     """Next Scheduled Event\n\nCommand Syntax: !schedule <all> or <shortname>"""
     if name in 'all':
         for server in server_list:
-            info = server.info
-            output = '```{}'.format(info['servername']).center(60, ' ') + '\n'
-            output += 'Next server task is {} at {}```'.format(info['next_scheduled_task']['task']['action'],
-                                                               info['next_scheduled_task']['task']['time'])
-            await ctx.send(output)
+            await tools.send_scheduler.send(ctx, schedule_message(server))
     else:
         found = False
         for server in server_list:
             if server.name == name:
                 found = True
-                info = server.info
-                output = '```{}'.format(info['servername']).center(60, ' ') + '\n'
-                output += 'Next server task is {} at {}```'.format(info['next_scheduled_task']['task'] \
-                                                                       ['action'],
-                                                                   info['next_scheduled_task']['task']['time'])
-                await ctx.send(output)
+                await tools.send_scheduler.send(ctx, schedule_message(server))
         if not found:
             await ctx.send('Error: Server Not Found')
 
@@ -462,9 +761,7 @@ async def schedule(ctx, name: str):
 async def players(ctx, name: str):
     """[STAFF] Online Players List\n\nCommand Syntax: !players <all> or <shortname>"""
     if name == 'all':
-        for server in server_list:
-            await tools.display_players(ctx, server)
-            await asyncio.sleep(1)
+        await tools.display_all(ctx, 'players', server_list, tools.build_players)
     elif name != 'all':
         found = False
         for server in server_list:
@@ -489,12 +786,12 @@ async def list(ctx):
         name = server.name
         info = server.info
         server_short += name + '\n'
-        server_long += str(info['servername'])[:40] + '\n'
+        server_long += (str(info.servername)[:40] if info is not None else 'No Data Yet') + '\n'
     embed.set_author(name='Network List', icon_url=icon_url)
     embed.set_footer(text="Report Generated", icon_url=icon_url)
     embed.add_field(name="Name", value=server_short, inline=True)
     embed.add_field(name="Server", value=server_long, inline=True)
-    await ctx.send(embed=embed)
+    await tools.send_scheduler.send(ctx, embed=embed)
 
 
 @bot.command()
@@ -521,62 +818,106 @@ async def report(ctx, player: str, category: str, details: str, location: str, t
 async def broadcast(ctx, name: str, message: str):
     """ [ADMIN] Server Broadcast \n\nCommand Syntax: !broadcast <all> or <shortname> '<message>'"""
     if name == 'all':
-        for server in server_list:
-            service_api_key = server.service_api_key
-            service_id = server.service_id
-            data = {
-                'service_api_key': '{}'.format(service_api_key),
-                'message': '{}'.format(message)
-            }
-            url = "{}servermessage/{}".format(api_url, service_id)
-            try:
-                async with aiohttp.ClientSession() as session:
-                    await fetch_api(session, url=url, data=data)
-                    await ctx.send('Message Broadcast to Entire Network!')
-                await session.close()
-            except Exception as error:
-                log.info('Broadcast Error:' + str(error))
+        targets = server_list
+    else:
+        targets = [server for server in server_list if server.name == name]
+    if not targets:
+        await ctx.send('Error: Server Not Found')
+        return
+    results = await broadcaster.send(targets, message)
+    await ctx.send(tools.format_broadcast(message, results))
+
+
+def parse_due(text, now):
+    """'+15m' or '15m' from now, or a 'YYYY-MM-DD HH:MM' / 'HH:MM' local time (next occurrence)"""
+    try:
+        return now + metrics.parse_window(text.lstrip('+'))
+    except ValueError:
+        pass
+    due = eventstore.parse_when(text)
+    if due <= now and len(text) <= 8:
+        due += 86400
+    return due
 
-    if name != 'all':
-        found = False
-        for server in server_list:
-            if server.name == name:
-                info = server.info
-                found = True
-                service_api_key = server.service_api_key
-                service_id = server.service_id
-                data = {
-                    'service_api_key': '{}'.format(service_api_key),
-                    'message': '{}'.format(message)
-                }
-                url = "{}servermessage/{}".format(api_url, service_id)
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        await fetch_api(session, url=url, data=data)
-                        output = 'Message Broadcast to Server: ' + info['servername']
-                        await ctx.send(output)
-                    await session.close()
-                except Exception as error:
-                    log.exception('Broadcast Error: ' + str(error))
-        if found == False:
-            await ctx.send('Error: Server Not Found')
+
+@bot.command(name='announce')
+@commands.has_any_role(*admin_role)
+async def add_announcement(ctx, name: str, when: str, message: str, repeat: str = None):
+    """ [ADMIN] Scheduled Broadcast \n\nCommand Syntax: !announce <all> or <shortname> <+15m or HH:MM> '<message>' [repeat, e.g. 2h]"""
+    if name != 'all' and name not in [server.name for server in server_list]:
+        await ctx.send('Error: Server Not Found')
+        return
+    try:
+        now = time.time()
+        due = parse_due(when, now)
+        interval = metrics.parse_window(repeat) if repeat else 0
+    except ValueError as error:
+        raise commands.BadArgument(str(error))
+    if repeat and interval < 60:
+        raise commands.BadArgument('Repeat interval must be at least 1m')
+    entry = announcements.add(due, message, None if name == 'all' else (name,), interval)
+    await ctx.send('Announcement {} scheduled for {}'.format(entry.id, tools.format_announcement(entry)))
+
+
+@bot.command(name='announcements')
+@commands.has_any_role(*admin_role)
+async def list_announcements(ctx):
+    """ [ADMIN] Lists Scheduled Broadcasts """
+    await send_lines(ctx, [tools.format_announcement(entry) for entry in announcements.pending()],
+                     empty='No Announcements Scheduled')
+
+
+@bot.command()
+@commands.has_any_role(*admin_role)
+async def tasks(ctx):
+    """ [ADMIN] Background Services: state, restarts and loop iteration latency """
+    await send_lines(ctx, tools.format_services(services.services.values()), empty='No Services Running')
 
 
 @bot.command()
+@commands.has_any_role(*admin_role)
 @commands.cooldown(1, cooldown_channel, commands.BucketType.channel)
-async def kills(ctx, name: str, limit: int):
-    """ Kills Leaderboard \n\nCommand Syntax: !kills [all][server] [limit]"""
+async def profile(ctx, seconds: int = 10):
+    """ [ADMIN] Samples the Bot's Event Loop and Uploads the Profile\n\nCommand Syntax: !profile [seconds, up to 60]"""
+    seconds = min(max(seconds, 1), 60)
+    await ctx.send('Profiling for {} seconds'.format(seconds))
+    samples, stacks = await asyncio.get_event_loop().run_in_executor(
+        None, profiler.sample_stacks, threading.get_ident(), seconds)
+    if not samples:
+        await ctx.send('No Samples Taken')
+        return
+    dump = profiler.format_profile(samples, stacks)
+    if stall_monitor.stalls:
+        dump += '\nRecent Stalls:\n' + profiler.format_stalls(stall_monitor.stalls)
+    await ctx.send(file=discord.File(io.BytesIO(dump.encode('utf-8')), filename='profile.txt'))
+
+
+@bot.command()
+@commands.has_any_role(*admin_role)
+async def unannounce(ctx, announcement_id: int):
+    """ [ADMIN] Cancels a Scheduled Broadcast \n\nCommand Syntax: !unannounce <id>"""
+    if announcements.cancel(announcement_id) is None:
+        await ctx.send('Announcement {} not found'.format(announcement_id))
+        return
+    await ctx.send('Announcement {} cancelled'.format(announcement_id))
+
+
+@bot.command()
+@commands.cooldown(1, cooldown_channel, commands.BucketType.channel)
+async def kills(ctx, name: str, limit: int, sort: str = leaderboard.KILLS):
+    """ Kills Leaderboard \n\nCommand Syntax: !kills [all][server] [limit] <kills|deaths|kd|kph>"""
+    if sort not in leaderboard.KILL_ORDERS:
+        await ctx.send("Unknown Sort: {} (use {})".format(sort, ', '.join(leaderboard.KILL_ORDERS)))
+        return
     if limit <= 50:
         if name == 'all':
-            for server in server_list:
-                await tools.display_kills(ctx, limit, server)
-                await asyncio.sleep(1)
+            await tools.display_all(ctx, 'kills', server_list, tools.build_kills, limit, sort)
         if name != 'all':
             found = False
             for server in server_list:
                 if server.name == name:
                     found = True
-                    await tools.display_kills(ctx, limit, server)
+                    await tools.display_kills(ctx, limit, server, sort)
             if found == False:
                 await ctx.send('Server: ' + name + ' not found')
     if limit > 50:
@@ -589,9 +930,7 @@ async def played(ctx, name: str, limit: int):
     """ Played Time Leaderboard \n\nCommand Syntax: !played [all][server] [limit]"""
     if limit <= 50:
         if name == 'all':
-            for server in server_list:
-                await tools.display_played(ctx, limit, server)
-                await asyncio.sleep(1)
+            await tools.display_all(ctx, 'played', server_list, tools.build_played, limit)
         if name != 'all':
             found = False
             for server in server_list:
@@ -607,11 +946,17 @@ async def played(ctx, name: str, limit: int):
 @commands.cooldown(1, cooldown_channel, commands.BucketType.channel)
 async def api(ctx):
     """ Displays Total API Calls """
-    global api_count
     global startup_time
     uptime = (datetime.datetime.now() - startup_time)
-    await ctx.send("Uptime: {}".format(uptime))
-    await ctx.send("Total CFTools API Calls: {}".format(api_count))
-
-
-bot.run(token)
+    lines = ["Uptime: {}".format(uptime),
+             "Total CFTools API Calls: {}".format(api_client.requests),
+             "API Connections: {connections_created} opened, {connections_reused} reused, {failures} failed"
+             .format(**api_client.stats()),
+             "Render Cache: {hits} hits, {misses} misses ({hit_ratio:.0%})".format(**tools.render_cache.stats()),
+             "Live Feed: {queue_depth} queued, {messages} messages, {coalesced} coalesced, {dropped} dropped"
+             .format(**feed_dispatcher.stats())]
+    await tools.send_scheduler.send(ctx, '\n'.join(lines))
+
+
+if __name__ == '__main__':
+    bot.run(token)
@@ -0,0 +1,40 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Runs the whole benchmark suite with default settings
+
+Usage: python -m benchmarks
+"""
+import asyncio
+
+from benchmarks import bench_adm, bench_api, bench_render
+from benchmarks.mock_api import MockCFTools
+
+
+def main():
+    print('== ADM parse throughput')
+    lines = bench_adm.load_corpus()
+    parser, elapsed = bench_adm.run(lines)
+    print('{:,.0f} lines/s ({} lines, {} events)'.format(parser.lines / elapsed, parser.lines, parser.events))
+    print()
+    print('== Fetch cycle latency (5 servers, 20 ms mock latency)')
+    bench_api.report(asyncio.get_event_loop().run_until_complete(
+        bench_api.run(5, 20, MockCFTools(latency=0.02))))
+    print()
+    print('== Renderer time per embed')
+    bench_render.report(bench_render.run())
+
+
+if __name__ == '__main__':
+    main()
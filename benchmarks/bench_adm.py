@@ -0,0 +1,57 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""ADM parser throughput benchmark
+
+Usage: python -m benchmarks.bench_adm [corpus.ADM] [repeat]
+"""
+import os
+import sys
+import time
+
+import adm
+
+CORPUS = os.path.join(os.path.dirname(__file__), 'data', 'DayZServer_x64.ADM')
+
+
+def load_corpus(path=CORPUS):
+    with open(path, encoding='utf-8', errors='replace') as corpus:
+        return corpus.readlines()
+
+
+def run(lines, repeat=2000):
+    parser = adm.AdmParser()
+    parse = parser.parse
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            parse(line)
+    elapsed = time.perf_counter() - start
+    return parser, elapsed
+
+
+def main(argv):
+    path = argv[1] if len(argv) > 1 else CORPUS
+    repeat = int(argv[2]) if len(argv) > 2 else 2000
+    lines = load_corpus(path)
+    parser, elapsed = run(lines, repeat)
+    print('Corpus: {} ({} lines x {})'.format(path, len(lines), repeat))
+    print('Parsed {} lines, {} events in {:.3f}s'.format(parser.lines, parser.events, elapsed))
+    print('Throughput: {:,.0f} lines/s'.format(parser.lines / elapsed))
+    for kind, count in parser.counts.items():
+        print('  {:<10} {}'.format(kind, count))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,95 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Fetch-cycle benchmark against the local CFTools stand-in
+
+One cycle fetches serverinfo, playerlist and both stats boards for every server
+concurrently and parses them into the Server model, as the poll scheduler does.
+
+Usage: python -m benchmarks.bench_api [servers] [cycles] [latency] [error_rate] [change_rate]
+"""
+import asyncio
+import sys
+import time
+
+import cftools
+import poller
+import servers
+from benchmarks.mock_api import MockCFTools
+
+ENDPOINTS = poller.STATUS_ENDPOINTS + poller.LEADERBOARD_ENDPOINTS
+
+
+def percentile(values, rank):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(rank / 100 * len(ordered)))]
+
+
+async def poll(client, api_url, server, endpoint):
+    validator = server.validators.setdefault(endpoint, cftools.Validator())
+    data = {'service_api_key': server.service_api_key}
+    if endpoint in poller.LEADERBOARD_ENDPOINTS:
+        url = '{}stats/{}'.format(api_url, server.service_id)
+        data.update({'order': 'descending', 'stat_type': endpoint})
+    else:
+        url = '{}{}/{}'.format(api_url, endpoint, server.service_id)
+    payload = await client.post(url, data, validator)
+    if payload is None:
+        return False
+    if payload is not cftools.UNCHANGED:
+        server.update(endpoint, payload)
+    return True
+
+
+async def run(server_count=5, cycles=20, mock=None):
+    mock = mock or MockCFTools()
+    api_url = await mock.start()
+    client = cftools.CFToolsClient()
+    server_list = [servers.Server('s{}'.format(index), '127.0.0.1:2302', 'http://localhost', 'key',
+                                  'service{}'.format(index)) for index in range(server_count)]
+    timings = []
+    failures = 0
+    try:
+        for _ in range(cycles):
+            start = time.perf_counter()
+            results = await asyncio.gather(*[poll(client, api_url, server, endpoint)
+                                             for server in server_list for endpoint in ENDPOINTS])
+            timings.append(time.perf_counter() - start)
+            failures += results.count(False)
+    finally:
+        await client.close()
+        await mock.stop()
+    return {'cycles': cycles, 'requests': cycles * server_count * len(ENDPOINTS), 'failures': failures,
+            'mean': sum(timings) / len(timings), 'p50': percentile(timings, 50), 'p95': percentile(timings, 95),
+            'max': max(timings), 'client': client.stats(), 'servers': server_list}
+
+
+def report(result):
+    print('Fetch cycles: {cycles} ({requests} requests, {failures} failed)'.format(**result))
+    print('Cycle latency: mean {:.1f} ms  p50 {:.1f} ms  p95 {:.1f} ms  max {:.1f} ms'.format(
+        result['mean'] * 1000, result['p50'] * 1000, result['p95'] * 1000, result['max'] * 1000))
+    print('Client: {}'.format(result['client']))
+
+
+def main(argv):
+    server_count = int(argv[1]) if len(argv) > 1 else 5
+    cycles = int(argv[2]) if len(argv) > 2 else 20
+    mock = MockCFTools(latency=float(argv[3]) if len(argv) > 3 else 0.0,
+                       error_rate=float(argv[4]) if len(argv) > 4 else 0.0,
+                       change_rate=float(argv[5]) if len(argv) > 5 else 1.0)
+    report(asyncio.get_event_loop().run_until_complete(run(server_count, cycles, mock)))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,102 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Embed renderer benchmark
+
+Builds every embed type from stand-in payloads, uncached and through the render
+cache, and reports the time per embed.
+
+Usage: python -m benchmarks.bench_render [repeat] [players] [users] [mods]
+"""
+import sys
+import time
+
+import leaderboard
+import poller
+import servers
+import tools
+from benchmarks.mock_api import MockCFTools
+
+BUILDERS = (
+    ('status', tools.build_status, ()),
+    ('tech', tools.build_tech, ()),
+    ('mods', tools.build_mods, ()),
+    ('players', tools.build_players, ()),
+    ('kills', tools.build_kills, (50, leaderboard.KILLS)),
+    ('kills kd', tools.build_kills, (50, leaderboard.KD)),
+    ('played', tools.build_played, (50,)),
+)
+
+
+def make_server(mock):
+    server = servers.Server('bench', '127.0.0.1:2302', 'http://localhost', 'key', 'bench', 'http://localhost/icon')
+    server.update(poller.SERVERINFO, mock.serverinfo_payload('bench'))
+    server.update(poller.PLAYERLIST, mock.playerlist_payload('bench'))
+    server.update(poller.KILLS, mock.stats_payload(poller.KILLS))
+    server.update(poller.PLAYTIME, mock.stats_payload(poller.PLAYTIME))
+    return server
+
+
+def time_parse(mock, repeat):
+    """Seconds to parse one full set of payloads into the Server model"""
+    payloads = ((poller.SERVERINFO, mock.serverinfo_payload('bench')),
+                (poller.PLAYERLIST, mock.playerlist_payload('bench')),
+                (poller.KILLS, mock.stats_payload(poller.KILLS)),
+                (poller.PLAYTIME, mock.stats_payload(poller.PLAYTIME)))
+    server = servers.Server('bench')
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for endpoint, payload in payloads:
+            server.update(endpoint, payload)
+    return (time.perf_counter() - start) / repeat
+
+
+def run(repeat=200, mock=None):
+    mock = mock or MockCFTools()
+    server = make_server(mock)
+    results = []
+    for name, build, args in BUILDERS:
+        embeds = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            embeds += len(build(server, *args))
+        uncached = (time.perf_counter() - start) / max(embeds, 1)
+        cache = tools.RenderCache()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            cache.render(name, server, build, *args)
+        cached = (time.perf_counter() - start) / max(embeds, 1)
+        results.append((name, embeds // repeat, uncached, cached))
+    return {'results': results, 'parse': time_parse(mock, max(repeat // 10, 1)), 'mock': mock}
+
+
+def report(result):
+    mock = result['mock']
+    print('Payloads: {} players, {} leaderboard users, {} mods'.format(mock.players, mock.users, mock.mods))
+    print('Parse all payloads: {:.2f} ms'.format(result['parse'] * 1000))
+    print('{:<10} {:>7} {:>14} {:>14}'.format('Embed', 'Embeds', 'Build/embed', 'Cached/embed'))
+    for name, embeds, uncached, cached in result['results']:
+        print('{:<10} {:>7} {:>11.1f} us {:>11.1f} us'.format(name, embeds, uncached * 1e6, cached * 1e6))
+
+
+def main(argv):
+    repeat = int(argv[1]) if len(argv) > 1 else 200
+    mock = MockCFTools(players=int(argv[2]) if len(argv) > 2 else 120,
+                       users=int(argv[3]) if len(argv) > 3 else 1000,
+                       mods=int(argv[4]) if len(argv) > 4 else 40)
+    report(run(repeat, mock))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,146 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""In-process stand-in for the Discord transport
+
+Channels record everything sent to them with timestamps. Each channel has a
+token bucket like Discord's per-route limit (5 messages per 5 seconds by
+default). An exhausted bucket counts a simulated 429 and then either waits out
+retry_after, which is what discord.py does internally, or raises an
+HTTPException with status 429.
+"""
+import asyncio
+import time
+
+import discord
+
+
+class SentMessage(object):
+    __slots__ = ('channel_id', 'time', 'content', 'embeds', 'files')
+
+    def __init__(self, channel_id, when, content=None, embeds=(), files=()):
+        self.channel_id = channel_id
+        self.time = when
+        self.content = content
+        self.embeds = embeds
+        self.files = files
+
+
+class _Response(object):
+    """Minimal aiohttp-like response for constructing discord.HTTPException"""
+    status = 429
+    reason = 'Too Many Requests'
+
+
+class RateLimited(discord.HTTPException):
+    def __init__(self, retry_after):
+        discord.HTTPException.__init__(self, _Response(), {'message': 'You are being rate limited.',
+                                                           'retry_after': retry_after})
+        self.retry_after = retry_after
+
+
+class FakeTransport(object):
+    def __init__(self, rate=5, per=5.0, latency=0.0, raise_429=False):
+        self.rate = rate
+        self.per = per
+        self.latency = latency
+        self.raise_429 = raise_429
+        self.sent = []
+        self.rate_limited = 0
+        self.channels = {}
+        self._buckets = {}
+        self.started = time.monotonic()
+
+    def channel(self, channel_id):
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = FakeChannel(self, channel_id)
+        return channel
+
+    def _retry_after(self, channel_id, now):
+        window, count = self._buckets.get(channel_id, (now, 0))
+        if now - window >= self.per:
+            window, count = now, 0
+        if count < self.rate:
+            self._buckets[channel_id] = (window, count + 1)
+            return 0
+        return window + self.per - now
+
+    async def deliver(self, channel_id, message):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        while True:
+            retry_after = self._retry_after(channel_id, time.monotonic())
+            if not retry_after:
+                break
+            self.rate_limited += 1
+            if self.raise_429:
+                raise RateLimited(retry_after)
+            await asyncio.sleep(retry_after)
+        message.time = time.monotonic()
+        self.sent.append(message)
+        return message
+
+    def reset(self):
+        self.sent = []
+        self.rate_limited = 0
+        self._buckets.clear()
+        self.started = time.monotonic()
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        embeds = sum(len(message.embeds) for message in self.sent)
+        return {'messages': len(self.sent), 'embeds': embeds, 'rate_limited': self.rate_limited,
+                'messages_per_second': round(len(self.sent) / elapsed, 2) if elapsed else 0.0}
+
+
+class FakeChannel(object):
+    def __init__(self, transport, channel_id):
+        self.transport = transport
+        self.id = channel_id
+
+    async def send(self, content=None, *, embed=None, embeds=None, file=None, files=None, **kwargs):
+        embeds = list(embeds or ()) + ([embed] if embed is not None else [])
+        files = list(files or ()) + ([file] if file is not None else [])
+        return await self.transport.deliver(self.id, SentMessage(
+            self.id, None, content, [embed.to_dict() for embed in embeds], [attachment.filename for attachment in files]))
+
+
+class FakeAuthor(FakeChannel):
+    def __init__(self, transport, name='bench#0001', channel_id=0):
+        FakeChannel.__init__(self, transport, channel_id)
+        self.name = name
+        self.roles = []
+
+    def __str__(self):
+        return self.name
+
+
+class FakeContext(object):
+    """Enough of commands.Context for command callbacks that only send replies"""
+    def __init__(self, transport, channel_id=1, command=None):
+        self.channel = transport.channel(channel_id)
+        self.author = FakeAuthor(transport)
+        self.guild = None
+        self.command = command
+        self.send = self.channel.send
+
+
+class FakeBot(object):
+    """Stands in for the bot where only get_channel() is used, e.g. FeedDispatcher"""
+    def __init__(self, transport):
+        self.transport = transport
+
+    def get_channel(self, channel_id):
+        return self.transport.channel(channel_id)
@@ -0,0 +1,165 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Local stand-in for the CFTools v1 service API
+
+Serves serverinfo, playerlist, stats and servermessage with configurable latency,
+error rate and payload sizes. Point api_url at it to run the bot against it.
+
+Usage: python -m benchmarks.mock_api [--port 8080] [--players 120] [--users 1000]
+       [--mods 40] [--latency 0.05] [--error-rate 0.0] [--change-rate 1.0]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+
+class MockCFTools(object):
+    """aiohttp application answering CFTools API calls with generated payloads
+
+    Payloads are generated from a seeded random source. With change_rate below 1
+    a response repeats the previous body for that endpoint, which exercises the
+    client's unchanged-payload path.
+    """
+    def __init__(self, players=120, users=1000, mods=40, latency=0.0, jitter=0.0, error_rate=0.0,
+                 change_rate=1.0, seed=1):
+        self.players = players
+        self.users = users
+        self.mods = mods
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.change_rate = change_rate
+        self.random = random.Random(seed)
+        self.requests = {}
+        self.errors = 0
+        self.messages = []
+        self._bodies = {}
+        self._runner = None
+        self.app = web.Application()
+        self.app.router.add_post('/api/v1/serverinfo/{service_id}', self.serverinfo)
+        self.app.router.add_post('/api/v1/playerlist/{service_id}', self.playerlist)
+        self.app.router.add_post('/api/v1/stats/{service_id}', self.stats)
+        self.app.router.add_post('/api/v1/servermessage/{service_id}', self.servermessage)
+
+    async def _delay(self):
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _respond(self, request, endpoint, generate):
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        await self._delay()
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=500, text='mock error')
+        key = (endpoint, request.match_info['service_id'])
+        body = self._bodies.get(key)
+        if body is None or self.random.random() < self.change_rate:
+            body = self._bodies[key] = json.dumps(generate(request.match_info['service_id']))
+        return web.Response(body=body.encode(), content_type='application/json')
+
+    def serverinfo_payload(self, service_id):
+        return {
+            'servername': 'Mock Server {} | Chernarus | 1PP'.format(service_id),
+            'state': 'running', 'version': '1.06.152960', 'fpp_only': True,
+            'current_players': self.players, 'max_players': max(self.players, 60),
+            'gametime': '{:02d}:{:02d}'.format(self.random.randrange(24), self.random.randrange(60)),
+            'time_acceleration': 4, 'map': 'chernarusplus', 'hive': 'private', 'node': 'mock-node',
+            'next_scheduled_task': {'task': {'action': 'restart', 'time': '18:00'}},
+            'health': {
+                'game': {'fps': self.random.randint(20, 60),
+                         'mods': [{'directory': '@MockMod{}'.format(index),
+                                   'file_id': 1500000000 + index if index % 4 else None}
+                                  for index in range(self.mods)]},
+                'system': {'application': 'om', 'boot_time': int(time.time()) - 86400,
+                           'cpu_usage': round(self.random.uniform(5, 95), 1), 'cpu_count': 8,
+                           'memory': {'used': self.random.randint(4000, 30000)}, 'version': '2.1.0'},
+                'process': {'cpu_usage': round(self.random.uniform(5, 60), 1),
+                            'memory_usage': self.random.randint(2000, 8000)},
+            },
+        }
+
+    def playerlist_payload(self, service_id):
+        return {'players': [{'info': {'name': 'Survivor {:03d}'.format(index),
+                                      'ping': self.random.randint(20, 200)},
+                             'cftools_id': '{:024x}'.format(index)} for index in range(self.players)]}
+
+    def stats_payload(self, stat_type):
+        users = []
+        for rank in range(1, self.users + 1):
+            users.append({'rank': rank, 'latest_name': 'Player {:04d}'.format(rank),
+                          'cftools_id': '{:024x}'.format(rank),
+                          'kills': max(self.users - rank, 0), 'deaths': self.random.randint(0, 200),
+                          'playtime': self.random.randint(600, 2000000)})
+        if stat_type == 'playtime':
+            users.sort(key=lambda user: user['playtime'], reverse=True)
+            for rank, user in enumerate(users, 1):
+                user['rank'] = rank
+        return {'users': users}
+
+    async def serverinfo(self, request):
+        return await self._respond(request, 'serverinfo', self.serverinfo_payload)
+
+    async def playerlist(self, request):
+        return await self._respond(request, 'playerlist', self.playerlist_payload)
+
+    async def stats(self, request):
+        form = await request.post()
+        stat_type = form.get('stat_type', 'kills')
+        return await self._respond(request, 'stats:' + stat_type, lambda service_id: self.stats_payload(stat_type))
+
+    async def servermessage(self, request):
+        form = await request.post()
+        self.messages.append((request.match_info['service_id'], form.get('message')))
+        return await self._respond(request, 'servermessage', lambda service_id: {'status': True})
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Starts serving and returns the api_url to use"""
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return 'http://{}:{}/api/v1/'.format(host, port)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local CFTools API stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--players', type=int, default=120)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--mods', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--change-rate', type=float, default=1.0)
+    args = parser.parse_args()
+    mock = MockCFTools(args.players, args.users, args.mods, args.latency, args.jitter, args.error_rate,
+                       args.change_rate)
+    web.run_app(mock.app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
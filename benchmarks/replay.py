@@ -0,0 +1,199 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""End-to-end replay of commands and ADM lines without Discord
+
+Loads aurora against a generated config pointing at the CFTools stand-in,
+swaps its Discord side for benchmarks.fake_discord and replays a script. Script
+lines are one of:
+
+    !status all          a command, arguments split like a shell
+    adm <ADM log line>   a line appended to the ADM log of the first server
+    sleep 0.5            a pause in seconds
+    # comment
+
+Command callbacks are invoked directly, so role checks and cooldowns do not
+apply. Reports per-command latency, messages per second and simulated 429s.
+
+Usage: python -m benchmarks.replay [script] [servers] [latency] [--raise-429]
+"""
+import asyncio
+import importlib
+import inspect
+import json
+import os
+import shlex
+import shutil
+import sys
+import tempfile
+import time
+
+import poller
+import servers
+from benchmarks import fake_discord
+from benchmarks.bench_api import percentile
+from benchmarks.mock_api import MockCFTools
+
+SCRIPT = os.path.join(os.path.dirname(__file__), 'data', 'replay.txt')
+FEED_CHANNEL = 100
+
+
+def load_script(path=SCRIPT):
+    steps = []
+    with open(path, encoding='utf-8') as script:
+        for line in script:
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            if line.startswith('!'):
+                arguments = shlex.split(line[1:])
+                steps.append(('command', arguments[0], arguments[1:]))
+            elif line.startswith('adm '):
+                steps.append(('adm', line[4:] + '\n', None))
+            elif line.startswith('sleep '):
+                steps.append(('sleep', float(line[6:]), None))
+            else:
+                raise ValueError('Unknown script line: ' + line)
+    return steps
+
+
+def write_config(directory, api_url, server_count):
+    config = {
+        'discord_token': '', 'api_url': api_url, 'report_channel': '2', 'guild_id': '',
+        'live_feed_channel': str(FEED_CHANNEL),
+        'adm_path': os.path.join(directory, 'DayZServer_x64.ADM'),
+        'adm_state': os.path.join(directory, 'adm_state.json'),
+        'event_db': os.path.join(directory, 'events.db'),
+        'metrics_file': os.path.join(directory, 'metrics.dat'),
+        'announce_file': os.path.join(directory, 'announcements.json'),
+        'status_refresh': 300, 'delayed_refresh': 3600, 'activity_rotate': False, 'activity_refresh': 10,
+        'cooldown_channel': 600, 'cooldown_user': 60,
+        'permissions': {'staff': ['Staff'], 'moderators': ['Moderators'], 'admins': ['Administrators']},
+        'server': [{'name': 's{}'.format(index), 'address': '127.0.0.1:2302', 'service_id': 'service{}'.format(index),
+                    'service_api_key': 'key', 'server_url': 'http://localhost', 'server_icon': ''}
+                   for index in range(server_count)],
+    }
+    path = os.path.join(directory, 'config.json')
+    with open(path, 'w') as config_file:
+        json.dump(config, config_file)
+    return path
+
+
+class ScriptFollower(object):
+    """Feeds script ADM lines to aurora.adm_scan in place of a LogFollower"""
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    def append(self, line):
+        self.queue.put_nowait(line)
+
+    async def follow(self):
+        while True:
+            lines = [await self.queue.get()]
+            while not self.queue.empty():
+                lines.append(self.queue.get_nowait())
+            yield lines
+
+
+def convert(callback, arguments):
+    """Applies the command's int annotations the way the command parser would"""
+    parameters = list(inspect.signature(callback).parameters.values())[1:]
+    converted = []
+    for index, argument in enumerate(arguments):
+        parameter = parameters[min(index, len(parameters) - 1)]
+        converted.append(int(argument) if parameter.annotation is int else argument)
+    return converted
+
+
+async def load_aurora(directory, api_url, server_count, transport):
+    os.environ['AURORA_CONFIG'] = write_config(directory, api_url, server_count)
+    aurora = importlib.import_module('aurora')
+    fake_bot = fake_discord.FakeBot(transport)
+    aurora.bot.get_channel = fake_bot.get_channel
+    aurora.feed_dispatcher.bot = fake_bot
+    for entry in aurora.config_data.servers.values():
+        server = servers.Server.from_config(entry)
+        server.sessions = aurora.session_tracker.table(server.name)
+        aurora.server_list.append(server)
+        for endpoint in poller.STATUS_ENDPOINTS + poller.LEADERBOARD_ENDPOINTS:
+            await aurora.poll_server(server, endpoint)
+    return aurora
+
+
+async def run(steps, server_count=5, mock=None, transport=None):
+    mock = mock or MockCFTools()
+    transport = transport or fake_discord.FakeTransport()
+    api_url = await mock.start()
+    directory = tempfile.mkdtemp(prefix='aurora-replay-')
+    aurora = await load_aurora(directory, api_url, server_count, transport)
+    follower = ScriptFollower()
+    tasks = [asyncio.ensure_future(aurora.feed_dispatcher.run()),
+             asyncio.ensure_future(aurora.event_store.run()),
+             asyncio.ensure_future(aurora.adm_scan(follower, aurora.adm_server_name(), FEED_CHANNEL))]
+    timings = {}
+    adm_lines = 0
+    transport.reset()
+    start = time.perf_counter()
+    try:
+        for step, value, arguments in steps:
+            if step == 'command':
+                command = aurora.bot.get_command(value)
+                context = fake_discord.FakeContext(transport, command=command)
+                began = time.perf_counter()
+                await command.callback(context, *convert(command.callback, arguments))
+                timings.setdefault(value, []).append(time.perf_counter() - began)
+            elif step == 'adm':
+                follower.append(value)
+                adm_lines += 1
+            else:
+                await asyncio.sleep(value)
+        while aurora.feed_dispatcher.queue_depth:
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(aurora.feed_dispatcher.flush_interval)
+    finally:
+        elapsed = time.perf_counter() - start
+        for task in tasks:
+            task.cancel()
+        await aurora.bot.close()
+        await mock.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+    return {'timings': timings, 'adm_lines': adm_lines, 'elapsed': elapsed, 'transport': transport.stats(),
+            'feed': aurora.feed_dispatcher.stats(),
+            'feed_messages': len([message for message in transport.sent if message.channel_id == FEED_CHANNEL])}
+
+
+def report(result):
+    print('{:<10} {:>5} {:>11} {:>11} {:>11}'.format('Command', 'Runs', 'Mean', 'p95', 'Max'))
+    for name, timings in sorted(result['timings'].items()):
+        print('{:<10} {:>5} {:>8.1f} ms {:>8.1f} ms {:>8.1f} ms'.format(
+            name, len(timings), sum(timings) / len(timings) * 1000, percentile(timings, 95) * 1000,
+            max(timings) * 1000))
+    transport = result['transport']
+    print('Replay: {:.2f}s, {} messages ({} embeds), {} simulated 429s'.format(
+        result['elapsed'], transport['messages'], transport['embeds'], transport['rate_limited']))
+    print('Throughput: {:.2f} messages/s'.format(transport['messages'] / result['elapsed']))
+    print('ADM feed: {} lines -> {} messages ({})'.format(result['adm_lines'], result['feed_messages'], result['feed']))
+
+
+def main(argv):
+    arguments = [argument for argument in argv[1:] if argument != '--raise-429']
+    steps = load_script(arguments[0] if arguments else SCRIPT)
+    server_count = int(arguments[1]) if len(arguments) > 1 else 5
+    transport = fake_discord.FakeTransport(latency=float(arguments[2]) if len(arguments) > 2 else 0.0,
+                                           raise_429='--raise-429' in argv)
+    report(asyncio.get_event_loop().run_until_complete(run(steps, server_count, transport=transport)))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
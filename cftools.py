@@ -0,0 +1,135 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import logging
+import aiohttp
+
+log = logging.getLogger()
+
+HEADERS = {'contentType': 'application/x-www-form-urlencoded', 'User-Agent': 'CFTools ServiceAPI-Client'}
+
+# Returned by CFToolsClient.post() when the payload matches the previous response
+UNCHANGED = object()
+
+
+class Validator(object):
+    """Last seen response digest and HTTP validators for one endpoint"""
+    __slots__ = ('digest', 'etag', 'last_modified')
+
+    def __init__(self):
+        self.digest = None
+        self.etag = None
+        self.last_modified = None
+
+    def headers(self):
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class CFToolsClient(object):
+    """Long-lived CFTools API client
+
+    All API traffic shares one session and keep-alive connection pool, so polling
+    cycles reuse open TLS connections instead of handshaking on every request.
+    The session is created on first use and must be closed with close().
+    """
+    def __init__(self, headers=HEADERS, limit=20, limit_per_host=8, keepalive_timeout=75, dns_ttl=300,
+                 timeout=15, connect_timeout=5):
+        self.headers = headers
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.requests = 0
+        self.failures = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.unchanged = 0
+        self.not_modified = 0
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout,
+                                             use_dns_cache=True, ttl_dns_cache=self.dns_ttl)
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(self._on_connection_created)
+            trace.on_connection_reuseconn.append(self._on_connection_reused)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                  headers=self.headers, trace_configs=[trace])
+        return self._session
+
+    async def _on_connection_created(self, session, context, params):
+        self.connections_created += 1
+
+    async def _on_connection_reused(self, session, context, params):
+        self.connections_reused += 1
+
+    async def post(self, url, data, validator=None):
+        """Posts to the API and returns the decoded JSON response, or None on failure or a non-2xx status
+
+        When a Validator is given, the request is made conditional on its ETag or
+        Last-Modified value and the raw body is hashed. A 304 response or a body
+        identical to the last one returns UNCHANGED without being decoded.
+        """
+        self.requests += 1
+        try:
+            headers = validator.headers() if validator is not None else None
+            async with self.session.post(url, data=data, headers=headers) as response:
+                if response.status == 304 and validator is not None and validator.digest is not None:
+                    self.not_modified += 1
+                    return UNCHANGED
+                body = await response.read()
+                status = response.status
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+            if not 200 <= status < 300:
+                # Error bodies are neither data nor a baseline for the next comparison
+                self.failures += 1
+                log.info('API Fetch Failed: HTTP {} from {}'.format(status, url))
+                return None
+            if validator is None:
+                return json.loads(body)
+            digest = hashlib.blake2b(body, digest_size=16).digest()
+            if digest == validator.digest:
+                self.unchanged += 1
+                return UNCHANGED
+            api_data = json.loads(body)
+            validator.digest = digest
+            validator.etag = etag
+            validator.last_modified = last_modified
+            return api_data
+        except Exception as error:
+            self.failures += 1
+            log.info('API Fetch Failed: ' + str(error))
+
+    def stats(self):
+        return {'requests': self.requests, 'failures': self.failures,
+                'connections_created': self.connections_created, 'connections_reused': self.connections_reused,
+                'unchanged': self.unchanged, 'not_modified': self.not_modified}
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,127 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import concurrent.futures
+import struct
+import time
+import zlib
+
+BACKGROUND = (0x2F, 0x31, 0x36)
+GRID = (0x4F, 0x54, 0x5C)
+LINE = (0x3D, 0x85, 0xC6)
+FILL = (0x33, 0x4A, 0x60)
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def encode_png(width, height, rows):
+    """Encodes rows of packed RGB bytes as a PNG"""
+    raw = b''.join(b'\x00' + bytes(row) for row in rows)
+    return (b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            _chunk(b'IDAT', zlib.compress(raw, 6)) + _chunk(b'IEND', b''))
+
+
+def line_chart(points, width=640, height=200, padding=6, grid_lines=4):
+    """Renders (x, y) points as a filled line chart and returns PNG bytes
+
+    Axes are scaled to the data; labels are left to the embed around the image.
+    """
+    background = bytes(BACKGROUND) * width
+    rows = [bytearray(background) for _ in range(height)]
+    grid = bytes(GRID) * (width - 2 * padding)
+    for line in range(grid_lines + 1):
+        y = padding + round(line * (height - 2 * padding - 1) / grid_lines)
+        rows[y][padding * 3:(width - padding) * 3] = grid
+    if not points:
+        return encode_png(width, height, rows)
+    x_min = points[0][0]
+    x_span = (points[-1][0] - x_min) or 1
+    y_min = min(point[1] for point in points)
+    y_max = max(point[1] for point in points)
+    if y_max == y_min:
+        y_min, y_max = y_min - 1, y_max + 1
+    plot_width = width - 2 * padding - 1
+    plot_height = height - 2 * padding - 1
+    bottom = height - padding - 1
+
+    def pixel(point):
+        return (padding + round((point[0] - x_min) * plot_width / x_span),
+                bottom - round((point[1] - y_min) * plot_height / (y_max - y_min)))
+
+    # Highest line pixel per column, so the area under the curve can be filled in one pass
+    tops = {}
+    previous = pixel(points[0])
+    for point in points[1:] or points:
+        current = pixel(point)
+        x0, y0 = previous
+        x1, y1 = current
+        steps = max(abs(x1 - x0), abs(y1 - y0), 1)
+        for step in range(steps + 1):
+            x = x0 + round((x1 - x0) * step / steps)
+            y = y0 + round((y1 - y0) * step / steps)
+            tops[x] = min(tops.get(x, y), y)
+            for dy in (0, 1):
+                row = rows[min(y + dy, bottom)]
+                row[x * 3:x * 3 + 3] = bytes(LINE)
+        previous = current
+    fill = bytes(FILL)
+    for x, top in tops.items():
+        for y in range(top + 2, bottom + 1):
+            rows[y][x * 3:x * 3 + 3] = fill
+    return encode_png(width, height, rows)
+
+
+class ChartRenderer(object):
+    """Renders charts on a worker thread and caches the PNG bytes for ttl seconds
+
+    The rendering is pure Python and holds the GIL, so the thread keeps the
+    event loop responsive between bytecodes rather than adding parallelism;
+    the cache is what keeps repeated requests cheap.
+    """
+    def __init__(self, ttl=60.0, max_entries=32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache = {}
+        self.hits = 0
+        self.renders = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def render(self, key, points, **options):
+        """PNG for key; points is a callable returning the data, only called on a miss"""
+        now = time.monotonic()
+        entry = self.cache.get(key)
+        if entry is not None and now - entry[0] < self.ttl:
+            self.hits += 1
+            return entry[1]
+        points = points()
+        image = await asyncio.get_event_loop().run_in_executor(
+            self._executor, lambda: line_chart(points, **options))
+        self.renders += 1
+        self.cache[key] = (now, image)
+        if len(self.cache) > self.max_entries:
+            for stale in [key for key, entry in self.cache.items() if now - entry[0] >= self.ttl]:
+                del self.cache[stale]
+            while len(self.cache) > self.max_entries:
+                del self.cache[min(self.cache, key=lambda key: self.cache[key][0])]
+        return image
+
+    def stats(self):
+        return {'cached': len(self.cache), 'hits': self.hits, 'renders': self.renders}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,283 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import logging
+import os
+import types
+
+import supervisor
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+log = logging.getLogger()
+
+REQUIRED = ('discord_token', 'api_url', 'report_channel', 'guild_id', 'status_refresh', 'delayed_refresh',
+            'activity_rotate', 'activity_refresh', 'cooldown_channel', 'cooldown_user', 'permissions',
+            'live_feed_channel')
+DEFAULTS = {
+    'adm_path': 'DayZServer_x64.ADM',
+    'adm_state': 'adm_state.json',
+    'event_db': 'events.db',
+    'rpt_path': '.',
+    'adm_server': None,
+    'player_reconcile': 900,
+    'metrics_file': 'metrics.dat',
+    'announce_file': 'announcements.json',
+    'restart_warnings': (15, 10, 5),
+    'config_watch': True,
+    'telemetry_host': '127.0.0.1',
+    'telemetry_port': None,
+    'profiling': False,
+    'slow_callback': 0.25,
+    'slow_command': 2.0,
+    'host_metrics': 'auto',
+    'host_metrics_interval': 30,
+    'dayz_process': 'DayZServer_x64',
+}
+INTERVALS = ('status_refresh', 'delayed_refresh', 'activity_refresh', 'player_reconcile', 'slow_callback',
+             'slow_command', 'host_metrics_interval')
+PERMISSIONS = ('staff', 'moderators', 'admins')
+SERVER_REQUIRED = ('name', 'address', 'service_id', 'service_api_key', 'server_url', 'server_icon')
+# Server keys that only affect the log tailers; changing any other key rebuilds the server
+SERVER_LOG_KEYS = ('log_path', 'feed_channel')
+# Bound when the bot starts: command cooldowns and roles are fixed when the commands are defined
+RESTART_KEYS = ('discord_token', 'guild_id', 'cooldown_channel', 'cooldown_user', 'permissions', 'event_db',
+                'metrics_file', 'announce_file')
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return types.MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def validate(data):
+    """Returns a list of problems with a decoded config file"""
+    if not isinstance(data, dict):
+        return ['top level must be an object']
+    problems = ['missing {}'.format(key) for key in REQUIRED if key not in data]
+    for key in INTERVALS:
+        value = data.get(key)
+        if key in data and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+            problems.append('{} must be a positive number'.format(key))
+    permissions = data.get('permissions')
+    if permissions is not None:
+        if not isinstance(permissions, dict):
+            problems.append('permissions must be an object')
+        else:
+            problems.extend('missing permissions.{}'.format(key) for key in PERMISSIONS if key not in permissions)
+    entries = data.get('server', [])
+    if not isinstance(entries, list):
+        return problems + ['server must be a list']
+    names = set()
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            problems.append('server[{}] must be an object'.format(index))
+            continue
+        problems.extend('server[{}] missing {}'.format(index, key) for key in SERVER_REQUIRED if key not in entry)
+        if entry.get('name') in names:
+            problems.append('server[{}] duplicate name {}'.format(index, entry['name']))
+        names.add(entry.get('name'))
+    return problems
+
+
+class Config(object):
+    """Validated, read-only snapshot of config.json
+
+    Settings are read with config[key] or config.get(key), with DEFAULTS applied.
+    servers maps each server name to its entry, in file order.
+    """
+    __slots__ = ('settings', 'servers')
+
+    def __init__(self, data):
+        problems = validate(data)
+        if problems:
+            raise ConfigError('; '.join(problems))
+        settings = dict(DEFAULTS)
+        settings.update((key, value) for key, value in data.items() if key != 'server')
+        self.settings = freeze(settings)
+        self.servers = types.MappingProxyType({entry['name']: freeze(entry) for entry in data.get('server', [])})
+
+    def __getitem__(self, key):
+        return self.settings[key]
+
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
+
+def load(path):
+    try:
+        with open(path, 'r') as config_file:
+            data = json.load(config_file)
+    except (OSError, ValueError) as error:
+        raise ConfigError(str(error))
+    if isinstance(data, dict) and 'live_feed_channel' not in data and 'live_view_channel' in data:
+        data['live_feed_channel'] = data['live_view_channel']
+    return Config(data)
+
+
+class ConfigDiff(object):
+    """Differences between two snapshots
+
+    changed maps the name of each server present in both to its changed keys.
+    """
+    __slots__ = ('added', 'removed', 'changed', 'settings')
+
+    def __init__(self, old, new):
+        self.added = [name for name in new.servers if name not in old.servers]
+        self.removed = [name for name in old.servers if name not in new.servers]
+        self.changed = {}
+        for name, entry in new.servers.items():
+            previous = old.servers.get(name)
+            if previous is not None and previous != entry:
+                self.changed[name] = {key for key in set(entry) | set(previous)
+                                      if entry.get(key) != previous.get(key)}
+        self.settings = {key for key in set(old.settings) | set(new.settings)
+                         if old.settings.get(key) != new.settings.get(key)}
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed or self.settings)
+
+    @property
+    def rebuilt(self):
+        """Changed servers whose polling state has to be rebuilt"""
+        return [name for name, keys in self.changed.items() if keys - set(SERVER_LOG_KEYS)]
+
+    @property
+    def needs_restart(self):
+        return sorted(self.settings & set(RESTART_KEYS))
+
+    def __str__(self):
+        if not self:
+            return 'no changes'
+        parts = []
+        for label, names in (('added', self.added), ('removed', self.removed), ('changed', list(self.changed)),
+                             ('settings', sorted(self.settings))):
+            if names:
+                parts.append('{} {}'.format(label, ', '.join(names)))
+        return '; '.join(parts)
+
+
+class ConfigManager(object):
+    """Holds the current snapshot and replaces it on reload
+
+    reload() applies a new snapshot only when it validates, so a broken edit
+    leaves the running configuration in place. watch() reloads whenever the
+    file changes, using inotify on its directory when inotify_simple is
+    installed (editors usually replace the file rather than write to it) and
+    polling its modification time otherwise.
+    """
+    def __init__(self, path, poll_interval=5.0, settle=0.5):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.settle = settle
+        self.current = load(path)
+        self.reloads = 0
+        self.failures = 0
+        self._lock = None
+        self._stamp = self._file_stamp()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def stats(self):
+        return {'reloads': self.reloads, 'failures': self.failures, 'servers': len(self.current.servers)}
+
+    async def reload(self, apply):
+        """Loads the file and awaits apply(old, new, diff) when it changed; returns the diff
+
+        Raises ConfigError when the file does not load or validate, or apply raises.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._stamp = self._file_stamp()
+            try:
+                new = load(self.path)
+            except ConfigError:
+                self.failures += 1
+                raise
+            changes = ConfigDiff(self.current, new)
+            if changes:
+                try:
+                    await apply(self.current, new, changes)
+                except Exception as error:
+                    # current stays the baseline, so the next reload applies the whole diff again
+                    self.failures += 1
+                    raise ConfigError('not applied: {}'.format(error)) from error
+                self.current = new
+            self.reloads += 1
+            return changes
+
+    def _watch(self):
+        if inotify_simple is None:
+            return None
+        flags = inotify_simple.flags
+        try:
+            watcher = inotify_simple.INotify()
+            watcher.add_watch(os.path.dirname(os.path.abspath(self.path)),
+                              flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+        except OSError as error:
+            log.info('inotify unavailable, polling {}: {}'.format(self.path, error))
+            return None
+        return watcher
+
+    async def watch(self, apply):
+        watcher = self._watch()
+        wakeup = asyncio.Event()
+        loop = asyncio.get_event_loop()
+
+        def notified():
+            watcher.read(timeout=0)
+            wakeup.set()
+
+        if watcher is not None:
+            loop.add_reader(watcher.fileno(), notified)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), self.poll_interval * (12 if watcher is not None else 1))
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+                if self._file_stamp() == self._stamp:
+                    continue
+                await asyncio.sleep(self.settle)
+                try:
+                    with supervisor.iteration():
+                        changes = await self.reload(apply)
+                except ConfigError as error:
+                    log.info('Configuration Not Reloaded: {}'.format(error))
+                    continue
+                log.info('Configuration Reloaded: {}'.format(changes))
+        finally:
+            if watcher is not None:
+                loop.remove_reader(watcher.fileno())
+                watcher.close()
@@ -0,0 +1,276 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import inspect
+import logging
+import time
+import discord
+import profiler
+import supervisor
+import telemetry
+
+log = logging.getLogger()
+
+MESSAGE_LIMIT = 2000
+EMBED_LIMIT = 10
+EMBED_SIZE = 6000
+FENCE = '```'
+MULTI_EMBED = 'embeds' in inspect.signature(discord.abc.Messageable.send).parameters
+
+
+def pack_lines(texts, max_length=MESSAGE_LIMIT):
+    """Joins texts into code block messages no longer than max_length"""
+    limit = max_length - len(FENCE) * 2 - 1
+    messages = []
+    current = []
+    size = 0
+    for text in texts:
+        text = text[:limit]
+        if current and size + len(text) + 1 > limit:
+            messages.append(current)
+            current = []
+            size = 0
+        current.append(text)
+        size += len(text) + 1
+    if current:
+        messages.append(current)
+    return [FENCE + '\n' + '\n'.join(message) + FENCE for message in messages]
+
+
+def pack_embeds(embeds, max_embeds=EMBED_LIMIT, max_size=EMBED_SIZE):
+    """Groups embeds into messages within Discord's embed count and total size limits"""
+    groups = []
+    current = []
+    size = 0
+    for embed in embeds:
+        length = len(embed)
+        if current and (len(current) >= max_embeds or size + length > max_size):
+            groups.append(current)
+            current = []
+            size = 0
+        current.append(embed)
+        size += length
+    if current:
+        groups.append(current)
+    return groups
+
+
+def retry_after(error, default):
+    """Seconds to wait after a 429, from the exception or the response's Retry-After header"""
+    value = getattr(error, 'retry_after', None)
+    if value is None:
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        value = headers.get('Retry-After')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def channel_key(destination):
+    channel = getattr(destination, 'channel', destination)
+    return getattr(channel, 'id', None)
+
+
+class RateLimiter(object):
+    """Per-channel send budget, modelled on Discord's 5 messages per 5 seconds channel bucket"""
+    def __init__(self, limit=5, per=5.0):
+        self.limit = limit
+        self.per = per
+        self.buckets = {}
+        self.waits = 0
+
+    async def acquire(self, key):
+        while True:
+            now = time.monotonic()
+            bucket = self.buckets.get(key)
+            if bucket is None or now >= bucket[1]:
+                bucket = self.buckets[key] = [self.limit, now + self.per]
+            if bucket[0] > 0:
+                bucket[0] -= 1
+                return
+            self.waits += 1
+            await asyncio.sleep(bucket[1] - now)
+
+    def backoff(self, key, retry_after):
+        self.buckets[key] = [0, time.monotonic() + retry_after]
+
+
+class FeedDispatcher(object):
+    """Decouples live feed producers from Discord sends
+
+    Producers call submit() without awaiting. Queued texts are grouped per channel,
+    packed into as few messages as fit Discord's length limit and sent within each
+    channel's rate limit budget. A 429 backs the channel off and the message is
+    retried up to retries times. When the queue is full the oldest text is dropped.
+    """
+    def __init__(self, bot, max_queue=1000, flush_interval=2.0, max_length=MESSAGE_LIMIT, rate_limiter=None,
+                 retries=3):
+        self.bot = bot
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.flush_interval = flush_interval
+        self.max_length = max_length
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.retries = retries
+        self.submitted = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.messages = 0
+        self.failed = 0
+        self._channels = {}
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        return {'queue_depth': self.queue_depth, 'submitted': self.submitted, 'dropped': self.dropped,
+                'coalesced': self.coalesced, 'messages': self.messages, 'failed': self.failed,
+                'rate_limited': self.rate_limiter.waits}
+
+    def submit(self, channel_id, text):
+        if text is None:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((channel_id, text))
+        self.submitted += 1
+
+    def pack(self, texts):
+        return pack_lines(texts, self.max_length)
+
+    def _channel(self, channel_id):
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self.bot.get_channel(channel_id)
+            if channel is not None:
+                self._channels[channel_id] = channel
+        return channel
+
+    async def send(self, channel_id, content):
+        channel = self._channel(channel_id)
+        if channel is None:
+            log.info('Live Feed: channel {} not found'.format(channel_id))
+            self.failed += 1
+            return
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(channel_id)
+            try:
+                with telemetry.Timer(telemetry.DISCORD_SEND_LATENCY.labels('feed')):
+                    await channel.send(content)
+            except discord.HTTPException as error:
+                if error.status == 429:
+                    telemetry.DISCORD_RATE_LIMITED.labels('feed').inc()
+                    self.rate_limiter.backoff(channel_id, retry_after(error, self.rate_limiter.per))
+                    if attempt < self.retries:
+                        attempt += 1
+                        continue
+                self.failed += 1
+                log.info('Live Feed Send Failed: ' + str(error))
+                return
+            self.messages += 1
+            return
+
+    async def flush(self, pending):
+        for channel_id, texts in pending.items():
+            messages = self.pack(texts)
+            self.coalesced += len(texts) - len(messages)
+            for content in messages:
+                await self.send(channel_id, content)
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            pending = {}
+            size = 0
+            channel_id, text = await self.queue.get()
+            deadline = loop.time() + self.flush_interval
+            while True:
+                pending.setdefault(channel_id, []).append(text)
+                size += len(text) + 1
+                timeout = deadline - loop.time()
+                if size >= self.max_length or timeout <= 0:
+                    break
+                try:
+                    channel_id, text = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            try:
+                with supervisor.iteration():
+                    await self.flush(pending)
+            except Exception as error:
+                log.exception('Live Feed Error: ' + str(error))
+
+
+class SendScheduler(object):
+    """Paces command replies within each channel's rate limit budget
+
+    Sends wait on the channel's bucket instead of sleeping a fixed time, and a 429
+    backs the bucket off for retry_after before the send is retried. Share the
+    RateLimiter with the FeedDispatcher so both draw on one budget per channel.
+    Where the installed discord.py can send several embeds in one message,
+    consecutive embeds are packed up to Discord's per message limits.
+    """
+    def __init__(self, rate_limiter=None, retries=3, multi_embed=MULTI_EMBED):
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.retries = retries
+        self.multi_embed = multi_embed
+        self.messages = 0
+        self.embeds = 0
+        self.rate_limited = 0
+
+    def stats(self):
+        return {'messages': self.messages, 'embeds': self.embeds, 'rate_limited': self.rate_limited,
+                'waits': self.rate_limiter.waits}
+
+    async def send(self, destination, content=None, **kwargs):
+        with profiler.phase('send'):
+            return await self._send(destination, content, kwargs)
+
+    async def _send(self, destination, content, kwargs):
+        key = channel_key(destination)
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(key)
+            try:
+                with telemetry.Timer(telemetry.DISCORD_SEND_LATENCY.labels('command')):
+                    message = await destination.send(content, **kwargs)
+            except discord.HTTPException as error:
+                if error.status == 429:
+                    telemetry.DISCORD_RATE_LIMITED.labels('command').inc()
+                if error.status != 429 or attempt >= self.retries:
+                    raise
+                attempt += 1
+                self.rate_limited += 1
+                self.rate_limiter.backoff(key, retry_after(error, self.rate_limiter.per))
+                continue
+            self.messages += 1
+            return message
+
+    async def send_embeds(self, destination, embeds):
+        if not self.multi_embed:
+            for embed in embeds:
+                await self.send(destination, embed=embed)
+                self.embeds += 1
+            return
+        for group in pack_embeds(embeds):
+            if len(group) == 1:
+                await self.send(destination, embed=group[0])
+            else:
+                await self.send(destination, embeds=group)
+            self.embeds += len(group)
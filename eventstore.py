@@ -0,0 +1,223 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import collections
+import concurrent.futures
+import datetime
+import logging
+import sqlite3
+
+import supervisor
+
+log = logging.getLogger()
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS events ('
+    ' id INTEGER PRIMARY KEY, ts REAL NOT NULL, server TEXT, kind TEXT NOT NULL,'
+    ' player TEXT, buid TEXT, x REAL, y REAL, z REAL,'
+    ' killer TEXT, killer_buid TEXT, weapon TEXT, distance REAL, damage REAL, zone TEXT)',
+    'CREATE INDEX IF NOT EXISTS events_ts ON events (ts)',
+    'CREATE INDEX IF NOT EXISTS events_kind_ts ON events (kind, ts)',
+    'CREATE INDEX IF NOT EXISTS events_buid_ts ON events (buid, ts)',
+    'CREATE INDEX IF NOT EXISTS events_killer_buid_ts ON events (killer_buid, ts)',
+    'CREATE INDEX IF NOT EXISTS events_player ON events (player)',
+)
+
+INSERT = ('INSERT INTO events (ts, server, kind, player, buid, x, y, z, killer, killer_buid, weapon, distance,'
+          ' damage, zone) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+COLUMNS = 'ts, server, kind, player, buid, killer, killer_buid, weapon, distance, damage, zone'
+
+
+class StoredEvent(object):
+    __slots__ = ('ts', 'server', 'kind', 'player', 'buid', 'killer', 'killer_buid', 'weapon', 'distance',
+                 'damage', 'zone')
+
+    def __init__(self, *row):
+        for name, value in zip(self.__slots__, row):
+            setattr(self, name, value)
+
+    def __str__(self):
+        when = datetime.datetime.fromtimestamp(self.ts).strftime('%Y-%m-%d %H:%M:%S')
+        text = '{} {:<10} {}'.format(when, self.kind.upper(), self.player)
+        if self.killer:
+            text += ' <- {}'.format(self.killer)
+        details = []
+        if self.weapon:
+            details.append(self.weapon)
+        if self.distance is not None:
+            details.append('{:.0f}m'.format(self.distance))
+        if self.zone:
+            details.append('{} {:.1f}'.format(self.zone, self.damage or 0))
+        if details:
+            text += ' ({})'.format(', '.join(details))
+        if self.server:
+            text = '[{}] {}'.format(self.server, text)
+        return text
+
+
+def parse_when(text):
+    """Parses 'YYYY-MM-DD HH:MM[:SS]' or 'HH:MM[:SS]' (today) into a unix timestamp"""
+    for pattern in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%H:%M:%S', '%H:%M'):
+        try:
+            when = datetime.datetime.strptime(text, pattern)
+        except ValueError:
+            continue
+        if not pattern.startswith('%Y'):
+            when = datetime.datetime.combine(datetime.date.today(), when.time())
+        return when.timestamp()
+    raise ValueError('Invalid time: ' + text)
+
+
+def event_row(event, server=None):
+    pos = event.pos or (None, None, None)
+    return (event.timestamp(), server, event.kind, event.player, event.buid, pos[0], pos[1], pos[2],
+            getattr(event, 'killer', None), getattr(event, 'killer_buid', None), getattr(event, 'weapon', None),
+            getattr(event, 'distance', None), getattr(event, 'damage', None), getattr(event, 'zone', None))
+
+
+class EventStore(object):
+    """SQLite (WAL) store for parsed ADM events
+
+    add() only buffers a row. run() writes buffered rows in one transaction per
+    batch, and every database call runs on a single worker thread so the event
+    loop never blocks on disk. While writes fail, rows are kept for retry up to
+    max_pending (oldest dropped first) and retries back off up to max_backoff.
+    """
+    def __init__(self, path, batch_size=500, flush_interval=2.0, max_pending=None, max_backoff=300.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending or batch_size * 20
+        self.max_backoff = max_backoff
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failures = 0
+        self._pending = collections.deque(maxlen=self.max_pending)
+        self._db = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._full = asyncio.Event()
+
+    def _open(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                self._db.execute(statement)
+            self._db.commit()
+        return self._db
+
+    def _write(self, rows):
+        db = self._open()
+        with db:
+            db.executemany(INSERT, rows)
+
+    def _query(self, sql, parameters):
+        return [StoredEvent(*row) for row in self._open().execute(sql, parameters)]
+
+    async def _call(self, function, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, function, *args)
+
+    def add(self, event, server=None):
+        if len(self._pending) == self.max_pending:
+            self.dropped += 1
+        self._pending.append(event_row(event, server))
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = list(self._pending), collections.deque(maxlen=self.max_pending)
+        try:
+            await self._call(self._write, rows)
+        except sqlite3.Error:
+            # The transaction rolled back; keep the rows, ahead of newer ones, for the next flush
+            rows.extend(self._pending)
+            self.dropped += max(len(rows) - self.max_pending, 0)
+            self._pending = collections.deque(rows, maxlen=self.max_pending)
+            raise
+        self.written += len(rows)
+        self.batches += 1
+
+    async def run(self):
+        delay = self.flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                with supervisor.iteration():
+                    await self.flush()
+            except sqlite3.Error as error:
+                self.failures += 1
+                delay = min(delay * 2, self.max_backoff)
+                log.info('Event Store Write Failed, retrying in {:.0f}s ({} rows pending): {}'.format(
+                    delay, len(self._pending), error))
+                await asyncio.sleep(delay)
+                continue
+            delay = self.flush_interval
+
+    async def resolve_buid(self, player):
+        """Returns the BUID for a BUID or the most recently seen player name"""
+        return await self._call(self._resolve, player)
+
+    def _resolve(self, player):
+        db = self._open()
+        if db.execute('SELECT 1 FROM events WHERE buid = ? LIMIT 1', (player,)).fetchone():
+            return player
+        row = db.execute('SELECT buid FROM events WHERE player = ? ORDER BY ts DESC LIMIT 1', (player,)).fetchone()
+        return row[0] if row else None
+
+    async def player_events(self, buid, kinds=None, limit=20):
+        """Most recent events where the player was the victim or the attacker"""
+        kind_filter = ''
+        parameters = [buid]
+        if kinds:
+            kind_filter = ' AND kind IN ({})'.format(', '.join('?' * len(kinds)))
+            parameters.extend(kinds)
+        sql = ('SELECT {0} FROM (SELECT {0} FROM events WHERE buid = ?{1}'
+               ' UNION ALL SELECT {0} FROM events WHERE killer_buid = ?{1})'
+               ' ORDER BY ts DESC LIMIT ?').format(COLUMNS, kind_filter)
+        parameters = parameters + parameters + [limit]
+        return await self._call(self._query, sql, parameters)
+
+    async def window(self, start, end, kinds=None, limit=200):
+        """Events between two unix timestamps, oldest first"""
+        parameters = [start, end]
+        sql = 'SELECT {} FROM events WHERE ts BETWEEN ? AND ?'.format(COLUMNS)
+        if kinds:
+            sql = 'SELECT {} FROM events WHERE kind IN ({}) AND ts BETWEEN ? AND ?'.format(
+                COLUMNS, ', '.join('?' * len(kinds)))
+            parameters = list(kinds) + parameters
+        sql += ' ORDER BY ts LIMIT ?'
+        parameters.append(limit)
+        return await self._call(self._query, sql, parameters)
+
+    def stats(self):
+        return {'pending': len(self._pending), 'written': self.written, 'batches': self.batches,
+                'dropped': self.dropped, 'failures': self.failures}
+
+    async def close(self):
+        await self.flush()
+        if self._db is not None:
+            await self._call(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,314 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""CPU, memory and disk usage of this machine and the local DayZ server process
+
+Backends read procfs on Linux, psutil where it is installed, or WMI on
+Windows. Every backend call blocks, so HostMonitor makes them on a single
+worker thread; WMI connections only work on the thread that created them.
+
+CPU percentages are of the whole machine. A process using two cores fully
+on an eight core host reports 25%.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import platform
+import shutil
+import time
+
+import supervisor
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import wmi
+except ImportError:
+    wmi = None
+
+log = logging.getLogger()
+
+DAYZ_PROCESS = 'DayZServer_x64'
+
+
+class HostSample(object):
+    """One reading; memory in MB, disk in GB, process fields None when the process is not running"""
+    __slots__ = ('time', 'cpu', 'memory_used', 'memory_total', 'disk_used', 'disk_total', 'process_pid',
+                 'process_cpu', 'process_memory')
+
+    def __init__(self, cpu, memory_used, memory_total, disk_used, disk_total, process=(None, None, None)):
+        self.time = time.time()
+        self.cpu = cpu
+        self.memory_used = memory_used
+        self.memory_total = memory_total
+        self.disk_used = disk_used
+        self.disk_total = disk_total
+        self.process_pid, self.process_cpu, self.process_memory = process
+
+
+def process_matches(name, wanted):
+    name = os.path.basename(name)
+    if name.lower().endswith('.exe'):
+        name = name[:-4]
+    return name == wanted
+
+
+class Backend(object):
+    """Samples through cpu(), memory() and process(); disk usage is read the same way everywhere"""
+    name = None
+
+    def __init__(self, process_name=DAYZ_PROCESS, disk_path='.'):
+        self.process_name = process_name
+        self.disk_path = disk_path
+
+    def sample(self):
+        try:
+            disk = shutil.disk_usage(self.disk_path)
+            disk_used, disk_total = disk.used / 1073741824, disk.total / 1073741824
+        except OSError:
+            disk_used = disk_total = None
+        memory_used, memory_total = self.memory()
+        return HostSample(self.cpu(), memory_used, memory_total, disk_used, disk_total, self.process())
+
+    def system_info(self):
+        """Static description of the machine as (label, value) pairs"""
+        return [('OS', platform.platform()), ('CPU', platform.processor() or platform.machine()),
+                ('CPU Cores', os.cpu_count())]
+
+
+class ProcfsBackend(Backend):
+    name = 'procfs'
+
+    def __init__(self, process_name=DAYZ_PROCESS, disk_path='.'):
+        Backend.__init__(self, process_name, disk_path)
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.cores = os.cpu_count() or 1
+        self._cpu = None
+        self._process = None
+        self._pid = None
+        self.cpu()
+
+    @staticmethod
+    def available():
+        return os.path.exists('/proc/stat')
+
+    def cpu(self):
+        with open('/proc/stat') as stat:
+            fields = [int(field) for field in stat.readline().split()[1:]]
+        idle, total = fields[3] + fields[4], sum(fields[:8])
+        previous, self._cpu = self._cpu, (idle, total)
+        if previous is None or total == previous[1]:
+            return None
+        return round(100.0 * (1 - (idle - previous[0]) / (total - previous[1])), 1)
+
+    def _meminfo(self):
+        values = {}
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                key, _, value = line.partition(':')
+                values[key] = int(value.split()[0])
+        return values
+
+    def memory(self):
+        values = self._meminfo()
+        return (values['MemTotal'] - values['MemAvailable']) // 1024, values['MemTotal'] // 1024
+
+    def _find(self):
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open('/proc/{}/cmdline'.format(entry), 'rb') as cmdline:
+                    command = cmdline.read().split(b'\0')[0].decode('utf-8', 'replace')
+            except OSError:
+                continue
+            if command and process_matches(command.replace('\\', '/'), self.process_name):
+                return int(entry)
+        return None
+
+    def process(self):
+        if self._pid is None:
+            self._pid = self._find()
+        if self._pid is None:
+            return None, None, None
+        try:
+            with open('/proc/{}/stat'.format(self._pid)) as stat:
+                fields = stat.read().rpartition(')')[2].split()
+            with open('/proc/{}/status'.format(self._pid)) as status:
+                rss = next((int(line.split()[1]) for line in status if line.startswith('VmRSS:')), 0)
+        except OSError:
+            self._pid = self._process = None
+            return None, None, None
+        used, now = (int(fields[11]) + int(fields[12])) / self.ticks, time.monotonic()
+        previous, self._process = self._process, (used, now)
+        cpu = None
+        if previous is not None and now > previous[1]:
+            cpu = round(100.0 * (used - previous[0]) / (now - previous[1]) / self.cores, 1)
+        return self._pid, cpu, rss // 1024
+
+    def system_info(self):
+        info = Backend.system_info(self)
+        try:
+            with open('/etc/os-release') as release:
+                for line in release:
+                    if line.startswith('PRETTY_NAME='):
+                        info[0] = ('OS', line.split('=', 1)[1].strip().strip('"'))
+            with open('/proc/cpuinfo') as cpuinfo:
+                for line in cpuinfo:
+                    if line.startswith('model name'):
+                        info[1] = ('CPU', line.split(':', 1)[1].strip())
+                        break
+        except OSError:
+            pass
+        info.append(('RAM', '{:.1f} GB'.format(self._meminfo()['MemTotal'] / 1048576)))
+        return info
+
+
+class PsutilBackend(Backend):
+    name = 'psutil'
+
+    def __init__(self, process_name=DAYZ_PROCESS, disk_path='.'):
+        Backend.__init__(self, process_name, disk_path)
+        self.cores = psutil.cpu_count() or 1
+        self._process = None
+        psutil.cpu_percent(None)
+
+    @staticmethod
+    def available():
+        return psutil is not None
+
+    def cpu(self):
+        return psutil.cpu_percent(None)
+
+    def memory(self):
+        memory = psutil.virtual_memory()
+        return (memory.total - memory.available) // 1048576, memory.total // 1048576
+
+    def process(self):
+        if self._process is None or not self._process.is_running():
+            self._process = next((process for process in psutil.process_iter(['name'])
+                                  if process.info['name'] and process_matches(process.info['name'],
+                                                                              self.process_name)), None)
+            if self._process is None:
+                return None, None, None
+            self._process.cpu_percent(None)
+        try:
+            with self._process.oneshot():
+                cpu = self._process.cpu_percent(None) / self.cores
+                rss = self._process.memory_info().rss
+        except psutil.Error:
+            self._process = None
+            return None, None, None
+        return self._process.pid, round(cpu, 1), rss // 1048576
+
+    def system_info(self):
+        return Backend.system_info(self) + [('RAM', '{:.1f} GB'.format(psutil.virtual_memory().total / 1073741824))]
+
+
+class WmiBackend(Backend):
+    """Formatted performance counters over WMI, connected on first use from the worker thread"""
+    name = 'wmi'
+
+    def __init__(self, process_name=DAYZ_PROCESS, disk_path='.'):
+        Backend.__init__(self, process_name, disk_path)
+        self._computer = None
+        self.cores = os.cpu_count() or 1
+
+    @staticmethod
+    def available():
+        return wmi is not None
+
+    @property
+    def computer(self):
+        if self._computer is None:
+            import pythoncom
+            pythoncom.CoInitialize()
+            self._computer = wmi.WMI()
+        return self._computer
+
+    def cpu(self):
+        return float(self.computer.Win32_PerfFormattedData_PerfOS_Processor(Name='_Total')[0].PercentProcessorTime)
+
+    def memory(self):
+        os_info = self.computer.Win32_OperatingSystem()[0]
+        total = int(os_info.TotalVisibleMemorySize)
+        return (total - int(os_info.FreePhysicalMemory)) // 1024, total // 1024
+
+    def process(self):
+        found = self.computer.Win32_PerfFormattedData_PerfProc_Process(Name=self.process_name)
+        if not found:
+            return None, None, None
+        process = found[0]
+        return (int(process.IDProcess), round(float(process.PercentProcessorTime) / self.cores, 1),
+                int(process.WorkingSetPrivate) // 1048576)
+
+    def system_info(self):
+        computer = self.computer
+        os_info = computer.Win32_OperatingSystem()[0]
+        proc_info = computer.Win32_Processor()[0]
+        gpu_info = computer.Win32_VideoController()[0]
+        return [('OS', os_info.Name.split('|')[0]), ('OS Version', ' '.join([os_info.Version, os_info.BuildNumber])),
+                ('CPU', proc_info.Name), ('CPU Cores', self.cores),
+                ('RAM', '{:.1f} GB'.format(float(os_info.TotalVisibleMemorySize) / 1048576)),
+                ('Graphics Card', gpu_info.Name)]
+
+
+BACKENDS = (PsutilBackend, ProcfsBackend, WmiBackend)
+
+
+def select_backend(name='auto', process_name=DAYZ_PROCESS, disk_path='.'):
+    """The named backend, or the first available one for 'auto'; None when none is available"""
+    for backend in BACKENDS:
+        if name in ('auto', backend.name) and backend.available():
+            return backend(process_name, disk_path)
+    return None
+
+
+class HostMonitor(object):
+    """Samples a backend every interval seconds on a dedicated worker thread
+
+    current() returns the latest sample, or None once it is older than three
+    intervals, so a stalled backend is never shown as live data.
+    """
+    def __init__(self, backend, interval=30.0):
+        self.backend = backend
+        self.interval = interval
+        self.latest = None
+        self.system = None
+        self.samples = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='host-metrics')
+
+    def current(self):
+        if self.latest is None or time.time() - self.latest.time > self.interval * 3:
+            return None
+        return self.latest
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        if self.system is None:
+            self.system = await loop.run_in_executor(self._executor, self.backend.system_info)
+            log.info('Host Metrics: {} backend, process {}'.format(self.backend.name, self.backend.process_name))
+            for label, value in self.system:
+                log.info('{}: {}'.format(label, value))
+        while True:
+            with supervisor.iteration():
+                self.latest = await loop.run_in_executor(self._executor, self.backend.sample)
+                self.samples += 1
+            await asyncio.sleep(self.interval)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,135 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+PROFILE_URL = 'https://omegax.cftools.de/user/{}'
+
+KILLS = 'kills'
+DEATHS = 'deaths'
+KD = 'kd'
+KPH = 'kph'
+
+KILL_ORDERS = (KILLS, DEATHS, KD, KPH)
+ORDER_TITLES = {KILLS: 'Deaths', DEATHS: 'Deaths', KD: 'K/D', KPH: 'Kills/h'}
+
+
+def format_duration(seconds):
+    seconds = round(seconds)
+    return "{:02d}h : {:02d}m : {:02d}s".format(seconds // 3600, (seconds % 3600) // 60, seconds % 60)
+
+
+def kd_ratio(kills, deaths):
+    if deaths != 0:
+        return round(kills / deaths, 2)
+    return round(kills + .00, 3)
+
+
+class LeaderboardEntry(object):
+    __slots__ = ('rank', 'name', 'cftools_id', 'kills', 'deaths', 'kd', 'playtime', 'kph')
+
+    def __init__(self, rank, name, cftools_id, kills=0, deaths=0, playtime=None):
+        self.rank = rank
+        self.name = name
+        self.cftools_id = cftools_id
+        self.kills = kills
+        self.deaths = deaths
+        self.kd = kd_ratio(kills, deaths)
+        self.playtime = playtime
+        self.kph = round(kills * 3600 / playtime, 2) if playtime else 0.0
+
+    def link(self, width=15):
+        return '[{}]({})'.format(self.name[:width].ljust(width, ' '), PROFILE_URL.format(self.cftools_id))
+
+
+def _users(payload):
+    return payload.get('users', []) if isinstance(payload, dict) else []
+
+
+def parse_kills(payload):
+    """Kill board entries from a CFTools kills stats payload"""
+    return tuple(LeaderboardEntry(user['rank'], user['latest_name'], user['cftools_id'], int(user['kills']),
+                                  int(user['deaths'])) for user in _users(payload))
+
+
+def parse_playtime(payload):
+    """Playtime board entries from a CFTools playtime stats payload"""
+    return tuple(LeaderboardEntry(user['rank'], user['latest_name'], user['cftools_id'], playtime=user['playtime'])
+                 for user in _users(payload))
+
+
+class LeaderboardIndex(object):
+    """Presorted leaderboard built once per stats fetch
+
+    Holds the kill board ordered by kills, deaths, K/D and kills per hour and the
+    playtime board ordered by playtime, each with its display rows rendered up front
+    so a leaderboard command only slices the first rows it needs. Takes the parsed
+    entries from parse_kills() and parse_playtime().
+    """
+    def __init__(self, kills=None, playtime=None):
+        self.top_killer = ''
+        self.top_kd = ''
+        self.top_played = ''
+        self.rows = {}
+        self.played_rows = []
+        played = self._played(playtime or ())
+        entries = self._kills(kills or (), played)
+        if entries:
+            best = max(entries, key=lambda entry: entry.kd)
+            if best.kd > 0:
+                self.top_kd = '[{}]({}) with {}!'.format(best.name, PROFILE_URL.format(best.cftools_id), best.kd)
+                for entry in entries:
+                    if entry.rank == 1:
+                        self.top_killer = '[{}]({}) with {} kills!'.format(
+                            entry.name, PROFILE_URL.format(entry.cftools_id), entry.kills)
+        for order in KILL_ORDERS:
+            self.rows[order] = self._kill_rows(entries, order)
+
+    def _played(self, playtime):
+        played = {}
+        for entry in playtime:
+            played[entry.cftools_id] = entry
+            duration = format_duration(entry.playtime)
+            if entry.rank == 1:
+                self.top_played = '[{}]({}) with {}!'.format(entry.name, PROFILE_URL.format(entry.cftools_id),
+                                                             duration)
+            self.played_rows.append(('{} {}\n'.format(str(entry.rank).rjust(2, '0'), entry.link()),
+                                     duration + '\n'))
+        return played
+
+    def _kills(self, kills, played):
+        entries = []
+        for entry in kills:
+            playtime = played.get(entry.cftools_id)
+            entries.append(LeaderboardEntry(entry.rank, entry.name, entry.cftools_id, entry.kills, entry.deaths,
+                                            playtime.playtime if playtime is not None else None))
+        return entries
+
+    def _kill_rows(self, entries, order):
+        if order == KILLS:
+            ordered = entries
+        else:
+            ordered = sorted(entries, key=lambda entry: getattr(entry, order), reverse=True)
+        rows = []
+        for position, entry in enumerate(ordered, 1):
+            rank = entry.rank if order == KILLS else position
+            stat = entry.deaths if order in (KILLS, DEATHS) else getattr(entry, order)
+            rows.append(('{} {}\n'.format(str(rank).rjust(2, '0'), entry.link()),
+                         '{}\n'.format(entry.kills), '{}\n'.format(stat)))
+        return rows
+
+    def kill_rows(self, order=KILLS, limit=None):
+        return self.rows[order][:limit]
+
+    def played(self, limit=None):
+        return self.played_rows[:limit]
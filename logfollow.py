@@ -0,0 +1,234 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+log = logging.getLogger()
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+def newest_log(path, pattern='*.ADM'):
+    """Returns path itself, or the most recently modified match when path is a directory"""
+    if os.path.isdir(path):
+        candidates = glob.glob(os.path.join(path, pattern))
+        if not candidates:
+            return None
+        return max(candidates, key=_mtime)
+    if os.path.exists(path):
+        return path
+    return None
+
+
+class LogFollower(object):
+    """Follows a growing log file, or the newest matching file in a directory
+
+    New data is read in bulk chunks and split into lines in memory. Rotation is
+    detected by a change of file or inode and truncation by the file shrinking
+    below the read offset. The committed offset is saved to state_file so a
+    restart resumes where the previous run stopped.
+    """
+    def __init__(self, path, pattern='*.ADM', state_file=None, chunk_size=65536, poll_interval=1.0,
+                 save_interval=5.0):
+        self.path = path
+        self.pattern = pattern
+        self.state_file = state_file
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.save_interval = save_interval
+        self.current = None
+        self.inode = None
+        self.offset = 0
+        self.rotations = 0
+        self._file = None
+        self._buffer = b''
+        self._pending = 0
+        self._saved = 0
+        self._inotify = None
+        self._wakeup = None
+
+    def newest(self):
+        return newest_log(self.path, self.pattern)
+
+    def load_state(self):
+        if not self.state_file:
+            return None
+        try:
+            with open(self.state_file, 'r') as state_file:
+                return json.load(state_file).get(self.path)
+        except (OSError, ValueError):
+            return None
+
+    def save_state(self):
+        if not self.state_file or self.current is None:
+            return
+        try:
+            with open(self.state_file, 'r') as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            state = {}
+        state[self.path] = {'file': self.current, 'inode': self.inode, 'offset': self.offset}
+        temp_name = self.state_file + '.tmp'
+        with open(temp_name, 'w') as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_name, self.state_file)
+        self._saved = time.monotonic()
+
+    def _open(self, path, offset):
+        self._close_file()
+        self._file = open(path, 'rb')
+        stat = os.fstat(self._file.fileno())
+        if offset is None or offset > stat.st_size:
+            offset = stat.st_size
+        self._file.seek(offset)
+        self.current = path
+        self.inode = stat.st_ino
+        self.offset = self._pending = offset
+        self._buffer = b''
+
+    def _resume(self):
+        path = self.newest()
+        if path is None:
+            return False
+        state = self.load_state()
+        if not state:
+            self._open(path, None)
+            return True
+        previous = state.get('file')
+        try:
+            same = previous is not None and os.stat(previous).st_ino == state.get('inode')
+        except OSError:
+            same = False
+        if same:
+            # Also the case when the log rotated while stopped: the old file is drained
+            # first and _check_rotation then moves on to the newest from its start
+            log.info('Resuming {} at offset {}'.format(previous, state.get('offset')))
+            self._open(previous, state.get('offset'))
+        else:
+            log.info('Log rotated while stopped: {} -> {}'.format(previous, path))
+            self.rotations += 1
+            self._open(path, 0)
+        return True
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_lines(self):
+        data = self._file.read(self.chunk_size)
+        if not data:
+            return None
+        self._buffer += data
+        lines = self._buffer.split(b'\n')
+        self._buffer = lines.pop()
+        self._pending = self._file.tell() - len(self._buffer)
+        return [line.rstrip(b'\r').decode('utf-8', 'replace') for line in lines]
+
+    def _check_rotation(self):
+        path = self.newest()
+        if path is None:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if path != self.current or stat.st_ino != self.inode:
+            log.info('Log rotated: {} -> {}'.format(self.current, path))
+            self.rotations += 1
+            self._open(path, 0)
+            return True
+        if stat.st_size < self.offset:
+            log.info('Log truncated: {}'.format(path))
+            self._open(path, 0)
+            return True
+        return False
+
+    def _commit(self):
+        self.offset = self._pending
+        if time.monotonic() - self._saved >= self.save_interval:
+            self.save_state()
+
+    def _watch(self):
+        if inotify_simple is None:
+            return
+        directory = self.path if os.path.isdir(self.path) else (os.path.dirname(self.path) or '.')
+        flags = inotify_simple.flags
+        try:
+            self._inotify = inotify_simple.INotify()
+            self._inotify.add_watch(directory, flags.MODIFY | flags.CREATE | flags.MOVED_TO | flags.DELETE)
+        except OSError as error:
+            log.info('inotify unavailable, polling {}: {}'.format(self.path, error))
+            self._inotify = None
+            return
+        self._wakeup = asyncio.Event()
+        asyncio.get_event_loop().add_reader(self._inotify.fileno(), self._notified)
+
+    def _notified(self):
+        self._inotify.read(timeout=0)
+        self._wakeup.set()
+
+    async def _wait(self):
+        if self._inotify is None:
+            await asyncio.sleep(self.poll_interval)
+            return
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_interval * 5)
+        except asyncio.TimeoutError:
+            pass
+
+    async def follow(self):
+        """Yields lists of complete lines as they are written"""
+        self._watch()
+        try:
+            while True:
+                if self._file is None and not self._resume():
+                    await self._wait()
+                    continue
+                lines = self._read_lines()
+                if lines is None:
+                    if not self._check_rotation():
+                        await self._wait()
+                    continue
+                if lines:
+                    yield lines
+                self._commit()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._file is not None:
+            self.save_state()
+            self._close_file()
+        if self._inotify is not None:
+            asyncio.get_event_loop().remove_reader(self._inotify.fileno())
+            self._inotify.close()
+            self._inotify = None
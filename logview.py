@@ -0,0 +1,188 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import datetime
+import os
+import re
+import threading
+
+import adm
+
+_TIME = re.compile(rb'\s*(\d{1,2}):(\d\d):(\d\d)')
+_STARTED = re.compile(rb'AdminLog started on (\d{4})-(\d\d)-(\d\d)')
+
+
+def decode(line):
+    return line.rstrip(b'\r\n').decode('utf-8', 'replace')
+
+
+def reverse_lines(path, block_size=65536):
+    """Yields the lines of a file from last to first, reading backwards in blocks"""
+    with open(path, 'rb') as log_file:
+        position = log_file.seek(0, 2)
+        remainder = b''
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            log_file.seek(position)
+            lines = (log_file.read(size) + remainder).split(b'\n')
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield decode(line)
+        if remainder:
+            yield decode(remainder)
+
+
+def tail(path, count, match=None):
+    """Returns the last count lines, or the last count lines accepted by match, oldest first"""
+    lines = []
+    if count <= 0:
+        return lines
+    for line in reverse_lines(path):
+        if match is None or match(line):
+            lines.append(line)
+            if len(lines) == count:
+                break
+    lines.reverse()
+    return lines
+
+
+def line_filter(kinds=None, terms=None):
+    """Builds a line predicate for ADM event kinds and case-insensitive player or text terms"""
+    parser = adm.AdmParser()
+    terms = [term.lower() for term in terms or ()]
+
+    def match(line):
+        if kinds:
+            event = parser.parse(line)
+            if event is None or event.kind not in kinds:
+                return False
+        if terms:
+            lowered = line.lower()
+            return all(term in lowered for term in terms)
+        return True
+    if not kinds and not terms:
+        return None
+    return match
+
+
+class LogIndex(object):
+    """Sparse (timestamp, offset) index over a timestamped log file
+
+    One checkpoint is kept roughly every stride bytes. The index is extended from
+    where the last scan stopped when the file grows, and rebuilt when the file is
+    replaced or truncated. Dates come from the ADM header when present, otherwise
+    from the file's timestamps, and roll over when the clock wraps past midnight.
+    """
+    def __init__(self, path, stride=1 << 20):
+        self.path = path
+        self.stride = stride
+        self.points = []
+        self.times = []
+        self.inode = None
+        self.scanned = 0
+        self._day = None
+        self._last_seconds = 0
+        self._next_point = 0
+        self._lock = threading.Lock()
+
+    def _reset(self, stat):
+        self.points = []
+        self.times = []
+        self.inode = stat.st_ino
+        self.scanned = 0
+        self._day = datetime.datetime.fromtimestamp(min(stat.st_ctime, stat.st_mtime)).date()
+        self._last_seconds = 0
+        self._next_point = 0
+
+    def _timestamp(self, line):
+        started = _STARTED.match(line)
+        if started is not None:
+            self._day = datetime.date(*map(int, started.groups()))
+            self._last_seconds = 0
+            return None
+        stamp = _TIME.match(line)
+        if stamp is None:
+            return None
+        hours, minutes, seconds = map(int, stamp.groups())
+        seconds += hours * 3600 + minutes * 60
+        if seconds < self._last_seconds - 3600:
+            self._day += datetime.timedelta(days=1)
+        self._last_seconds = seconds
+        midnight = datetime.datetime(self._day.year, self._day.month, self._day.day)
+        return midnight.timestamp() + seconds
+
+    def update(self):
+        with self._lock:
+            self._update()
+
+    def _update(self):
+        stat = os.stat(self.path)
+        if stat.st_ino != self.inode or stat.st_size < self.scanned:
+            self._reset(stat)
+        if stat.st_size == self.scanned:
+            return
+        with open(self.path, 'rb') as log_file:
+            log_file.seek(self.scanned)
+            offset = self.scanned
+            for line in log_file:
+                if not line.endswith(b'\n'):
+                    break
+                timestamp = self._timestamp(line)
+                if timestamp is not None and offset >= self._next_point:
+                    self.points.append((offset, self._day, self._last_seconds))
+                    self.times.append(timestamp)
+                    self._next_point = offset + self.stride
+                offset += len(line)
+        self.scanned = offset
+
+    def between(self, start, end, match=None, limit=None):
+        """Returns lines stamped between two unix timestamps, oldest first"""
+        self.update()
+        position = bisect.bisect_right(self.times, start) - 1
+        scanner = LogIndex(self.path)
+        offset = 0
+        if position >= 0:
+            offset, scanner._day, scanner._last_seconds = self.points[position]
+        else:
+            scanner._reset(os.stat(self.path))
+        lines = []
+        timestamp = None
+        with open(self.path, 'rb') as log_file:
+            log_file.seek(offset)
+            for line in log_file:
+                timestamp = scanner._timestamp(line) or timestamp
+                if timestamp is None or timestamp < start:
+                    continue
+                if timestamp > end:
+                    break
+                text = decode(line)
+                if match is None or match(text):
+                    lines.append(text)
+                    if limit is not None and len(lines) >= limit:
+                        break
+        return lines
+
+
+_indexes = {}
+
+
+def index_for(path):
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes[path] = LogIndex(path)
+    return index
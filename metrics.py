@@ -0,0 +1,229 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import array
+import logging
+import math
+import os
+import pickle
+import re
+import time
+
+log = logging.getLogger()
+
+FPS = 'fps'
+CPU = 'cpu'
+MEMORY = 'memory'
+PROCESS_CPU = 'process_cpu'
+PROCESS_MEMORY = 'process_memory'
+PLAYERS = 'players'
+
+METRICS = (FPS, CPU, MEMORY, PROCESS_CPU, PROCESS_MEMORY, PLAYERS)
+METRIC_UNITS = {FPS: '', CPU: '%', MEMORY: 'MB', PROCESS_CPU: '%', PROCESS_MEMORY: 'MB', PLAYERS: ''}
+
+# (bucket seconds, buckets kept); 0 keeps every sample
+RESOLUTIONS = ((0, 1440), (60, 1440), (900, 2880), (3600, 8760))
+
+_WINDOW = re.compile(r'(\d+)([smhd])$')
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_window(text):
+    """Parses a window like '90m', '24h' or '7d' into seconds"""
+    match = _WINDOW.match(text.strip().lower())
+    if match is None:
+        raise ValueError('Invalid window: ' + text)
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+
+class Series(object):
+    """Fixed-size ring of (time, min, max, sum, count) buckets in flat arrays
+
+    With a resolution, samples falling into the newest bucket are folded into it;
+    otherwise every sample gets its own bucket. Once full, the oldest bucket is
+    overwritten, so memory is fixed at creation.
+    """
+    __slots__ = ('resolution', 'capacity', 'times', 'minimum', 'maximum', 'total', 'count', 'head', 'size')
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.times = array.array('d', [0.0]) * capacity
+        self.minimum = array.array('d', [0.0]) * capacity
+        self.maximum = array.array('d', [0.0]) * capacity
+        self.total = array.array('d', [0.0]) * capacity
+        self.count = array.array('L', [0]) * capacity
+        self.head = 0
+        self.size = 0
+
+    def add(self, when, value):
+        if self.resolution:
+            when -= when % self.resolution
+            if self.size and self.times[self.head - 1] == when:
+                last = self.head - 1
+                self.minimum[last] = min(self.minimum[last], value)
+                self.maximum[last] = max(self.maximum[last], value)
+                self.total[last] += value
+                self.count[last] += 1
+                return
+        position = self.head
+        self.times[position] = when
+        self.minimum[position] = self.maximum[position] = self.total[position] = value
+        self.count[position] = 1
+        self.head = (position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def oldest(self):
+        if not self.size:
+            return None
+        return self.times[(self.head - self.size) % self.capacity]
+
+    def buckets(self, start=0.0, end=math.inf):
+        """(time, min, max, sum, count) for buckets between start and end, oldest first"""
+        for offset in range(self.size):
+            position = (self.head - self.size + offset) % self.capacity
+            when = self.times[position]
+            if start <= when <= end:
+                yield (when, self.minimum[position], self.maximum[position], self.total[position],
+                       self.count[position])
+
+
+class Summary(object):
+    __slots__ = ('samples', 'minimum', 'average', 'maximum', 'p50', 'p95', 'resolution')
+
+    def __init__(self, buckets, resolution):
+        self.resolution = resolution
+        self.samples = sum(bucket[4] for bucket in buckets)
+        self.minimum = min(bucket[1] for bucket in buckets)
+        self.maximum = max(bucket[2] for bucket in buckets)
+        self.average = sum(bucket[3] for bucket in buckets) / self.samples
+        means = sorted(bucket[3] / bucket[4] for bucket in buckets)
+        self.p50 = percentile(means, 50)
+        self.p95 = percentile(means, 95)
+
+
+def percentile(ordered, rank):
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(rank / 100 * len(ordered)) - 1)]
+
+
+class MetricsHistory(object):
+    """Health history per (server, metric) at raw, 1 min, 15 min and 1 h resolution
+
+    record() appends to every resolution in constant time. summary() answers from
+    the finest resolution that still covers the window; percentiles are exact on
+    raw samples and computed over bucket means on the coarser ones.
+    """
+    def __init__(self, path=None, resolutions=RESOLUTIONS):
+        self.path = path
+        self.resolutions = resolutions
+        self.series = {}
+
+    def _levels(self, server, metric):
+        key = (server, metric)
+        levels = self.series.get(key)
+        if levels is None:
+            levels = self.series[key] = [Series(resolution, capacity) for resolution, capacity in self.resolutions]
+        return levels
+
+    def record(self, server, metric, value, when=None):
+        if value is None:
+            return
+        when = time.time() if when is None else when
+        value = float(value)
+        for series in self._levels(server, metric):
+            series.add(when, value)
+
+    def record_info(self, server, info, players=None, when=None):
+        """Records the health values of a parsed ServerInfo"""
+        when = time.time() if when is None else when
+        self.record(server, PLAYERS, info.current_players if players is None else players, when)
+        health = info.health
+        if health is None:
+            return
+        self.record(server, FPS, health.fps, when)
+        self.record(server, CPU, health.cpu_usage, when)
+        self.record(server, MEMORY, health.memory_used, when)
+        self.record(server, PROCESS_CPU, health.process_cpu, when)
+        self.record(server, PROCESS_MEMORY, health.process_memory, when)
+
+    def select(self, server, metric, window, now=None):
+        """Finest series covering the last window seconds
+
+        When the history is younger than the window, the finest series that has not
+        wrapped yet still holds all of it.
+        """
+        levels = self.series.get((server, metric))
+        if not levels:
+            return None
+        start = (time.time() if now is None else now) - window
+        for series in levels:
+            oldest = series.oldest()
+            if oldest is not None and oldest <= start:
+                return series
+        for series in levels:
+            if series.size < series.capacity:
+                return series
+        return levels[-1]
+
+    def points(self, server, metric, window, now=None):
+        """(time, mean) pairs over the last window seconds"""
+        now = time.time() if now is None else now
+        series = self.select(server, metric, window, now)
+        if series is None:
+            return []
+        return [(bucket[0], bucket[3] / bucket[4]) for bucket in series.buckets(now - window, now)]
+
+    def summary(self, server, metric, window, now=None):
+        now = time.time() if now is None else now
+        series = self.select(server, metric, window, now)
+        if series is None:
+            return None
+        buckets = list(series.buckets(now - window, now))
+        if not buckets:
+            return None
+        return Summary(buckets, series.resolution)
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        temp_name = path + '.tmp'
+        with open(temp_name, 'wb') as history_file:
+            pickle.dump({'resolutions': self.resolutions, 'series': self.series}, history_file,
+                        pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_name, path)
+
+    def load(self, path=None):
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as history_file:
+                state = pickle.load(history_file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as error:
+            log.info('Metrics history not loaded: {}'.format(error))
+            return False
+        if tuple(state.get('resolutions', ())) != tuple(self.resolutions):
+            log.info('Metrics history resolutions changed, starting fresh')
+            return False
+        self.series = state['series']
+        return True
+
+    def stats(self):
+        return {'series': len(self.series),
+                'bytes': sum(series.capacity * 40 for levels in self.series.values() for series in levels)}
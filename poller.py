@@ -0,0 +1,192 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+
+import supervisor
+
+log = logging.getLogger()
+
+SERVERINFO = 'serverinfo'
+PLAYERLIST = 'playerlist'
+KILLS = 'kills'
+PLAYTIME = 'playtime'
+
+STATUS_ENDPOINTS = (SERVERINFO, PLAYERLIST)
+LEADERBOARD_ENDPOINTS = (KILLS, PLAYTIME)
+
+
+class PollJob(object):
+    __slots__ = ('server', 'endpoint', 'due', 'failures', 'interval', 'token')
+
+    def __init__(self, server, endpoint, due, token):
+        self.server = server
+        self.endpoint = endpoint
+        self.due = due
+        self.token = token
+        self.failures = 0
+        self.interval = None
+
+
+class PollScheduler(object):
+    """Polls each server endpoint on its own adaptive schedule
+
+    Every (server, endpoint) pair keeps its own next-due time. The interval is
+    derived from the server's last reported state: restarting and busy servers have
+    their status polled more often, offline and empty servers less often. Failed polls back off
+    exponentially and every interval is jittered so servers drift apart.
+    """
+    starting_factor = 0.25
+    busy_factor = 0.5
+    busy_ratio = 0.75
+    empty_factor = 2.0
+    idle_factor = 4.0
+
+    def __init__(self, fetch, status_interval, leaderboard_interval, min_interval=15, max_backoff=900,
+                 jitter=0.1, reconcile_interval=None):
+        self.fetch = fetch
+        self.status_interval = status_interval
+        self.leaderboard_interval = leaderboard_interval
+        self.reconcile_interval = reconcile_interval
+        self.min_interval = min_interval
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.servers = {}
+        self.calls = 0
+        self.errors = 0
+        self.running = False
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks = set()
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job.due, next(self._counter), job))
+        self._wakeup.set()
+
+    def add_server(self, server):
+        token = self.servers[server] = object()
+        now = time.monotonic()
+        for endpoint in STATUS_ENDPOINTS + LEADERBOARD_ENDPOINTS:
+            self._push(PollJob(server, endpoint, now + random.uniform(0, 5), token))
+
+    def remove_server(self, server):
+        self.servers.pop(server, None)
+
+    def _active(self, job):
+        return self.servers.get(job.server) is job.token
+
+    def clear(self):
+        self.servers.clear()
+        self._heap.clear()
+
+    def base_interval(self, endpoint, server=None):
+        if endpoint in LEADERBOARD_ENDPOINTS:
+            return self.leaderboard_interval
+        if endpoint == PLAYERLIST and self.reconcile_interval and self.streaming(server):
+            return self.reconcile_interval
+        return self.status_interval
+
+    def streaming(self, server):
+        """True when the server's online players already come from its ADM stream"""
+        sessions = getattr(server, 'sessions', None)
+        return sessions is not None and sessions.streaming
+
+    def interval(self, job, success):
+        base = self.base_interval(job.endpoint, job.server)
+        if not success:
+            job.failures += 1
+            # Backing off never polls sooner than the endpoint's normal interval
+            interval = max(base, min(base * 2 ** job.failures, self.max_backoff))
+        elif job.endpoint in STATUS_ENDPOINTS:
+            job.failures = 0
+            interval = base * self.state_factor(job.server)
+        else:
+            job.failures = 0
+            interval = base
+        interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(interval, self.min_interval)
+
+    def state_factor(self, server):
+        info = server.info
+        if info is None:
+            return 1.0
+        if info.state == 'starting':
+            return self.starting_factor
+        if info.state == 'idle':
+            return self.idle_factor
+        players = info.current_players
+        max_players = info.max_players
+        if players == 0:
+            return self.empty_factor
+        if max_players and players >= max_players * self.busy_ratio:
+            return self.busy_factor
+        return 1.0
+
+    async def _poll(self, job):
+        self.calls += 1
+        try:
+            success = await self.fetch(job.server, job.endpoint)
+        except asyncio.CancelledError:
+            # Cancelled with the scheduler; due again as soon as it restarts
+            if self._active(job):
+                job.due = time.monotonic()
+                self._push(job)
+            raise
+        except Exception as error:
+            log.info('Poll {} {} Failed: {}'.format(job.server.name, job.endpoint, error))
+            success = False
+        if not success:
+            self.errors += 1
+        if not self._active(job):
+            return
+        job.interval = self.interval(job, success)
+        job.due = time.monotonic() + job.interval
+        self._push(job)
+
+    def _start(self, job):
+        task = asyncio.ensure_future(self._poll(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run(self):
+        self.running = True
+        try:
+            while True:
+                now = time.monotonic()
+                with supervisor.iteration():
+                    while self._heap and self._heap[0][0] <= now:
+                        job = heapq.heappop(self._heap)[2]
+                        if self._active(job):
+                            self._start(job)
+                delay = self._heap[0][0] - now if self._heap else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.running = False
+            for task in self._tasks:
+                task.cancel()
+
+    def stats(self):
+        return {'servers': len(self.servers), 'scheduled': len(self._heap), 'in_flight': len(self._tasks),
+                'calls': self.calls, 'errors': self.errors}
@@ -0,0 +1,215 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Event loop stall detection, per-command phase timing and sampling profiles
+
+StallMonitor is a watchdog thread that notices when the event loop stops
+running its heartbeat and captures the loop thread's stack while the blocking
+callback is still on it. CommandTrace accumulates time per phase of a command
+(check, render, send); phase() is a no-op unless a trace is active in the
+current task. sample_stacks() samples a thread's stack for a while and is run in
+an executor so the loop being sampled keeps running.
+"""
+import asyncio
+import collections
+import contextlib
+import contextvars
+import datetime
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+import telemetry
+
+log = logging.getLogger()
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+STALLS = telemetry.Counter('aurora_event_loop_stalls_total', 'Event loop stalls longer than the slow callback threshold')
+COMMAND_PHASE = telemetry.Histogram('aurora_command_phase_seconds', 'Time spent per command phase',
+                                    ('command', 'phase'))
+
+
+class CommandTrace(object):
+    __slots__ = ('command', 'started', 'phases')
+
+    def __init__(self, command):
+        self.command = command
+        self.started = time.perf_counter()
+        self.phases = collections.OrderedDict()
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def finish(self):
+        """Records the phases and returns the total; time outside any phase is recorded as other"""
+        total = time.perf_counter() - self.started
+        self.phases['other'] = max(total - sum(self.phases.values()), 0.0)
+        for phase, seconds in self.phases.items():
+            COMMAND_PHASE.labels(self.command, phase).observe(seconds)
+        return total
+
+    def __str__(self):
+        total = time.perf_counter() - self.started
+        return '{} {:.1f} ms: {}'.format(self.command, total * 1000, ', '.join(
+            '{} {:.1f} ms'.format(phase, seconds * 1000) for phase, seconds in self.phases.items()))
+
+
+def start_trace(command):
+    trace = CommandTrace(command)
+    current_trace.set(trace)
+    return trace
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Adds the time spent in the block to the current command's trace
+
+    Sends gathered concurrently each add their own time, so phases can add up
+    to more than the command's wall time.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - start)
+
+
+class Stall(object):
+    __slots__ = ('when', 'duration', 'stack')
+
+    def __init__(self, when, duration, stack):
+        self.when = when
+        self.duration = duration
+        self.stack = stack
+
+
+def short_path(filename):
+    """Shortens paths under this repository and the standard library for display"""
+    for base in (ROOT, os.path.dirname(os.__file__)):
+        if filename.startswith(base + os.sep):
+            return filename[len(base) + 1:]
+    return filename
+
+
+def format_stack(frame):
+    return ''.join(traceback.format_stack(frame)).replace(ROOT + os.sep, '')
+
+
+class StallMonitor(object):
+    """Reports callbacks that keep the event loop busy for longer than threshold seconds
+
+    run() beats a heartbeat on the loop; a watchdog thread checks it several times
+    per threshold and, once it is late, captures the loop thread's stack. The
+    stall is logged with that stack when the loop comes back.
+    """
+    def __init__(self, threshold=0.25, history=20):
+        self.threshold = threshold
+        self.stalls = collections.deque(maxlen=history)
+        self._beat = time.monotonic()
+
+    async def run(self):
+        stopped = threading.Event()
+        thread = threading.Thread(target=self._watch, args=(threading.get_ident(), stopped),
+                                  name='stall-monitor', daemon=True)
+        thread.start()
+        try:
+            while True:
+                self._beat = time.monotonic()
+                await asyncio.sleep(self.threshold / 4)
+        finally:
+            stopped.set()
+
+    def _watch(self, thread_id, stopped):
+        stall = None
+        beat = None
+        while not stopped.wait(self.threshold / 4):
+            now = time.monotonic()
+            if stall is not None and self._beat != beat:
+                self._report(stall)
+                stall = None
+            beat = self._beat
+            late = now - beat
+            if late < self.threshold:
+                continue
+            if stall is None:
+                frame = sys._current_frames().get(thread_id)
+                stall = Stall(datetime.datetime.now() - datetime.timedelta(seconds=late), late,
+                              format_stack(frame) if frame is not None else '')
+            stall.duration = late
+
+    def _report(self, stall):
+        self.stalls.append(stall)
+        STALLS.inc()
+        log.info('Event Loop Blocked For {:.0f} ms, Stack:\n{}'.format(stall.duration * 1000, stall.stack))
+
+
+def sample_stacks(thread_id, seconds, interval=0.005):
+    """Samples a thread's stack every interval seconds; returns the sample count and a Counter of stacks
+
+    Stacks are tuples of 'file:function' from the outermost frame inwards.
+    """
+    stacks = collections.Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append('{}:{}'.format(short_path(code.co_filename), code.co_name))
+            frame = frame.f_back
+        stacks[tuple(reversed(stack))] += 1
+        samples += 1
+        time.sleep(interval)
+    return samples, stacks
+
+
+def format_profile(samples, stacks, limit=25):
+    """Text dump of the hottest functions by own and total samples, then collapsed stacks
+
+    The collapsed stack lines are in the format flamegraph.pl and speedscope read.
+    """
+    own = collections.Counter()
+    total = collections.Counter()
+    for stack, count in stacks.items():
+        own[stack[-1]] += count
+        for function in set(stack):
+            total[function] += count
+    lines = ['{} samples'.format(samples), '', 'Own time:']
+    lines.extend('{:6.1%} {}'.format(count / samples, function) for function, count in own.most_common(limit))
+    lines.extend(['', 'Total time:'])
+    lines.extend('{:6.1%} {}'.format(count / samples, function) for function, count in total.most_common(limit))
+    lines.extend(['', 'Stacks:'])
+    lines.extend('{} {}'.format(';'.join(stack), count) for stack, count in stacks.most_common())
+    return '\n'.join(lines) + '\n'
+
+
+def format_stalls(stalls):
+    lines = []
+    for stall in stalls:
+        lines.append('{:%Y-%m-%d %H:%M:%S} blocked {:.0f} ms'.format(stall.when, stall.duration * 1000))
+        lines.append(stall.stack)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,68 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import datetime
+
+import profiler
+
+
+class RenderCache(object):
+    """Caches built embeds per (command, server, arguments)
+
+    Entries are tagged with the server's data version and rebuilt when it changes.
+    Report timestamps on cached embeds are refreshed on every hit, and an optional
+    refresh callable can update other time dependent fields in place.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, command, server, build, *args, refresh=None):
+        with profiler.phase('render'):
+            return self._render(command, server, build, args, refresh)
+
+    def _render(self, command, server, build, args, refresh):
+        key = (command, server.name) + args
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] is server and entry[1] == server.version:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            embeds = entry[2]
+            now = datetime.datetime.now().astimezone()
+            for embed in embeds:
+                if embed.timestamp:
+                    embed.timestamp = now
+            if refresh is not None:
+                refresh(server, embeds)
+            return embeds
+        self.misses += 1
+        embeds = build(server, *args)
+        self.entries[key] = (server, server.version, embeds)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return embeds
+
+    def invalidate(self, name, command=None):
+        for key in [key for key in self.entries if key[1] == name and command in (None, key[0])]:
+            del self.entries[key]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0}
@@ -0,0 +1,139 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import leaderboard
+import poller
+
+
+class ModRecord(object):
+    __slots__ = ('directory', 'file_id')
+
+    def __init__(self, directory, file_id=None):
+        self.directory = directory
+        self.file_id = file_id
+
+
+class PlayerRecord(object):
+    __slots__ = ('name', 'cftools_id')
+
+    def __init__(self, name, cftools_id=None):
+        self.name = name
+        self.cftools_id = cftools_id
+
+
+class Schedule(object):
+    __slots__ = ('action', 'time')
+
+    def __init__(self, action, time):
+        self.action = action
+        self.time = time
+
+
+class HealthMetrics(object):
+    __slots__ = ('fps', 'application', 'boot_time', 'cpu_usage', 'memory_used', 'cpu_count', 'manager_version',
+                 'process_cpu', 'process_memory', 'mods')
+
+    def __init__(self, health):
+        game = health.get('game', {})
+        system = health.get('system', {})
+        process = health.get('process', {})
+        self.fps = game.get('fps')
+        self.mods = tuple(ModRecord(str(mod['directory']), mod.get('file_id')) for mod in game.get('mods', []))
+        self.application = system.get('application')
+        self.boot_time = int(system.get('boot_time') or 0)
+        self.cpu_usage = system.get('cpu_usage')
+        self.memory_used = system.get('memory', {}).get('used')
+        self.cpu_count = system.get('cpu_count')
+        self.manager_version = system.get('version')
+        self.process_cpu = process.get('cpu_usage')
+        self.process_memory = process.get('memory_usage')
+
+
+class ServerInfo(object):
+    """Parsed CFTools serverinfo response
+
+    health is None when the server did not report it, which is how the API shows
+    a server that is down.
+    """
+    __slots__ = ('servername', 'state', 'version', 'fpp_only', 'current_players', 'max_players', 'gametime',
+                 'time_acceleration', 'map', 'hive', 'node', 'health', 'schedule')
+
+    def __init__(self, data):
+        self.servername = data.get('servername', '')
+        self.state = data.get('state')
+        self.version = data.get('version')
+        self.fpp_only = bool(data.get('fpp_only'))
+        self.current_players = data.get('current_players') or 0
+        self.max_players = data.get('max_players') or 0
+        self.gametime = data.get('gametime')
+        self.time_acceleration = data.get('time_acceleration')
+        self.map = data.get('map')
+        self.hive = data.get('hive')
+        self.node = data.get('node')
+        health = data.get('health')
+        self.health = HealthMetrics(health) if isinstance(health, dict) else None
+        task = (data.get('next_scheduled_task') or {}).get('task')
+        self.schedule = Schedule(task.get('action'), task.get('time')) if isinstance(task, dict) else None
+
+
+def parse_players(data):
+    return tuple(PlayerRecord(player['info']['name'], player.get('cftools_id'))
+                 for player in data.get('players', []))
+
+
+class Server(object):
+    """One configured server and its state as parsed from the last API responses
+
+    version is bumped on every change so cached renders can be reused until then.
+    """
+    __slots__ = ('name', 'address', 'server_url', 'service_api_key', 'service_id', 'server_icon', 'info',
+                 'players', 'kills', 'playtime', 'leaderboard', 'last_update', 'version', 'validators', 'sessions')
+
+    def __init__(self, name=None, address=None, server_url=None, service_api_key=None, service_id=None,
+                 server_icon=None):
+        self.name = name
+        self.address = address
+        self.server_url = server_url
+        self.service_api_key = service_api_key
+        self.service_id = service_id
+        self.server_icon = server_icon
+        self.info = None
+        self.players = ()
+        self.kills = ()
+        self.playtime = ()
+        self.leaderboard = None
+        self.last_update = None
+        self.version = 0
+        self.validators = {}
+        self.sessions = None
+
+    @classmethod
+    def from_config(cls, entry):
+        return cls(entry['name'], entry['address'], entry['server_url'], entry['service_api_key'],
+                   entry['service_id'], entry['server_icon'])
+
+    def update(self, endpoint, data):
+        """Parses one API response into the server state"""
+        if endpoint == poller.SERVERINFO:
+            self.info = ServerInfo(data)
+        elif endpoint == poller.PLAYERLIST:
+            self.players = parse_players(data)
+        elif endpoint == poller.KILLS:
+            self.kills = leaderboard.parse_kills(data)
+        elif endpoint == poller.PLAYTIME:
+            self.playtime = leaderboard.parse_playtime(data)
+        if endpoint in poller.LEADERBOARD_ENDPOINTS:
+            self.leaderboard = leaderboard.LeaderboardIndex(self.kills, self.playtime)
+        self.version += 1
@@ -0,0 +1,160 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+import adm
+
+
+class Session(object):
+    __slots__ = ('key', 'buid', 'name', 'cftools_id', 'connected', 'last_seen', 'position')
+
+    def __init__(self, key, buid, name, connected=None, cftools_id=None):
+        self.key = key
+        self.buid = buid
+        self.name = name
+        self.cftools_id = cftools_id
+        self.connected = connected
+        self.last_seen = connected
+        self.position = None
+
+    def __repr__(self):
+        return '<Session {!r} {}>'.format(self.name, self.buid)
+
+
+class SessionTable(object):
+    """Live online players of one server, keyed by BUID
+
+    Connects and disconnects from the ADM stream add and remove sessions, and any
+    other player event refreshes the last known position. Every update is a dict
+    operation. reconcile() corrects the table against a CFTools playerlist; players
+    only known to the API are keyed by name until the ADM stream identifies them.
+    version changes whenever the set of online players does.
+    """
+    def __init__(self):
+        self.online = {}
+        self.names = {}
+        self.version = 0
+        self.events = 0
+        self.reconciled = None
+
+    @property
+    def live(self):
+        return self.events > 0 or self.reconciled is not None
+
+    @property
+    def streaming(self):
+        return self.events > 0
+
+    def __len__(self):
+        return len(self.online)
+
+    def _add(self, session):
+        self.online[session.key] = session
+        self.names[session.name] = session.key
+        self.version += 1
+
+    def _remove(self, key):
+        session = self.online.pop(key, None)
+        if session is None:
+            return False
+        if self.names.get(session.name) == key:
+            del self.names[session.name]
+        self.version += 1
+        return True
+
+    def _connect(self, buid, name, when):
+        placeholder = self.names.get(name)
+        if placeholder is not None and placeholder != buid:
+            self._remove(placeholder)
+        session = self.online.get(buid)
+        if session is None:
+            self._add(Session(buid, buid, name, when))
+            return True
+        session.connected = session.last_seen = when
+        return False
+
+    def _seen(self, buid, name, position, when):
+        if buid is None:
+            return False
+        session = self.online.get(buid)
+        if session is None:
+            self._connect(buid, name, when)
+            session = self.online[buid]
+            changed = True
+        else:
+            changed = False
+        session.last_seen = when
+        if position is not None:
+            session.position = position
+        return changed
+
+    def apply(self, event):
+        """Applies one ADM event, returns True if the set of online players changed"""
+        self.events += 1
+        when = event.timestamp()
+        if event.kind == adm.CONNECT:
+            if event.buid is None:
+                return False
+            return self._connect(event.buid, event.player, when)
+        if event.kind == adm.DISCONNECT:
+            if event.buid in self.online:
+                return self._remove(event.buid)
+            key = self.names.get(event.player)
+            return key is not None and self._remove(key)
+        changed = self._seen(event.buid, event.player, event.pos, when)
+        killer_buid = getattr(event, 'killer_buid', None)
+        if killer_buid is not None:
+            changed = self._seen(killer_buid, event.killer, event.killer_pos, when) or changed
+        return changed
+
+    def reconcile(self, players, now=None, grace=120):
+        """Matches the table to the parsed CFTools playerlist, returns True if it changed
+
+        Sessions that started within grace seconds are kept even when missing from
+        the list, since the API lags behind the log.
+        """
+        now = time.time() if now is None else now
+        listed = {player.name: player.cftools_id for player in players}
+        version = self.version
+        for key, session in list(self.online.items()):
+            if session.name in listed:
+                session.cftools_id = listed[session.name]
+            elif session.connected is None or now - session.connected > grace:
+                self._remove(key)
+        for name, cftools_id in listed.items():
+            if name not in self.names:
+                self._add(Session('name:' + name, None, name, cftools_id=cftools_id))
+        self.reconciled = now
+        return self.version != version
+
+    def sessions(self):
+        """Online sessions, longest connected first"""
+        return sorted(self.online.values(), key=lambda session: session.connected or 0)
+
+
+class SessionTracker(object):
+    """SessionTable per server name, kept across configuration reloads"""
+    def __init__(self):
+        self.tables = {}
+
+    def table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = SessionTable()
+        return table
+
+    def stats(self):
+        return {name: len(table) for name, table in self.tables.items()}
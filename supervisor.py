@@ -0,0 +1,163 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import contextlib
+import logging
+import time
+
+log = logging.getLogger()
+
+RUNNING = 'running'
+BACKOFF = 'backoff'
+FINISHED = 'finished'
+STOPPED = 'stopped'
+
+# Supervised task -> Service, so iteration() can find the service it runs in
+_current = {}
+
+
+@contextlib.contextmanager
+def iteration():
+    """Times one loop iteration of the supervised service running in the current task
+
+    A no-op outside a supervised task, so loops can use it unconditionally.
+    """
+    service = _current.get(asyncio.current_task())
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if service is not None:
+            service.record(time.perf_counter() - start)
+
+
+class Service(object):
+    __slots__ = ('name', 'factory', 'task', 'state', 'restarts', 'started', 'last_error', 'iterations',
+                 'last_latency', 'max_latency', 'total_latency')
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.task = None
+        self.state = STOPPED
+        self.restarts = 0
+        self.started = None
+        self.last_error = None
+        self.iterations = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    @property
+    def average_latency(self):
+        return self.total_latency / self.iterations if self.iterations else None
+
+    def record(self, seconds):
+        self.iterations += 1
+        self.last_latency = seconds
+        self.total_latency += seconds
+        if seconds > self.max_latency:
+            self.max_latency = seconds
+
+
+class Supervisor(object):
+    """Runs named background services, one instance each, and restarts them when they fail
+
+    factory is called for every (re)start and must return a new coroutine.
+    Starting a name that is already running does nothing, so callers that can
+    run more than once, like on_ready after a reconnect, cannot duplicate a
+    loop. The restart delay doubles after each consecutive crash up to
+    max_delay and resets once a run has lasted longer than max_delay. A service
+    whose coroutine returns is finished and not restarted.
+    """
+    def __init__(self, restart_delay=5.0, max_delay=300.0):
+        self.restart_delay = restart_delay
+        self.max_delay = max_delay
+        self.services = {}
+
+    async def _supervise(self, service):
+        task = asyncio.current_task()
+        _current[task] = service
+        delay = self.restart_delay
+        try:
+            while True:
+                service.state = RUNNING
+                service.started = time.time()
+                started = time.monotonic()
+                try:
+                    await service.factory()
+                    service.state = FINISHED
+                    log.info('Service {} finished'.format(service.name))
+                    return
+                except Exception as error:
+                    service.last_error = '{}: {}'.format(type(error).__name__, error)
+                    log.exception('Service {} crashed: {}'.format(service.name, error))
+                if time.monotonic() - started > self.max_delay:
+                    delay = self.restart_delay
+                service.restarts += 1
+                service.state = BACKOFF
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_delay)
+        finally:
+            _current.pop(task, None)
+            if service.state != FINISHED:
+                service.state = STOPPED
+
+    def running(self, name):
+        service = self.services.get(name)
+        return service is not None and service.running
+
+    def start(self, name, factory):
+        """Starts a service unless one with that name is already running; True when started"""
+        service = self.services.get(name)
+        if service is not None and service.running:
+            return False
+        if service is None:
+            service = self.services[name] = Service(name, factory)
+        service.factory = factory
+        service.task = asyncio.ensure_future(self._supervise(service))
+        return True
+
+    def _cancel(self, name):
+        service = self.services.pop(name, None)
+        if service is None or not service.running:
+            return None
+        service.task.cancel()
+        return service.task
+
+    async def stop(self, name, timeout=5.0):
+        """Cancels a service and waits up to timeout for it to unwind
+
+        Waiting lets its cleanup, like a log follower saving its offset, finish
+        before a replacement under the same name starts.
+        """
+        task = self._cancel(name)
+        if task is not None:
+            await asyncio.wait([task], timeout=timeout)
+
+    async def shutdown(self, timeout=5.0):
+        """Cancels every service and waits up to timeout for them to unwind"""
+        tasks = [self._cancel(name) for name in list(self.services)]
+        tasks = [task for task in tasks if task is not None]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    def stats(self):
+        return {name: service.restarts for name, service in self.services.items()}
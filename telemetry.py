@@ -0,0 +1,255 @@
+#  Copyright © 2018, 2019 James M. Ivey <james@binaryalkemist.net>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""In-process counters, gauges and histograms served in the Prometheus text format
+
+Metrics register themselves in the module registry when created. Values that
+other objects already count, like cache hits, are exported with callbacks
+read at scrape time instead of being counted twice.
+"""
+import asyncio
+import bisect
+import logging
+import math
+import time
+
+from aiohttp import web
+
+log = logging.getLogger()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry = []
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append('{}="{}"'.format(name, value))
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric(object):
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.children = {}
+        registry.append(self)
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._child()
+        return child
+
+    def samples(self):
+        for values, child in sorted(self.children.items()):
+            yield self.name, format_labels(self.label_names, values), child.value
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} {}'.format(self.name, self.kind)]
+        for name, labels, value in self.samples():
+            lines.append('{}{} {}'.format(name, labels, format_value(value)))
+        return lines
+
+
+class _Value(object):
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(Metric):
+    kind = 'counter'
+    _child = _Value
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+    _child = _Value
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _Buckets(object):
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        Metric.__init__(self, name, documentation, labels)
+
+    def _child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        label_names = self.label_names + ('le',)
+        for values, child in sorted(self.children.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                total += count
+                yield self.name + '_bucket', format_labels(label_names, values + (format_value(bound),)), total
+            labels = format_labels(self.label_names, values)
+            yield self.name + '_sum', labels, child.sum
+            yield self.name + '_count', labels, child.count
+
+
+class Callback(Metric):
+    """Counter or gauge whose labelled values are read from read() at scrape time
+
+    read returns {label values tuple: value}, or a plain number without labels.
+    """
+    def __init__(self, name, documentation, read, labels=(), kind='gauge'):
+        self.read = read
+        self.kind = kind
+        Metric.__init__(self, name, documentation, labels)
+
+    def samples(self):
+        values = self.read()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            if value is not None:
+                yield self.name, format_labels(self.label_names, key), value
+
+
+def render():
+    lines = []
+    for metric in registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as error:
+            log.info('Telemetry: {} not rendered: {}'.format(metric.name, error))
+    return '\n'.join(lines) + '\n'
+
+
+class Timer(object):
+    """Context manager observing elapsed seconds into a histogram child"""
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+API_REQUESTS = Counter('aurora_cftools_requests_total', 'CFTools API requests by endpoint, server and outcome',
+                       ('endpoint', 'server', 'outcome'))
+API_LATENCY = Histogram('aurora_cftools_request_seconds', 'CFTools API request latency',
+                        ('endpoint', 'server'))
+POLL_DURATION = Histogram('aurora_poll_seconds', 'Poll duration including parsing, by endpoint', ('endpoint',))
+ADM_LAG = Gauge('aurora_adm_lag_seconds', 'Age of the newest ADM event when it was parsed', ('server',))
+DISCORD_SEND_LATENCY = Histogram('aurora_discord_send_seconds', 'Discord message send latency', ('path',))
+DISCORD_RATE_LIMITED = Counter('aurora_discord_rate_limited_total', 'Discord 429 responses', ('path',))
+COMMAND_LATENCY = Histogram('aurora_command_seconds', 'Command latency from invoke to completion',
+                            ('command', 'outcome'), buckets=LATENCY_BUCKETS + (30.0, 60.0))
+LOOP_LAG = Histogram('aurora_event_loop_lag_seconds', 'Event loop scheduling delay',
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+LOOP_LAG_LAST = Gauge('aurora_event_loop_lag_last_seconds', 'Most recent event loop scheduling delay')
+
+
+async def monitor_loop_lag(interval=1.0):
+    """Measures how late the event loop wakes a sleeping coroutine"""
+    loop = asyncio.get_event_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - start - interval, 0.0)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+
+
+class TelemetryServer(object):
+    """Serves render() at /metrics over a small aiohttp server"""
+    def __init__(self, host='127.0.0.1', port=9108):
+        self.host = host
+        self.port = port
+        self.scrapes = 0
+        self._runner = None
+
+    async def metrics(self, request):
+        self.scrapes += 1
+        return web.Response(body=render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        log.info('Telemetry on http://{}:{}/metrics'.format(self.host, self.port))
+
+    async def run(self):
+        """Serves until cancelled, for running under the supervisor"""
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -14,7 +14,6 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import asyncio
 import datetime
 import math
 import time
@@ -22,529 +21,459 @@ import traceback
 import sys
 import discord
 from discord.ext import commands
+import adm
+import dispatcher
+import leaderboard
+import metrics
+from leaderboard import LeaderboardIndex, format_duration
+from rendercache import RenderCache
+
+
+render_cache = RenderCache()
+send_scheduler = dispatcher.SendScheduler()
+
+
+def format_position(pos):
+    if pos is None:
+        return '<unknown>'
+    return '<{}, {}, {}>'.format(*pos)
+
+
+def format_event(event, server=None):
+    text = _format_event(event)
+    if text is None or server is None:
+        return text
+    return '[{}] {}'.format(server, text)
+
+
+def _format_event(event):
+    if event.kind == adm.CONNECT:
+        return 'CONNECT: {} \nPlayer: {} \nBUID: {}\n'.format(event.time, event.player, event.buid)
+    if event.kind == adm.DEATH:
+        return 'DEATH: {} \nPlayer: {} \nBUID: {} \nPos: {}\nWater: {}\nEnergy: {}\nBleed Sources: {}\n'.format(
+            event.time, event.player, event.buid, format_position(event.pos), event.water, event.energy,
+            event.bleed_sources)
+    if event.kind == adm.KILL:
+        if event.killer_buid is None:
+            return '{} | Player {} BUID {} Position {} KILLED\nby {}\n'.format(
+                event.time, event.player, event.buid, format_position(event.pos), event.killer)
+        return '{} | Player {} BUID {} Position {} KILLED\nby Player {} BUID {} Position {} with {}\n'.format(
+            event.time, event.player, event.buid, format_position(event.pos), event.killer, event.killer_buid,
+            format_position(event.killer_pos), event.weapon)
+    return None
+
+
+def server_error_embed(server, info, author):
+    embed1 = discord.Embed(title=info.servername, colour=discord.Colour(0x3D85C6),
+                           url=server.server_url,
+                           description=server.address,
+                           timestamp=datetime.datetime.now().astimezone())
+    embed1.set_author(name=author, url=server.server_icon,
+                      icon_url=server.server_icon)
+    embed1.add_field(name="Server Did Not Respond, May Be Down", value='\u200b')
+    embed1.set_footer(text='Server Error', icon_url=server.server_icon)
+    return embed1
+
+
+def no_data_embed(server, author):
+    """Placeholder for a server that has not been polled successfully yet"""
+    embed = discord.Embed(title=server.name, colour=discord.Colour(0x3D85C6), url=server.server_url,
+                          description=server.address, timestamp=datetime.datetime.now().astimezone())
+    embed.set_author(name=author, url=server.server_url, icon_url=server.server_icon)
+    embed.add_field(name="No Data Yet, Waiting For The First Server Update", value='\u200b')
+    embed.set_footer(text='No Data', icon_url=server.server_icon)
+    return embed
+
+
+async def send_embeds(ctx, embeds):
+    await send_scheduler.send_embeds(ctx, embeds)
+
+
+def render_all(command, servers, build, *args, refresh=None):
+    """Embeds for every server, in server order, built before anything is sent"""
+    embeds = []
+    for server in servers:
+        embeds.extend(render_cache.render(command, server, build, *args, refresh=refresh))
+    return embeds
+
+
+async def display_all(ctx, command, servers, build, *args, refresh=None):
+    await send_embeds(ctx, render_all(command, servers, build, *args, refresh=refresh))
+
+
+def build_status(server):
+    info = server.info
+    if info is None:
+        return [no_data_embed(server, 'Server Details')]
+    if info.health is None:
+        return [server_error_embed(server, info, 'Mod Information')]
+    if info.fpp_only:
+        game_mode = '1st Person'
+    else:
+        game_mode = '3rd Person'
+    embed = discord.Embed(title=info.servername, colour=discord.Colour(0x3D85C6),
+                          url=server.server_url,
+                          description=server.address,
+                          timestamp=datetime.datetime.now().astimezone())
+    embed.set_author(name='Server Details', url=server.server_url,
+                     icon_url=server.server_icon)
+    embed.set_footer(text="Report Generated", icon_url=server.server_icon)
+    embed.add_field(name="Status", value=str(info.state).capitalize())
+    embed.add_field(name="DayZ Version", value=info.version)
+    embed.add_field(name="Connected Players",
+                    value=str(info.current_players) + '/' + str(info.max_players))
+    embed.add_field(name="In-Game Time", value=info.gametime)
+    embed.add_field(name="Time Acceleration", value=info.time_acceleration)
+    embed.add_field(name="Server FPS", value=info.health.fps)
+    embed.add_field(name="Game Mode", value=game_mode)
+    embed.add_field(name="Map", value=info.map)
+    embed.add_field(name="Hive", value=info.hive)
+    return [embed]
 
 
-class Server(object):
-    def __init__(self, name=None, address=None, server_url=None, service_api_key=None, service_id=None, server_icon=None,
-                 info=None, players=None, kills=None, playtime=None):
-        self.name = name
-        self.address = address
-        self.server_url = server_url
-        self.service_api_key = service_api_key
-        self.service_id = service_id
-        self.server_icon = server_icon
-        self.info = info
-        self.players = players
-        self.kills = kills
-        self.playtime = playtime
+async def display_status(ctx, server: object):
+    await send_embeds(ctx, render_cache.render('status', server, build_status))
+
+
+def build_tech(server):
+    info = server.info
+    if info is None:
+        return [no_data_embed(server, 'Server Technical Details')]
+    health = info.health
+    if health is None:
+        return [server_error_embed(server, info, 'Mod Information')]
+    if health.application == 'om':
+        server_manager = 'Omega Manager'
+    else:
+        server_manager = 'CFOmegaSC'
+    uptime = format_duration(time.time() - health.boot_time)
+    embed = discord.Embed(title=info.servername, colour=discord.Colour(0x3D85C6),
+                          url=server.server_url,
+                          description=server.address,
+                          timestamp=datetime.datetime.now().astimezone())
+    embed.set_author(name='Server Technical Details', url=server.server_url,
+                     icon_url=server.server_icon)
+    embed.set_footer(text="Report Generated", icon_url=server.server_icon)
+    embed.add_field(name="DayZ CPU Usage", value=str(health.process_cpu) + '%')
+    embed.add_field(name="DayZ MEM Usage", value=str(health.process_memory) + 'MB')
+    embed.add_field(name="Uptime", value=uptime)
+    embed.add_field(name="Total CPU Usage", value=str(health.cpu_usage) + '%')
+    embed.add_field(name="Total MEM Usage", value=str(health.memory_used) + 'MB')
+    embed.add_field(name="CPU Cores", value=health.cpu_count)
+    embed.add_field(name="Application", value=server_manager)
+    embed.add_field(name="Version", value=health.manager_version)
+    embed.add_field(name='Node', value=info.node)
+    return [embed]
+
+
+def refresh_tech(server, embeds):
+    if server.info is None or server.info.health is None or not embeds:
+        return
+    uptime = format_duration(time.time() - server.info.health.boot_time)
+    embeds[0].set_field_at(2, name="Uptime", value=uptime)
+
+
+def build_host(server, sample):
+    """Host metrics read on this machine; built on every request since the sample changes independently"""
+    def value(number, unit):
+        return '-' if number is None else '{:.1f}{}'.format(number, unit) if isinstance(number, float) else \
+            '{}{}'.format(number, unit)
+
+    title = server.info.servername if server.info is not None else server.name
+    embed = discord.Embed(title=title, colour=discord.Colour(0x3D85C6), url=server.server_url,
+                          description=server.address, timestamp=datetime.datetime.fromtimestamp(sample.time).astimezone())
+    embed.set_author(name='Local Host Metrics', url=server.server_url, icon_url=server.server_icon)
+    embed.set_footer(text="Sampled", icon_url=server.server_icon)
+    embed.add_field(name="DayZ CPU Usage", value=value(sample.process_cpu, '%'))
+    embed.add_field(name="DayZ MEM Usage", value=value(sample.process_memory, 'MB'))
+    embed.add_field(name="DayZ PID", value=value(sample.process_pid, '') if sample.process_pid else 'Not Running')
+    embed.add_field(name="Total CPU Usage", value=value(sample.cpu, '%'))
+    embed.add_field(name="Total MEM Usage", value='{} / {}'.format(value(sample.memory_used, ''),
+                                                                   value(sample.memory_total, 'MB')))
+    embed.add_field(name="Disk Usage", value='{} / {}'.format(value(sample.disk_used, ''),
+                                                             value(sample.disk_total, 'GB')))
+    return embed
+
+
+def tech_embeds(server, host=None):
+    """Cached CFTools technical details, followed by a host metrics sample for the local server"""
+    embeds = render_cache.render('tech', server, build_tech, refresh=refresh_tech)
+    if host is not None:
+        embeds = embeds + [build_host(server, host)]
+    return embeds
+
+
+async def display_tech(ctx, server: object, host=None):
+    await send_embeds(ctx, tech_embeds(server, host))
+
+
+def format_history(server, window, summaries):
+    title = server.info.servername if server.info is not None else server.name
+    lines = ['{} - last {}'.format(title, window)[:60], '',
+             '{:<15}{:>9}{:>9}{:>9}{:>9}{:>9}'.format('Metric', 'Min', 'Avg', 'Max', 'P50', 'P95')]
+    for metric, summary in summaries:
+        if summary is None:
+            lines.append('{:<15}{:>9}'.format(metric, 'no data'))
+            continue
+        lines.append('{:<15}{:>9.1f}{:>9.1f}{:>9.1f}{:>9.1f}{:>9.1f}'.format(
+            metric, summary.minimum, summary.average, summary.maximum, summary.p50, summary.p95))
+    return '```' + '\n'.join(lines) + '```'
+
+
+def format_broadcast(message, results):
+    delivered = len([result for result in results if result.ok])
+    lines = ['Broadcast: {}'.format(message)[:60], '{}/{} servers'.format(delivered, len(results)), '']
+    for result in results:
+        if result.duplicate:
+            status = 'skipped, already sent'
+        elif result.ok:
+            status = 'OK {:.0f} ms'.format(result.latency * 1000)
+        else:
+            status = 'FAILED after {} attempts: {}'.format(result.attempts, result.error)[:60]
+        if result.ok and result.attempts > 1:
+            status += ' ({} attempts)'.format(result.attempts)
+        lines.append('{:<15}{}'.format(result.server[:14], status))
+    return '```' + '\n'.join(lines) + '```'
+
+
+def format_announcement(entry):
+    when = datetime.datetime.fromtimestamp(entry.due).strftime('%Y-%m-%d %H:%M')
+    servers = ', '.join(entry.servers) if entry.servers else 'all'
+    repeat = ' every {}'.format(format_duration(entry.repeat)) if entry.repeat else ''
+    return '#{} {} [{}]{}: {}'.format(entry.id, when, servers, repeat, entry.message)
+
+
+def format_services(services):
+    """One line per background service for !tasks, with its last error on the next line"""
+    def milliseconds(seconds):
+        return '-' if seconds is None else '{:.1f}'.format(seconds * 1000)
+
+    lines = ['{:<16}{:<9}{:>4} {:>16}{:>7}{:>8}{:>8}{:>8}'.format('Service', 'State', 'Rst', 'Up', 'Iter',
+                                                                  'Last ms', 'Avg ms', 'Max ms')]
+    for service in sorted(services, key=lambda service: service.name):
+        uptime = format_duration(time.time() - service.started) if service.running and service.started else '-'
+        lines.append('{:<16}{:<9}{:>4} {:>16}{:>7}{:>8}{:>8}{:>8}'.format(
+            service.name[:15], service.state, service.restarts, uptime, service.iterations,
+            milliseconds(service.last_latency), milliseconds(service.average_latency),
+            milliseconds(service.max_latency if service.iterations else None)))
+        if service.last_error:
+            lines.append('  last error: {}'.format(service.last_error)[:80])
+    return lines
+
+
+def build_graph(server, metric, window, summary):
+    title = server.info.servername if server.info is not None else server.name
+    unit = metrics.METRIC_UNITS.get(metric, '')
+    embed = discord.Embed(title=title, colour=discord.Colour(0x3D85C6), url=server.server_url,
+                          description='{} over the last {}'.format(metric.replace('_', ' ').upper(), window),
+                          timestamp=datetime.datetime.now().astimezone())
+    embed.set_author(name='Server Health Graph', url=server.server_url, icon_url=server.server_icon)
+    embed.add_field(name='Min', value='{:.1f}{}'.format(summary.minimum, unit))
+    embed.add_field(name='Avg', value='{:.1f}{}'.format(summary.average, unit))
+    embed.add_field(name='Max', value='{:.1f}{}'.format(summary.maximum, unit))
+    embed.set_image(url='attachment://graph.png')
+    embed.set_footer(text='{} samples'.format(summary.samples), icon_url=server.server_icon)
+    return embed
 
 
+async def convert_time(time):
+    return format_duration(time)
 
 
-async def display_status(ctx, server: object):
-    try:
-        info = server.info
-        if info['fpp_only']:
-            game_mode = '1st Person'
-        else:
-            game_mode = '3rd Person'
-        embed = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                              url=server.server_url,
-                              description=server.address,
-                              timestamp=datetime.datetime.now().astimezone())
-        embed.set_author(name='Server Details', url=server.server_url,
-                         icon_url=server.server_icon)
-        embed.set_footer(text="Report Generated", icon_url=server.server_icon)
-        embed.add_field(name="Status", value=info['state'].capitalize())
-        embed.add_field(name="DayZ Version", value=info['version'])
-        embed.add_field(name="Connected Players",
-                        value=str(info['current_players']) + '/' + str(info['max_players']))
-        embed.add_field(name="In-Game Time", value=info['gametime'])
-        embed.add_field(name="Time Acceleration", value=info['time_acceleration'])
-        embed.add_field(name="Server FPS", value=info['health']['game']['fps'])
-        embed.add_field(name="Game Mode", value=game_mode)
-        embed.add_field(name="Map", value=info['map'])
-        embed.add_field(name="Hive", value=info['hive'])
-        await ctx.send(embed=embed)
-    except KeyError as error:
-        if error.args[0] == 'health':
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Mod Information', url=server.server_icon,
-                              icon_url=server.server_icon)
-            embed1.add_field(name="Server Did Not Respond, May Be Down", value='\u200b')
-            embed1.set_footer(text='Server Error', icon_url=server.server_icon)
-            await ctx.send(embed=embed1)
-
-
-async def display_tech(ctx, server: object):
-    try:
-        info = server.info
-        if info['health']['system']['application'] == 'om':
-            server_manager = 'Omega Manager'
-        else:
-            server_manager = 'CFOmegaSC'
-        uptime_secs = time.time() - int(info['health']['system']['boot_time'])
-        uptime = await convert_time(uptime_secs)
-        embed = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                              url=server.server_url,
-                              description=server.address,
-                              timestamp=datetime.datetime.now().astimezone())
-        embed.set_author(name='Server Technical Details', url=server.server_url,
-                         icon_url=server.server_icon)
-        embed.set_footer(text="Report Generated", icon_url=server.server_icon)
-        embed.add_field(name="DayZ CPU Usage", value=str(info['health']['process']['cpu_usage']) + '%')
-        embed.add_field(name="DayZ MEM Usage", value=str(info['health']['process']['memory_usage']) + 'MB')
-        embed.add_field(name="Uptime", value=uptime)
-        embed.add_field(name="Total CPU Usage", value=str(info['health']['system']['cpu_usage']) + '%')
-        embed.add_field(name="Total MEM Usage", value=str(info['health']['system']['memory']['used']) + 'MB')
-        embed.add_field(name="CPU Cores", value=info['health']['system']['cpu_count'])
-        embed.add_field(name="Application", value=server_manager)
-        embed.add_field(name="Version", value=info['health']['system']['version'])
-        embed.add_field(name='Node', value=info['node'])
-        await ctx.send(embed=embed)
-    except KeyError as error:
-        if error.args[0] == 'health':
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Mod Information', url=server.server_icon,
-                              icon_url=server.server_icon)
-            embed1.add_field(name="Server Did Not Respond, May Be Down", value='\u200b')
-            embed1.set_footer(text='Server Error', icon_url=server.server_icon)
-            await ctx.send(embed=embed1)
+def add_columns(embed, rows, per_field, **kwargs):
+    for index in range(0, len(rows), per_field):
+        embed.add_field(name='\u200b', value=''.join(rows[index:index + per_field]), **kwargs)
 
 
-async def convert_time(time):
-    seconds = round(time)
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
-    seconds = seconds % 60
-    converted_time = "{:02d}h : {:02d}m : {:02d}s".format(hours, minutes, seconds)
-    return converted_time
+def build_mods(server):
+    info = server.info
+    if info is None:
+        return [no_data_embed(server, 'Server Mod Information')]
+    if info.health is None:
+        return [server_error_embed(server, info, 'Mod Information')]
+    mod_list = []
+    for mod in info.health.mods:
+        if mod.file_id is not None:
+            mod_string = '[{}](https://steamcommunity.com/sharedfiles/filedetails/?id={})\n'.format(
+                mod.directory[1:22].ljust(22, '\u200b'), mod.file_id)
+        else:
+            mod_string = mod.directory[1:22].ljust(22, '\u200b')
+        mod_list.append(mod_string)
+    if len(mod_list) == 0:
+        embed1 = discord.Embed(title=info.servername, colour=discord.Colour(0x3D85C6),
+                               url=server.server_url,
+                               description=server.address,
+                               timestamp=datetime.datetime.now().astimezone())
+        embed1.set_author(name='Server Mod Information', url=server.server_url,
+                          icon_url=server.server_icon)
+        embed1.set_footer(
+            text='{} Mods'.format(len(mod_list)),
+            icon_url=server.server_icon)
+        embed1.add_field(name="No Mods reported via API", value="\u200b")
+        return [embed1]
+    if len(mod_list) <= 30:
+        embed1 = discord.Embed(title=info.servername, colour=discord.Colour(0x3D85C6),
+                               url=server.server_url,
+                               description=server.address,
+                               timestamp=datetime.datetime.now().astimezone())
+        embed1.set_author(name='Mod Information', url=server.server_icon,
+                          icon_url=server.server_icon)
+        add_columns(embed1, mod_list, 5, inline=True)
+        embed1.set_footer(
+            text='{} Mods'.format(len(mod_list)),
+            icon_url=server.server_icon)
+        return [embed1]
+    if len(mod_list) <= 60:
+        embed1 = discord.Embed(title=info.servername, colour=discord.Colour(0x3D85C6),
+                               url=server.server_url,
+                               description=server.address)
+        embed1.set_author(name='Server Mod Information', url=server.server_url,
+                          icon_url=server.server_icon)
+        embed2 = discord.Embed(colour=discord.Colour(0x3D85C6),
+                               timestamp=datetime.datetime.now().astimezone())
+        embed2.set_footer(
+            text='{} Mods'.format(len(mod_list)),
+            icon_url=server.server_icon)
+        add_columns(embed1, mod_list[:30], 5)
+        add_columns(embed2, mod_list[30:], 5)
+        embed1.add_field(name='\u200b', value='\u200b')
+        embed2.add_field(name='\u200b', value='\u200b')
+        return [embed1, embed2]
+    return []
 
 
 async def display_mods(ctx, server):
-    try:
-        info = server.info
-        mod_list = []
-        output_mods = ''
-        for mod in server.info['health']['game'].get('mods', []):
-            if mod['file_id'] != None:
-                mod_string = '[{}](https://steamcommunity.com/sharedfiles/filedetails/?id={})\n'.format(
-                    (str(mod['directory'])[1:22]).ljust(22, '\u200b'), (str(mod['file_id'])))
-                mod_list.append(mod_string)
-            elif mod['file_id'] == None:
-                mod_string = '{}'.format(str(mod['directory'])[1:22]).ljust(22, '\u200b')
-                mod_list.append(mod_string)
-        count = 0
-        if len(mod_list) == 0:
-            output_mods = "\u200b"
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Server Mod Information', url=server.server_url,
-                              icon_url=server.server_icon)
-            embed1.set_footer(
-                text='{} Mods'.format(len(mod_list)),
-                icon_url=server.server_icon)
-            embed1.add_field(name="No Mods reported via API", value=output_mods)
-            await ctx.send(embed=embed1)
-            await asyncio.sleep(1)
-        if len(mod_list) <= 5 and len(mod_list) != 0:
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Mod Information', url=server.server_icon,
-                              icon_url=server.server_icon)
-            for mod in mod_list:
-                output_mods += mod
-            embed1.add_field(name='\u200b', value=output_mods, inline=True)
-            embed1.set_footer(
-                text='{} Mods'.format(len(mod_list)),
-                icon_url=server.server_icon)
-            await ctx.send(embed=embed1)
-            await asyncio.sleep(1)
-        if len(mod_list) < 10 and len(mod_list) != 0:
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Mod Information', url=server.server_icon,
-                              icon_url=server.server_icon)
-            for mod in mod_list:
-                output_mods += mod
-                count += 1
-                if count == 5:
-                    embed1.add_field(name='\u200b', value=output_mods, inline=True)
-                    output_mods = ''
-                    count = 0
-            embed1.add_field(name='\u200b', value=output_mods, inline=True)
-            embed1.set_footer(
-                text='{} Mods'.format(len(mod_list)),
-                icon_url=server.server_icon)
-            await ctx.send(embed=embed1)
-            await asyncio.sleep(1)
-        if 10 < len(mod_list) <= 30:
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Mod Information', url=server.server_icon,
-                              icon_url=server.server_icon)
-            for mod in mod_list:
-                output_mods += mod
-                count += 1
-                if count == 5:
-                    embed1.add_field(name='\u200b', value=output_mods, inline=True)
-                    output_mods = ''
-                    count = 0
-            if len(output_mods) != 0:
-                embed1.add_field(name='\u200b', value=output_mods, inline=True)
-            embed1.set_footer(
-                text='{} Mods'.format(len(mod_list)),
-                icon_url=server.server_icon)
-            await ctx.send(embed=embed1)
-            await asyncio.sleep(1)
-        if 30 < len(mod_list) <= 60:
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address)
-            embed1.set_author(name='Server Mod Information', url=server.server_url,
-                              icon_url=server.server_icon)
-            embed2 = discord.Embed(colour=discord.Colour(0x3D85C6),
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed2.set_footer(
-                text='{} Mods'.format(len(mod_list)),
-                icon_url=server.server_icon)
-            for mod in mod_list[:30]:
-                output_mods += mod
-                count += 1
-                if count == 5:
-                    embed1.add_field(name='\u200b', value=output_mods)
-                    output_mods = ''
-                    count = 0
-            output_mods = ''
-            count = 0
-            for mod in mod_list[30:]:
-                output_mods += mod
-                count += 1
-                if count == 5:
-                    embed2.add_field(name='\u200b', value=output_mods)
-                    output_mods = ''
-                    count = 0
-            if len(output_mods) != 0:
-                embed2.add_field(name='\u200b', value=output_mods)
-            embed1.add_field(name='\u200b', value='\u200b')
-            embed2.add_field(name='\u200b', value='\u200b')
-            await ctx.send(embed=embed1)
-            await ctx.send(embed=embed2)
-    except KeyError as error:
-        if error.args[0] == 'health':
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Mod Information', url=server.server_icon,
-                              icon_url=server.server_icon)
-            embed1.add_field(name="Server Did Not Respond, May Be Down", value='\u200b')
-            embed1.set_footer(text='Server Error', icon_url=server.server_icon)
-            await ctx.send(embed=embed1)
+    await send_embeds(ctx, render_cache.render('mods', server, build_mods))
+
+
+def live_sessions(server):
+    sessions = getattr(server, 'sessions', None)
+    return sessions is not None and sessions.live
+
+
+def online_count(server):
+    """Players online from the live session table, or the last serverinfo poll"""
+    if live_sessions(server):
+        return len(server.sessions)
+    return server.info.current_players if server.info is not None else 0
+
+
+def build_players(server):
+    info = server.info
+    if info is None:
+        return [no_data_embed(server, 'Players Online')]
+    player_list = []
+    players = server.sessions.sessions() if live_sessions(server) else server.players
+    for player in players:
+        name = player.name[:22].ljust(22, '\u200b')
+        if player.cftools_id:
+            player_list.append('[{}]({})\n'.format(name, leaderboard.PROFILE_URL.format(player.cftools_id)))
+        else:
+            player_list.append(name + '\n')
+    footer = '{}/{} Players Online'.format(online_count(server), info.max_players)
+    if len(player_list) == 0:
+        embed1 = discord.Embed(title=info.servername, colour=discord.Colour(0x3D85C6),
+                               url=server.server_url,
+                               description=server.address,
+                               timestamp=datetime.datetime.now().astimezone())
+        embed1.set_author(name='Players Online', url=server.server_url,
+                          icon_url=server.server_icon)
+        embed1.set_footer(text=footer, icon_url=server.server_icon)
+        embed1.add_field(name="No Players Online", value='\u200b')
+        return [embed1]
+    if len(player_list) <= 60:
+        embed1 = discord.Embed(title=info.servername, colour=discord.Colour(0x3D85C6),
+                               url=server.server_url,
+                               description=server.address,
+                               timestamp=datetime.datetime.now().astimezone())
+        embed1.set_author(name='Players Online', url=server.server_url,
+                          icon_url=server.server_icon)
+        embed1.set_footer(text=footer, icon_url=server.server_icon)
+        if len(player_list) < 10:
+            embed1.add_field(name="Players", value=' ' + ''.join(player_list), inline=True)
+        else:
+            add_columns(embed1, player_list, 10, inline=True)
+        return [embed1]
+    embed1 = discord.Embed(title=info.servername, colour=discord.Colour(0x3D85C6),
+                           url=server.server_url,
+                           description=server.address)
+    embed1.set_author(name='Players Online', url=server.server_url,
+                      icon_url=server.server_icon)
+    embed2 = discord.Embed(colour=discord.Colour(0x3D85C6), timestamp=datetime.datetime.now().astimezone())
+    add_columns(embed1, player_list[:60], 10)
+    add_columns(embed2, player_list[60:], 10)
+    embed1.add_field(name='\u200b', value='\u200b')
+    embed2.add_field(name='\u200b', value='\u200b')
+    embed2.set_footer(text=footer, icon_url=server.server_icon)
+    return [embed1, embed2]
 
 
 async def display_players(ctx, server):
-    try:
-        info = server.info
-        player_listing = ' '
-        count = 1
-        player_list = []
-        for player in server.players.get('players', []):
-            player_string = '[{}](https://omegax.cftools.de/user/{})\n'.format(
-                player['info']['name'][:22].ljust(22, '\u200b'), player['cftools_id'])
-            player_list.append(player_string)
-            count += 1
-        count = 0
-        if len(player_list) is 0:
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Players Online', url=server.server_url,
-                              icon_url=server.server_icon)
-            embed1.set_footer(text='{}/{} Players Online'.format(info['current_players'], info['max_players']),
-                              icon_url=server.server_icon)
-            embed1.add_field(name="No Players Online", value='\u200b')
-            await ctx.send(embed=embed1)
-            await asyncio.sleep(1)
-        if len(player_list) < 10 and len(player_list) != 0:
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Players Online', url=server.server_url,
-                              icon_url=server.server_icon)
-            embed1.set_footer(text='{}/{} Players Online'.format(info['current_players'], info['max_players']),
-                              icon_url=server.server_icon)
-            for player in player_list:
-                player_listing += str(player)
-            embed1.add_field(name="Players", value=player_listing, inline=True)
-            await ctx.send(embed=embed1)
-            await asyncio.sleep(1)
-        if 10 < len(player_list) <= 60:
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Players Online', url=server.server_url,
-                              icon_url=server.server_icon)
-            embed1.set_footer(text='{}/{} Players Online'.format(info['current_players'], info['max_players']),
-                              icon_url=server.server_icon)
-            for player in player_list:
-                player_listing += str(player)
-                count += 1
-                if count == 10:
-                    embed1.add_field(name='\u200b', value=player_listing, inline=True)
-                    player_listing = ''
-                    count = 0
-            embed1.add_field(name='\u200b', value=player_listing, inline=True)
-            embed1.set_footer(text='{}/{} Players Online'.format(info['current_players'], info['max_players']),
-                              icon_url=server.server_icon)
-            await ctx.send(embed=embed1)
-            await asyncio.sleep(1)
-        if len(player_list) > 60:
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address)
-            embed1.set_author(name='Players Online', url=server.server_url,
-                              icon_url=server.server_icon)
-            embed2 = discord.Embed(colour=discord.Colour(0x3D85C6), timestamp=datetime.datetime.now().astimezone())
-            embed2.set_footer(text='{}/{} Players Online'.format(info['current_players'], info['max_players']),
-                              icon_url=server.server_icon)
-            for player in player_list[:60]:
-                player_listing += str(player)
-                count += 1
-                if count == 10:
-                    embed1.add_field(name='\u200b', value=player_listing)
-                    player_listing = ''
-                    count = 0
-            player_listing = ''
-            count = 0
-            for player in player_list[60:]:
-                player_listing += str(player)
-                count += 1
-                if count == 10:
-                    embed2.add_field(name='\u200b', value=player_listing)
-                    player_listing = ''
-                    count = 0
-            if len(player_listing) != 0:
-                embed2.add_field(name='\u200b', value=player_listing)
-            embed1.add_field(name='\u200b', value='\u200b')
-            embed2.add_field(name='\u200b', value='\u200b')
-            embed2.set_footer(text='{}/{} Players Online'.format(info['current_players'], info['max_players']),
-                              icon_url=server.server_icon)
-            await ctx.send(embed=embed1)
-            await ctx.send(embed=embed2)
-    except KeyError as error:
-        if error.args[0] == 'health':
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Server Information', url=server.server_icon,
-                              icon_url=server.server_icon)
-            embed1.add_field(name="Server Did Not Respond, May Be Down", value='\u200b')
-            embed1.set_footer(text='Server Error', icon_url=server.server_icon)
-            await ctx.send(embed=embed1)
-
-async def display_kills(ctx, limit: int, server: object):
-    try:
-        upper_limit = limit
-        info = server.info
-        kills = server.kills
-        kills_list = []
-        count_kills = []
-        count_deaths = []
-        count = 0
-        kills_list.clear()
-        count_deaths.clear()
-        count_kills.clear()
-        top_kd_ratio = 0
-        top_kd_string = ""
-        top_killer = ""
-        for user in kills.get('users', []):
-            if int(user['deaths']) != 0:
-                kd_ratio = round(int(user['kills']) / int(user['deaths']), 2)
+    await send_embeds(ctx, render_cache.render('players', server, build_players))
+
+
+def leaderboard_index(server):
+    index = getattr(server, 'leaderboard', None)
+    if index is None:
+        index = LeaderboardIndex(server.kills, server.playtime)
+    return index
+
+
+def add_tiers(embed, rows, headers):
+    for tier, start in enumerate(range(0, len(rows), 10), 1):
+        columns = zip(*rows[start:start + 10])
+        embed.add_field(name='Tier {}'.format(tier), value=''.join(next(columns)).ljust(20, '\u200b'), inline=True)
+        for header in headers:
+            if header is None:
+                embed.add_field(name='\u200b', value='\u200b', inline=True)
             else:
-                kd_ratio = round(int(user['kills']) + .00, 3)
-            if top_kd_ratio < kd_ratio:
-                top_kd_ratio = kd_ratio
-                top_kd_string = '[{}](https://omegax.cftools.de/user/{}) with {}!'.format(
-                    user['latest_name'], user['cftools_id'], kd_ratio)
-            if user['rank'] == 1:
-                top_killer = '[{}](https://omegax.cftools.de/user/{}) with {} kills!'.format(
-                    user['latest_name'], user['cftools_id'], user['kills'])
-            kill_name = '{} [{}](https://omegax.cftools.de/user/{})'.format(str(user['rank']).rjust(2, '0'),
-                                                                            user['latest_name'][:15].ljust(
-                                                                                15, ' '),
-                                                                            user['cftools_id']) + '\n'
-            kills = '{}'.format(str(user['kills'])) + '\n'
-            deaths = '{}'.format(str(user['deaths'])) + '\n'
-            count_kills.append(kills)
-            count_deaths.append(deaths)
-            kills_list.append(kill_name)
-            count += 1
-        if top_kd_string == "":
-            top_killer = ''
-            top_kd_string = ''
-        embed_kills = discord.Embed(title=info['servername'][:57], colour=discord.Colour(0x3D85C6),
-                                    url=server.server_url,
-                                    description='\nTop Killer: {}\nTop K/D: {}'.format(top_killer,
-                                                                                       top_kd_string),
-                                    timestamp=datetime.datetime.now().astimezone())
-        embed_kills.set_author(name='Server Leaderboard', url=server.server_url,
-                               icon_url=server.server_icon)
-        embed_kills.set_footer(text="Report Generated",
-                               icon_url=server.server_icon)
-        lower = 0
-        upper = 10
-        player_string = ""
-        kills_string = ""
-        deaths_string = ""
-        if upper_limit < upper:
-            upper = upper_limit
-        if len(kills_list) < upper_limit:
-            upper_limit = len(kills_list)
-        tier = 1
-        parsed = 0
-        while upper <= upper_limit:
-            for player in kills_list[lower:upper]:
-                player_string += player
-            for kills in count_kills[lower:upper]:
-                kills_string += kills
-            for deaths in count_deaths[lower:upper]:
-                deaths_string += deaths
-            embed_kills.add_field(name='Tier {}'.format(tier), value=(player_string.ljust(20, '\u200b')),
-                                  inline=True)
-            embed_kills.add_field(name='Kills'.format(tier),
-                                  value='{}'.format(kills_string.rjust(4, '\u200b')), inline=True)
-            embed_kills.add_field(name='Deaths'.format(tier),
-                                  value='{}'.format(deaths_string.rjust(4, '\u200b')), inline=True)
-            player_string = ""
-            kills_string = ""
-            deaths_string = ""
-            lower += 10
-            upper += 10
-            tier += 1
-            parsed += 10
-        if parsed < upper_limit:
-            for player in kills_list[parsed:upper_limit]:
-                player_string += player
-            for kills in count_kills[parsed:upper_limit]:
-                kills_string += kills
-            for deaths in count_deaths[parsed:upper_limit]:
-                deaths_string += deaths
-            embed_kills.add_field(name='Tier {}'.format(tier), value=(player_string.ljust(20, '\u200b')),
-                                  inline=True)
-            embed_kills.add_field(name='Kills'.format(tier),
-                                  value='{}'.format(kills_string.rjust(4, '\u200b')), inline=True)
-            embed_kills.add_field(name='Deaths'.format(tier),
-                                  value='{}'.format(deaths_string.rjust(4, '\u200b')), inline=True)
-        await ctx.send(embed=embed_kills)
-    except KeyError as error:
-        if error.args[0] == 'health':
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Mod Information', url=server.server_icon,
-                              icon_url=server.server_icon)
-            embed1.add_field(name="Server Did Not Respond, May Be Down", value='\u200b')
-            embed1.set_footer(text='Server Error', icon_url=server.server_icon)
-            await ctx.send(embed=embed1)
+                embed.add_field(name=header, value=''.join(next(columns)).rjust(4, '\u200b'), inline=True)
+
+
+def build_kills(server, limit, order=leaderboard.KILLS):
+    info = server.info
+    if info is None:
+        return [no_data_embed(server, 'Server Leaderboard')]
+    index = leaderboard_index(server)
+    embed_kills = discord.Embed(title=info.servername[:57], colour=discord.Colour(0x3D85C6),
+                                url=server.server_url,
+                                description='\nTop Killer: {}\nTop K/D: {}'.format(index.top_killer,
+                                                                                   index.top_kd),
+                                timestamp=datetime.datetime.now().astimezone())
+    author = 'Server Leaderboard'
+    if order != leaderboard.KILLS:
+        author += ' by {}'.format(leaderboard.ORDER_TITLES[order])
+    embed_kills.set_author(name=author, url=server.server_url,
+                           icon_url=server.server_icon)
+    embed_kills.set_footer(text="Report Generated",
+                           icon_url=server.server_icon)
+    add_tiers(embed_kills, index.kill_rows(order, limit), ('Kills', leaderboard.ORDER_TITLES[order]))
+    return [embed_kills]
+
+
+async def display_kills(ctx, limit: int, server: object, order=leaderboard.KILLS):
+    await send_embeds(ctx, render_cache.render('kills', server, build_kills, limit, order))
+
+
+def build_played(server, limit):
+    info = server.info
+    if info is None:
+        return [no_data_embed(server, 'Server Leaderboard')]
+    index = leaderboard_index(server)
+    embed_played = discord.Embed(title=info.servername[:57], colour=discord.Colour(0x3D85C6),
+                                 url=server.server_url,
+                                 description='\nMost Played: {}'.format(index.top_played),
+                                 timestamp=datetime.datetime.now().astimezone())
+    embed_played.set_author(name='Server Leaderboard', url=server.server_url,
+                            icon_url=server.server_icon)
+    embed_played.set_footer(text="Report Generated",
+                            icon_url=server.server_icon)
+    add_tiers(embed_played, index.played(limit), ('Played For', None))
+    return [embed_played]
+
 
 async def display_played(ctx, limit, server):
-    try:
-        upper_limit = limit
-        info = server.info
-        playtime = server.playtime
-        time_list = []
-        name_list = []
-        name_list.clear()
-        time_list.clear()
-        top_played = ""
-        count = 0
-        for user in playtime.get('users', []):
-            if user['rank'] == 1:
-                top_played = '[{}](https://omegax.cftools.de/user/{}) with {}!'.format(
-                    user['latest_name'], user['cftools_id'], await convert_time(user['playtime']))
-            played_name = '{} [{}](https://omegax.cftools.de/user/{})'.format(
-                str(user['rank']).rjust(2, '0'), user['latest_name'][:15].ljust(15, ' '),
-                user['cftools_id']) + '\n'
-            played_time = '{}'.format(str(await convert_time(user['playtime']))) + '\n'
-            time_list.append(played_time)
-            name_list.append(played_name)
-            count += 1
-        embed_played = discord.Embed(title=info['servername'][:57], colour=discord.Colour(0x3D85C6),
-                                     url=server.server_url,
-                                     description='\nMost Played: {}'.format(top_played),
-                                     timestamp=datetime.datetime.now().astimezone())
-        embed_played.set_author(name='Server Leaderboard', url=server.server_url,
-                                icon_url=server.server_icon)
-        embed_played.set_footer(text="Report Generated",
-                                icon_url=server.server_icon)
-        lower = 0
-        upper = 10
-        played_name = ""
-        played_time = ""
-        if upper_limit < upper:
-            upper = upper_limit
-        if len(name_list) < upper_limit:
-            upper_limit = len(name_list)
-        tier = 1
-        parsed = 0
-        while upper <= upper_limit:
-            for player in name_list[lower:upper]:
-                played_name += player
-            for time in time_list[lower:upper]:
-                played_time += time
-            embed_played.add_field(name='Tier {}'.format(tier), value=(played_name.ljust(20, '\u200b')),
-                                   inline=True)
-            embed_played.add_field(name='Played For'.format(tier),
-                                   value='{}'.format(played_time.rjust(4, '\u200b')), inline=True)
-            embed_played.add_field(name='\u200b', value='\u200b', inline=True)
-            played_name = ""
-            played_time = ""
-            lower += 10
-            upper += 10
-            tier += 1
-            parsed += 10
-        if parsed < upper_limit:
-            for player in name_list[parsed:upper_limit]:
-                played_name += player
-            for time in time_list[parsed:upper_limit]:
-                played_time += time
-            embed_played.add_field(name='Tier {}'.format(tier), value=(played_name.ljust(20, '\u200b')),
-                                   inline=True)
-            embed_played.add_field(name='Played For'.format(tier),
-                                   value='{}'.format(played_time.rjust(4, '\u200b')), inline=True)
-            embed_played.add_field(name='\u200b', value='\u200b', inline=True)
-        await ctx.send(embed=embed_played)
-    except KeyError as error:
-        if error.args[0] == 'health':
-            embed1 = discord.Embed(title=info['servername'], colour=discord.Colour(0x3D85C6),
-                                   url=server.server_url,
-                                   description=server.address,
-                                   timestamp=datetime.datetime.now().astimezone())
-            embed1.set_author(name='Mod Information', url=server.server_icon,
-                              icon_url=server.server_icon)
-            embed1.add_field(name="Server Did Not Respond, May Be Down", value='\u200b')
-            embed1.set_footer(text='Server Error', icon_url=server.server_icon)
-            await ctx.send(embed=embed1)
+    await send_embeds(ctx, render_cache.render('played', server, build_played, limit))
 
 # CommandErrorHandler
 # Copyright © 2018 EvieePy (https://github.com/EvieePy) Licensed under the MIT License
@@ -610,6 +539,9 @@ class CommandErrorHandler(commands.Cog):
         if isinstance(error, commands.errors.MissingRequiredArgument):
             await ctx.send('This command is missing an argument.')
             return
+        if isinstance(error, commands.BadArgument):
+            await ctx.send('Invalid input: {}'.format(error))
+            return
 # TODO: Implement forwarding help
         if isinstance(error, commands.UserInputError):
             await ctx.send("Invalid input.")